@@ -0,0 +1 @@
+"""Performance benchmarks for Exchangify. Run modules with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,203 @@
+"""Synthetic data generator for load benchmarks.
+
+Fills the database selected by DATABASE_URL (or --database) with users,
+listings, listing images, chat messages and notifications using batched
+executemany inserts, e.g.::
+
+    python -m benchmarks.datagen --database sqlite:///bench.db \\
+        --users 100000 --listings 1000000 --messages 10000000 --notifications 5000000
+
+All generated users share the password ``benchpass``.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+FIRST_NAMES = ["Ayesha", "Rahim", "Nusrat", "Tanvir", "Farhana", "Imran", "Sadia", "Arif", "Maria", "John",
+               "Priya", "Karim", "Leila", "Omar", "Sofia", "Daniel", "Mei", "Lucas", "Fatima", "Noah"]
+LAST_NAMES = ["Rahman", "Hossain", "Ahmed", "Islam", "Khan", "Chowdhury", "Smith", "Garcia", "Chen", "Das",
+              "Roy", "Patel", "Kim", "Ali", "Begum", "Lee", "Martin", "Silva", "Haque", "Sarkar"]
+CITIES = [("Dhaka", 23.8103, 90.4125), ("Chittagong", 22.3569, 91.7832), ("Sylhet", 24.8949, 91.8687),
+          ("Khulna", 22.8456, 89.5403), ("Rajshahi", 24.3745, 88.6042), ("Barisal", 22.7010, 90.3535)]
+ADJECTIVES = ["Vintage", "Used", "Brand new", "Lightly used", "Classic", "Portable", "Wireless", "Wooden",
+              "Leather", "Compact", "Large", "Handmade", "Refurbished", "Kids'", "Professional"]
+NOUNS = ["bicycle", "laptop", "phone", "guitar", "textbook", "sofa", "jacket", "camera", "desk", "lamp",
+         "football", "board game", "headphones", "watch", "bookshelf", "kettle", "tent", "scooter", "novel", "printer"]
+CONDITIONS = ["New", "Like New", "Good", "Fair", "Poor"]
+LISTING_TYPES = [("sale", 60), ("exchange", 20), ("loan", 10), ("donation", 10)]
+NOTIFICATION_TYPES = [("chat", 60), ("trade", 25), ("listing", 10), ("system", 5)]
+PASSWORD = "benchpass"
+
+def _weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+def _timestamp(rng, now, max_days=730):
+    return now - timedelta(seconds=rng.randint(0, max_days * 86400))
+
+def _insert_batches(conn, table, rows, batch_size, label, total):
+    done = 0
+    started = time.time()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            conn.commit()
+            done += len(batch)
+            batch = []
+            rate = done / max(time.time() - started, 1e-9)
+            print(f"\r  {label}: {done:,}/{total:,} ({rate:,.0f} rows/s)", end="", flush=True)
+    if batch:
+        conn.execute(table.insert(), batch)
+        conn.commit()
+        done += len(batch)
+    print(f"\r  {label}: {done:,}/{total:,} in {time.time() - started:.1f}s" + " " * 20)
+
+def _max_id(conn, table):
+    return conn.execute(table.select().with_only_columns(table.c.id).order_by(table.c.id.desc()).limit(1)).scalar() or 0
+
+def generate(app, users, listings, messages, notifications, images_per_listing=1, batch_size=10000, seed=42):
+    from werkzeug.security import generate_password_hash
+    from models import db, User, Listing, ListingImage, ChatMessage, Notification, Category
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(PASSWORD)
+
+    with app.app_context():
+        category_ids = [c.id for c in Category.query.all()]
+        with db.engine.connect() as conn:
+            user_table = User.__table__
+            start = _max_id(conn, user_table)
+
+            def user_rows():
+                for i in range(users):
+                    city, lat, lon = rng.choice(CITIES)
+                    yield {
+                        "email": f"bench{start + i + 1}@example.com",
+                        "password": password_hash,
+                        "role": "user",
+                        "first_name": rng.choice(FIRST_NAMES),
+                        "last_name": rng.choice(LAST_NAMES),
+                        "city": city,
+                        "country": "Bangladesh",
+                        "latitude": lat + rng.uniform(-0.2, 0.2),
+                        "longitude": lon + rng.uniform(-0.2, 0.2),
+                        "is_online": rng.random() < 0.05,
+                        "last_seen": _timestamp(rng, now, 30),
+                        "created_at": _timestamp(rng, now),
+                    }
+            _insert_batches(conn, user_table, user_rows(), batch_size, "users", users)
+            # With --users 0 the listings and messages go to existing users
+            first_user, last_user = (start + 1 if users else 1), _max_id(conn, user_table)
+
+            listing_table = Listing.__table__
+            start = _max_id(conn, listing_table)
+
+            def listing_rows():
+                for _ in range(listings):
+                    listing_type = _weighted(rng, LISTING_TYPES)
+                    city, lat, lon = rng.choice(CITIES)
+                    noun = rng.choice(NOUNS)
+                    created = _timestamp(rng, now)
+                    yield {
+                        "title": f"{rng.choice(ADJECTIVES)} {noun}",
+                        "description": f"{rng.choice(ADJECTIVES)} {noun} in {rng.choice(CONDITIONS).lower()} condition. " * rng.randint(1, 6),
+                        "condition": rng.choice(CONDITIONS),
+                        "price": round(rng.lognormvariate(3.5, 1.0), 2) if listing_type == "sale" else None,
+                        "listing_type": listing_type,
+                        "loan_duration": rng.choice([7, 14, 30]) if listing_type == "loan" else None,
+                        "is_active": rng.random() < 0.85,
+                        "views": rng.randint(0, 500),
+                        "latitude": lat + rng.uniform(-0.2, 0.2),
+                        "longitude": lon + rng.uniform(-0.2, 0.2),
+                        "location": city,
+                        "created_at": created,
+                        "updated_at": created,
+                        "version": 1,
+                        "user_id": rng.randint(first_user, last_user),
+                        "category_id": rng.choice(category_ids),
+                    }
+            _insert_batches(conn, listing_table, listing_rows(), batch_size, "listings", listings)
+            first_listing, last_listing = start + 1, _max_id(conn, listing_table)
+
+            if images_per_listing and last_listing >= first_listing:
+                def image_rows():
+                    for listing_id in range(first_listing, last_listing + 1):
+                        for i in range(images_per_listing):
+                            yield {
+                                "filename": f"bench_{listing_id}_{i}.jpg",
+                                "is_primary": i == 0,
+                                "listing_id": listing_id,
+                                "created_at": now,
+                            }
+                _insert_batches(conn, ListingImage.__table__, image_rows(), batch_size, "listing images",
+                                (last_listing - first_listing + 1) * images_per_listing)
+
+            # Most users talk to a handful of regular partners
+            def message_rows():
+                for _ in range(messages):
+                    sender = rng.randint(first_user, last_user)
+                    receiver = first_user + (sender - first_user + rng.randint(1, 8)) % (last_user - first_user + 1)
+                    yield {
+                        "sender_id": sender,
+                        "receiver_id": receiver,
+                        "message": rng.choice(["Hi!", "Is this still available?", "Can you do a lower price?",
+                                               "Sure, let's meet tomorrow.", "Thanks!", "What condition is it in?"]),
+                        "message_type": "text",
+                        "is_read": rng.random() < 0.9,
+                        "timestamp": _timestamp(rng, now, 365),
+                    }
+            _insert_batches(conn, ChatMessage.__table__, message_rows(), batch_size, "chat messages", messages)
+
+            def notification_rows():
+                for _ in range(notifications):
+                    notification_type = _weighted(rng, NOTIFICATION_TYPES)
+                    yield {
+                        "user_id": rng.randint(first_user, last_user),
+                        "title": "New Message" if notification_type == "chat" else "Update",
+                        "message": f"You have a new {notification_type} notification",
+                        "notification_type": notification_type,
+                        "related_id": rng.randint(1, 1000000),
+                        "is_read": rng.random() < 0.8,
+                        "created_at": _timestamp(rng, now, 365),
+                    }
+            _insert_batches(conn, Notification.__table__, notification_rows(), batch_size, "notifications", notifications)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Exchangify data")
+    parser.add_argument("--database", help="Database URL (defaults to DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--notifications", type=int, default=50000)
+    parser.add_argument("--images-per-listing", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["DATABASE_URL"] = args.database
+    from app import create_app
+    from commands import init_db, seed_db
+    from conversations import rebuild_conversations
+    from user_search import rebuild_user_search
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        seed_db()
+
+    started = time.time()
+    generate(app, args.users, args.listings, args.messages, args.notifications,
+             images_per_listing=args.images_per_listing, batch_size=args.batch_size, seed=args.seed)
+    # Rows were inserted in bulk, bypassing the code that maintains the indexes
+    with app.app_context():
+        rebuild_conversations()
+        rebuild_user_search()
+    print(f"Done in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
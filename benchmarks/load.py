@@ -0,0 +1,207 @@
+"""Concurrent load driver for the hot routes.
+
+Runs in-process against the Flask test client by default (so SQL queries can
+be counted per request), or against a running server with --url::
+
+    python -m benchmarks.load --database sqlite:///bench.db --clients 8 --seconds 30
+    python -m benchmarks.load --url http://127.0.0.1:8000 --clients 32 --save-baseline main
+    python -m benchmarks.load --database sqlite:///bench.db --compare main
+
+Generate data first with ``python -m benchmarks.datagen``.
+"""
+import argparse
+import http.cookiejar
+import json as json_module
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from benchmarks.datagen import PASSWORD
+from benchmarks.report import summarize, print_summary, save_baseline, load_baseline, regressions
+
+# (name, weight); see Scenario.request for the URL each one hits
+ROUTES = [
+    ("/listings", 15),
+    ("/api/listings", 15),
+    ("/api/messages/<id>", 20),
+    ("/api/notifications/count", 35),
+    ("/home", 13),
+    ("/api/place_order", 2),
+]
+
+_query_counter = threading.local()
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _query_counter.count = getattr(_query_counter, "count", 0) + 1
+
+class TestClientSession:
+    """One logged-in user driving the app in-process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json=None, data=None):
+        _query_counter.count = 0
+        response = self.client.open(path, method=method, json=json, data=data)
+        return response.status_code, _query_counter.count
+
+class HttpSession:
+    """One logged-in user driving a running server over HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, json=None, data=None):
+        body = None
+        headers = {}
+        if json is not None:
+            body = json_module.dumps(json).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status, _header_int(response.headers, "X-DB-Query-Count")
+        except urllib.error.HTTPError as e:
+            return e.code, _header_int(e.headers, "X-DB-Query-Count")
+        except OSError:
+            return 0, None
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    return int(value) if value is not None else None
+
+class Scenario:
+    def __init__(self, user_emails, partner_ids, sale_listing_ids, category_ids):
+        self.user_emails = user_emails
+        self.partner_ids = partner_ids
+        self.sale_listing_ids = sale_listing_ids
+        self.category_ids = category_ids
+
+    def login(self, session, email):
+        session.request("POST", "/", data={"email": email, "password": PASSWORD, "role": "user"})
+
+    def request(self, session, route, rng):
+        """Issue one request for route; returns (status, query count)."""
+        if route == "/listings":
+            if rng.random() < 0.5:
+                return session.request("GET", f"/listings?category={rng.choice(self.category_ids)}")
+            return session.request("GET", "/listings?q=" + rng.choice(["bike", "lamp", "book", "phone"]))
+        if route == "/api/listings":
+            return session.request("GET", f"/api/listings?category={rng.choice(self.category_ids)}&type=sale")
+        if route == "/api/messages/<id>":
+            return session.request("GET", f"/api/messages/{rng.choice(self.partner_ids)}")
+        if route == "/api/place_order":
+            session.request("POST", "/api/cart/add", json={"listing_id": rng.choice(self.sale_listing_ids)})
+            return session.request("POST", "/api/place_order")
+        return session.request("GET", route)
+
+def _sample_ids(app, sample_size, seed):
+    from models import db, User, Listing, Category
+    rng = random.Random(seed)
+    with app.app_context():
+        users = db.session.query(User.email, User.id).filter(User.role == "user", User.email.like("bench%")) \
+            .limit(sample_size).all()
+        listings = [row.id for row in db.session.query(Listing.id).filter(
+            Listing.is_active == True, Listing.listing_type == "sale").limit(sample_size * 10)]
+        categories = [row.id for row in db.session.query(Category.id)]
+    if not users or not listings:
+        sys.exit("No benchmark data found; run `python -m benchmarks.datagen` first.")
+    rng.shuffle(listings)
+    return [email for email, _ in users], [user_id for _, user_id in users], listings, categories
+
+def run(make_session, scenario, clients, seconds, seed):
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    weights = [w for _, w in ROUTES]
+    routes = [r for r, _ in ROUTES]
+    clock = {}
+
+    def start_clock():
+        # Runs once every client has logged in, before any of them is released
+        clock["started"] = time.perf_counter()
+        clock["deadline"] = clock["started"] + seconds
+
+    ready = threading.Barrier(clients + 1, action=start_clock)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        session = make_session()
+        scenario.login(session, scenario.user_emails[index % len(scenario.user_emails)])
+        local = defaultdict(list)
+        ready.wait()
+        while time.perf_counter() < clock["deadline"]:
+            route = rng.choices(routes, weights=weights)[0]
+            started = time.perf_counter()
+            status, queries = scenario.request(session, route, rng)
+            local[route].append(((time.perf_counter() - started) * 1000, status, queries))
+        with lock:
+            for route, route_samples in local.items():
+                samples[route].extend(route_samples)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - clock["started"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive Exchangify's hot routes with concurrent clients")
+    parser.add_argument("--database", help="Database URL (defaults to DATABASE_URL)")
+    parser.add_argument("--url", help="Base URL of a running server; omit to run in-process")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="NAME", help="Store the results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth before failing --compare")
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ["DATABASE_URL"] = args.database
+    from app import create_app
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # All simulated clients share one address; throttling would skew latencies
+    app = create_app({"RATE_LIMIT_ENABLED": False})
+    user_emails, partner_ids, sale_listing_ids, category_ids = _sample_ids(app, max(args.clients, 100), args.seed)
+    scenario = Scenario(user_emails, partner_ids, sale_listing_ids, category_ids)
+
+    if args.url:
+        make_session = lambda: HttpSession(args.url)
+    else:
+        event.listen(Engine, "before_cursor_execute", _count_query)
+        make_session = lambda: TestClientSession(app)
+
+    samples, elapsed = run(make_session, scenario, args.clients, args.seconds, args.seed)
+    summary = summarize(samples, elapsed)
+    total = sum(stats["requests"] for stats in summary.values())
+    print(f"{total} requests in {elapsed:.1f}s with {args.clients} clients ({total / elapsed:.1f} req/s)\n")
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    print_summary(summary, baseline)
+
+    if args.save_baseline:
+        settings = {"clients": args.clients, "seconds": args.seconds, "mode": "http" if args.url else "in-process"}
+        print(f"\nBaseline written to {save_baseline(args.save_baseline, summary, settings)}")
+
+    if baseline:
+        found = regressions(summary, baseline, args.tolerance)
+        if found:
+            print("\nRegressions:\n  " + "\n  ".join(found))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
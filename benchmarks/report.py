@@ -0,0 +1,84 @@
+"""Latency summaries and stored baselines for the load benchmark."""
+import json
+import os
+import subprocess
+from datetime import datetime
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    """Turn {route: [(latency_ms, status, queries), ...]} into per-route stats."""
+    summary = {}
+    for route, route_samples in sorted(samples.items()):
+        latencies = sorted(latency for latency, _, _ in route_samples)
+        queries = [q for _, _, q in route_samples if q is not None]
+        summary[route] = {
+            "requests": len(route_samples),
+            "errors": sum(1 for _, status, _ in route_samples if status >= 500 or status == 0),
+            "rps": len(route_samples) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "queries_per_request": sum(queries) / len(queries) if queries else None,
+        }
+    return summary
+
+def print_summary(summary, baseline=None):
+    header = f"{'route':<28}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header)
+    for route, stats in summary.items():
+        queries = "-" if stats["queries_per_request"] is None else f"{stats['queries_per_request']:.1f}"
+        line = (f"{route:<28}{stats['requests']:>7}{stats['errors']:>5}{stats['rps']:>9.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{queries:>9}")
+        if baseline:
+            base = baseline["routes"].get(route)
+            if base and base["p95_ms"]:
+                line += f"{(stats['p95_ms'] / base['p95_ms'] - 1) * 100:>+12.0f}%"
+            else:
+                line += f"{'new':>13}"
+        print(line)
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_baseline(name, summary, settings):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "commit": _git_commit(),
+            "recorded_at": datetime.utcnow().isoformat(),
+            "settings": settings,
+            "routes": summary,
+        }, f, indent=2, sort_keys=True)
+    return path
+
+def load_baseline(name):
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path) as f:
+        return json.load(f)
+
+def regressions(summary, baseline, tolerance):
+    """Routes whose p95 latency or queries per request grew by more than tolerance (0.2 = 20%)."""
+    found = []
+    for route, stats in summary.items():
+        base = baseline["routes"].get(route)
+        if not base:
+            continue
+        if base["p95_ms"] and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            found.append(f"{route}: p95 {base['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms")
+        if base.get("queries_per_request") is not None and stats["queries_per_request"] is not None \
+                and stats["queries_per_request"] > base["queries_per_request"] * (1 + tolerance) + 0.5:
+            found.append(f"{route}: queries {base['queries_per_request']:.1f} -> {stats['queries_per_request']:.1f}")
+    return found
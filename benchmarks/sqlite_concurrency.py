@@ -0,0 +1,103 @@
+"""Read throughput under concurrent writes: default journaling vs. the WAL profile.
+
+Run with ``python -m benchmarks.sqlite_concurrency [--readers 4] [--writers 2] [--seconds 5]``.
+Each reader and writer is a separate process, like gunicorn workers.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from database import SQLITE_PRAGMAS, apply_sqlite_pragmas
+
+# Plain SQLite: rollback journal and no busy timeout, i.e. the old configuration
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE", "busy_timeout": 0, "synchronous": "FULL"}
+
+def _connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    apply_sqlite_pragmas(conn, pragmas)
+    return conn
+
+def _setup(path, pragmas, rows):
+    conn = _connect(path, pragmas)
+    conn.execute("CREATE TABLE listing (id INTEGER PRIMARY KEY, title TEXT, price REAL, is_active INTEGER)")
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO listing (title, price, is_active) VALUES (?, ?, 1)",
+        ((f"Item {i}", i % 500) for i in range(rows))
+    )
+    conn.execute("COMMIT")
+    conn.close()
+
+def _reader(path, pragmas, deadline, results):
+    conn = _connect(path, pragmas)
+    ok = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute("SELECT id, title, price FROM listing WHERE is_active = 1 ORDER BY id DESC LIMIT 20").fetchall()
+            ok += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(("read", ok, errors))
+
+def _writer(path, pragmas, deadline, results):
+    conn = _connect(path, pragmas)
+    ok = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO listing (title, price, is_active) VALUES ('new', 1, 1)")
+            conn.execute("UPDATE listing SET price = price + 1 WHERE id = (SELECT max(id) FROM listing)")
+            conn.execute("COMMIT")
+            ok += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.OperationalError:
+                pass
+    results.put(("write", ok, errors))
+
+def run_profile(name, pragmas, readers, writers, seconds, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _setup(path, pragmas, rows)
+        results = multiprocessing.Queue()
+        deadline = time.time() + seconds
+        procs = [multiprocessing.Process(target=_reader, args=(path, pragmas, deadline, results)) for _ in range(readers)]
+        procs += [multiprocessing.Process(target=_writer, args=(path, pragmas, deadline, results)) for _ in range(writers)]
+        for proc in procs:
+            proc.start()
+        totals = {"read": [0, 0], "write": [0, 0]}
+        for _ in procs:
+            kind, ok, errors = results.get()
+            totals[kind][0] += ok
+            totals[kind][1] += errors
+        for proc in procs:
+            proc.join()
+    return {
+        "profile": name,
+        "reads_per_sec": totals["read"][0] / seconds,
+        "read_errors": totals["read"][1],
+        "writes_per_sec": totals["write"][0] / seconds,
+        "write_errors": totals["write"][1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'reads/s':>12}{'read err':>10}{'writes/s':>12}{'write err':>11}")
+    for name, pragmas in (("default", DEFAULT_PRAGMAS), ("wal", SQLITE_PRAGMAS)):
+        result = run_profile(name, pragmas, args.readers, args.writers, args.seconds, args.rows)
+        print(f"{result['profile']:<10}{result['reads_per_sec']:>12.0f}{result['read_errors']:>10}"
+              f"{result['writes_per_sec']:>12.0f}{result['write_errors']:>11}")
+
+if __name__ == "__main__":
+    main()
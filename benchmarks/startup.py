@@ -0,0 +1,46 @@
+"""Worker start-up time: importing the app, building it and serving the first request.
+
+Each run is a fresh interpreter, like a newly forked gunicorn worker without
+--preload. Run with ``python -m benchmarks.startup [--runs 10]``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get("/")
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=root)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    print(f"{'phase':<18}{'median ms':>11}{'max ms':>9}")
+    for phase in ("import_ms", "create_app_ms", "first_request_ms"):
+        values = [sample[phase] for sample in samples]
+        print(f"{phase[:-3]:<18}{statistics.median(values):>11.1f}{max(values):>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+from flask import current_app
+from datetime import datetime
+from sqlalchemy import insert
+from werkzeug.utils import secure_filename
+from models import db, Category, Listing, ListingImage
+import csv
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+import zipfile
+
+LISTING_TYPES = {"exchange", "sale", "loan", "donation"}
+CONDITIONS = {"New", "Like New", "Good", "Fair", "Poor"}
+REQUIRED_FIELDS = ("title", "description", "condition", "category", "listing_type")
+MAX_REPORTED_ERRORS = 100
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.images = 0
+        self.failed = 0
+        self.errors = []  # (line number, message), capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "images": self.images,
+            "failed": self.failed,
+            "errors": [{"line": line, "error": message} for line, message in self.errors]
+        }
+
+class ImageSource:
+    """Looks up image files referenced by import rows in a directory or a zip archive."""
+
+    def __init__(self, path_or_file, allowed_extensions):
+        self.allowed_extensions = allowed_extensions
+        self.directory = None
+        self.archive = None
+        if isinstance(path_or_file, str) and os.path.isdir(path_or_file):
+            self.directory = path_or_file
+        else:
+            self.archive = zipfile.ZipFile(path_or_file)
+            # Rows reference images by file name, wherever they sit in the archive
+            self.members = {os.path.basename(name): name for name in self.archive.namelist() if not name.endswith("/")}
+
+    def check(self, name):
+        """Why image name cannot be imported, or None if it can."""
+        filename = secure_filename(os.path.basename(name))
+        if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in self.allowed_extensions:
+            return f"Unsupported image type: {name!r}"
+        if self.directory:
+            found = os.path.isfile(os.path.join(self.directory, os.path.basename(name)))
+        else:
+            found = os.path.basename(name) in self.members
+        return None if found else f"Image not found: {name!r}"
+
+    def save(self, name, destination_folder):
+        """Copy image name into destination_folder; returns the stored filename or None."""
+        filename = secure_filename(os.path.basename(name))
+        if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in self.allowed_extensions:
+            return None
+        unique_filename = f"{uuid.uuid4()}_{filename}"
+        destination = os.path.join(destination_folder, unique_filename)
+        if self.directory:
+            source_path = os.path.join(self.directory, os.path.basename(name))
+            if not os.path.isfile(source_path):
+                return None
+            shutil.copyfile(source_path, destination)
+        else:
+            member = self.members.get(os.path.basename(name))
+            if member is None:
+                return None
+            with self.archive.open(member) as source, open(destination, "wb") as target:
+                shutil.copyfileobj(source, target)
+        return unique_filename
+
+    def close(self):
+        if self.archive:
+            self.archive.close()
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def _is_utf8(text):
+    # surrogateescape decoding turns invalid bytes into lone surrogates, which do not encode back
+    try:
+        text.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def iter_rows(stream, fmt):
+    """Yield (line number, dict or error) from a binary stream without loading it whole."""
+    # Invalid UTF-8 fails the rows it appears in rather than the whole import
+    stream = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="surrogateescape", newline="")
+    if fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if not _is_utf8(line):
+                yield line_number, ValueError("Invalid UTF-8 text")
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError("Expected a JSON object")
+    else:
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                yield reader.line_num, ValueError(f"Invalid CSV: {e}")
+                continue
+            if not all(_is_utf8(value) for value in row.values() if isinstance(value, str)):
+                yield reader.line_num, ValueError("Invalid UTF-8 text")
+                continue
+            yield reader.line_num, row
+
+def _optional_float(value, field):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {field}: {value!r}")
+
+def _optional_text(value, field):
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid {field}: {value!r}")
+    return value
+
+def validate_row(row, category_ids):
+    """Turn a raw import row into Listing column values; raises ValueError when invalid."""
+    row = {key.strip().lower(): (value.strip() if isinstance(value, str) else value)
+           for key, value in row.items() if key}
+
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError("Missing required fields: " + ", ".join(missing))
+
+    # JSONL values can be any JSON type; check for strings before the set lookups
+    if not isinstance(row["listing_type"], str) or row["listing_type"].lower() not in LISTING_TYPES:
+        raise ValueError(f"Invalid listing_type: {row['listing_type']!r}")
+    listing_type = row["listing_type"].lower()
+    if not isinstance(row["condition"], str) or row["condition"] not in CONDITIONS:
+        raise ValueError(f"Invalid condition: {row['condition']!r}")
+
+    category_id = category_ids.get(row["category"].lower()) if isinstance(row["category"], str) else None
+    if category_id is None:
+        raise ValueError(f"Unknown category: {row['category']!r}")
+
+    loan_duration = None
+    if listing_type == "loan" and row.get("loan_duration") not in (None, ""):
+        try:
+            loan_duration = int(row["loan_duration"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid loan_duration: {row['loan_duration']!r}")
+
+    images = row.get("images") or []
+    if isinstance(images, str):
+        images = [name.strip() for name in images.split(";") if name.strip()]
+    if not isinstance(images, list) or not all(isinstance(name, str) for name in images):
+        raise ValueError(f"Invalid images: {row['images']!r}")
+
+    return {
+        "title": str(row["title"])[:100],
+        "description": str(row["description"]),
+        "condition": row["condition"],
+        "category_id": category_id,
+        "listing_type": listing_type,
+        "price": _optional_float(row.get("price"), "price") if listing_type == "sale" else None,
+        "exchange_preferences": (_optional_text(row.get("exchange_preferences"), "exchange_preferences")
+                                 if listing_type == "exchange" else None),
+        "loan_duration": loan_duration,
+        "location": _optional_text(row.get("location"), "location"),
+        "latitude": _optional_float(row.get("latitude"), "latitude"),
+        "longitude": _optional_float(row.get("longitude"), "longitude"),
+    }, images
+
+def import_listings(stream, fmt, user_id, image_source=None, batch_size=1000, pause=0, progress=None):
+    """Validate and insert listings from stream for user_id, batch_size rows per transaction.
+
+    Each batch is committed on its own so the write lock is only held briefly
+    and interactive requests can interleave; pause (seconds) can be used to
+    yield between batches. progress, if given, is called with the ImportResult
+    after every batch. With an image_source, rows naming images it does not
+    have (or of an unsupported type) fail.
+    """
+    result = ImportResult()
+    category_ids = {name.lower(): category_id for category_id, name in db.session.query(Category.id, Category.name)}
+    images_folder = current_app.config['LISTING_IMAGES_FOLDER']
+    if image_source:
+        os.makedirs(images_folder, exist_ok=True)
+    batch = []
+
+    def flush():
+        # Copy the images first so the write transaction only covers the inserts
+        stored_images = [
+            [filename for filename in (image_source.save(name, images_folder) for name in images) if filename]
+            if image_source else []
+            for _, images in batch
+        ]
+
+        now = datetime.utcnow()
+        rows = [dict(values, user_id=user_id, is_active=True, views=0, version=1, created_at=now, updated_at=now)
+                for values, _ in batch]
+        listing_ids = db.session.execute(
+            insert(Listing).returning(Listing.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        image_rows = [
+            {
+                "filename": filename,
+                "is_primary": position == 0,  # First image is primary
+                "listing_id": listing_id,
+                "created_at": now
+            }
+            for listing_id, filenames in zip(listing_ids, stored_images)
+            for position, filename in enumerate(filenames)
+        ]
+        if image_rows:
+            db.session.execute(insert(ListingImage), image_rows)
+        db.session.commit()
+
+        result.imported += len(rows)
+        result.images += len(image_rows)
+        batch.clear()
+        if progress:
+            progress(result)
+        if pause:
+            time.sleep(pause)
+
+    for line_number, row in iter_rows(stream, fmt):
+        if isinstance(row, Exception):
+            result.add_error(line_number, str(row))
+            continue
+        try:
+            values, images = validate_row(row, category_ids)
+        except ValueError as e:
+            result.add_error(line_number, str(e))
+            continue
+        problems = [problem for problem in map(image_source.check, images) if problem] if image_source else []
+        if problems:
+            result.add_error(line_number, "; ".join(problems))
+            continue
+        batch.append((values, images))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    return result
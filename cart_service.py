@@ -0,0 +1,93 @@
+from datetime import datetime
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from models import db, CartItem, CartSummary, Listing
+
+def is_available(listing):
+    """Whether a cart item's listing can still be bought."""
+    return listing.is_active and listing.listing_type == "sale"
+
+def cart_items(user_id):
+    """user_id's cart items with their listing, its owner and primary image, in one query."""
+    return CartItem.query.join(CartItem.listing).options(
+        contains_eager(CartItem.listing).joinedload(Listing.owner),
+        contains_eager(CartItem.listing).joinedload(Listing.primary_image)
+    ).filter(CartItem.user_id == user_id).order_by(CartItem.added_at, CartItem.id).all()
+
+def total_price(items):
+    """Price of the items that can still be bought (quantity is always 1)."""
+    return sum(item.listing.price for item in items if is_available(item.listing) and item.listing.price)
+
+def cart_summary(user_id, commit=True):
+    """Item count, total and number of unavailable items of user_id's cart.
+
+    Served from the CartSummary row. A missing row (never computed, or
+    dropped by invalidate_cart/invalidate_listing_carts) is recomputed and
+    stored by one INSERT ... SELECT, so the totals are read under the same
+    write lock that stores them and a concurrent invalidation cannot be
+    overwritten with stale numbers.
+    """
+    summary = db.session.get(CartSummary, user_id)
+    if summary is not None:
+        return summary
+    available = db.and_(Listing.is_active == True, Listing.listing_type == "sale")
+    totals = select(
+        literal(user_id),
+        func.count(CartItem.id),
+        func.coalesce(func.sum(case((available, func.coalesce(Listing.price, 0)), else_=0)), 0),
+        func.coalesce(func.sum(case((available, 0), else_=1)), 0),
+        literal(datetime.utcnow())
+    ).select_from(CartItem).join(Listing, CartItem.listing_id == Listing.id).where(CartItem.user_id == user_id)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(CartSummary).from_select(
+                ["user_id", "item_count", "total_price", "unavailable_count", "computed_at"], totals
+            ))
+    except IntegrityError:
+        # Another request stored it first
+        pass
+    if commit:
+        db.session.commit()
+    return db.session.get(CartSummary, user_id)
+
+def _forget_loaded_summaries():
+    # Bulk deletes skip the session; drop summaries loaded earlier in the request
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, CartSummary):
+            db.session.expunge(obj)
+
+def invalidate_cart(user_id):
+    """Drop user_id's cached summary after their cart changed; the caller commits."""
+    db.session.execute(
+        delete(CartSummary).where(CartSummary.user_id == user_id).execution_options(synchronize_session=False)
+    )
+    _forget_loaded_summaries()
+
+def invalidate_listing_carts(listing_ids):
+    """Drop the cached summary of every cart holding one of listing_ids; the caller commits.
+
+    Call it when a listing's price, type or availability changes, before
+    deleting a listing, and when one is sold.
+    """
+    holders = select(CartItem.user_id).where(CartItem.listing_id.in_(listing_ids))
+    db.session.execute(
+        delete(CartSummary).where(CartSummary.user_id.in_(holders)).execution_options(synchronize_session=False)
+    )
+    _forget_loaded_summaries()
+
+def adjust_cart_summary(user_id, listing, delta):
+    """Apply adding (delta=1) or removing (delta=-1) listing to user_id's cached summary; the caller commits.
+
+    Does nothing when no summary is cached; the next cart_summary call computes it.
+    """
+    values = {"item_count": CartSummary.item_count + delta}
+    if is_available(listing):
+        values["total_price"] = func.round(CartSummary.total_price + delta * (listing.price or 0), 2)
+    else:
+        values["unavailable_count"] = CartSummary.unavailable_count + delta
+    db.session.execute(
+        update(CartSummary).where(CartSummary.user_id == user_id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    _forget_loaded_summaries()
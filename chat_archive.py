@@ -0,0 +1,177 @@
+from flask import current_app
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sqlalchemy import and_, case, delete, func, or_, select
+from models import db, ArchivedMessageDeletion, ChatMessage, ChatArchiveSegment
+import gzip
+import json
+import os
+
+# Same attribute names as ChatMessage so views can serialize either
+ArchivedMessage = namedtuple(
+    "ArchivedMessage",
+    ["id", "sender_id", "receiver_id", "message", "message_type", "media_url", "is_read", "timestamp"]
+)
+
+def pair(user_a, user_b):
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+def _between(low, high):
+    return or_(
+        and_(ChatMessage.sender_id == low, ChatMessage.receiver_id == high),
+        and_(ChatMessage.sender_id == high, ChatMessage.receiver_id == low)
+    )
+
+def _segment_path(segment):
+    return os.path.join(current_app.config['CHAT_ARCHIVE_FOLDER'], segment.path)
+
+def _write_segment(path, messages):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for message in messages:
+            f.write(json.dumps({
+                "id": message.id,
+                "sender_id": message.sender_id,
+                "receiver_id": message.receiver_id,
+                "message": message.message,
+                "message_type": message.message_type,
+                "media_url": message.media_url,
+                "is_read": message.is_read,
+                "timestamp": message.timestamp.isoformat(),
+            }) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _deleted_ids(low, high):
+    return set(db.session.scalars(
+        select(ArchivedMessageDeletion.message_id)
+        .where(ArchivedMessageDeletion.user_low_id == low, ArchivedMessageDeletion.user_high_id == high)
+    ))
+
+@lru_cache(maxsize=256)
+def _read_segment(path):
+    # Segments never change once written, so decoded ones can be kept
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return tuple(
+            ArchivedMessage(**dict(row, timestamp=datetime.fromisoformat(row["timestamp"])))
+            for row in map(json.loads, f)
+        )
+
+def archive_messages(older_than, segment_size=500, progress=None):
+    """Move read messages sent before older_than into compressed per-conversation segments.
+
+    Each segment holds up to segment_size messages of one pair of users. Its
+    file is written and synced before the transaction that records it and
+    deletes the rows commits, so a crash leaves at worst an unreferenced file
+    that the next run overwrites. Returns (messages archived, segments written).
+    """
+    # Unread messages stay hot so the receiver still sees and clears them
+    archivable = and_(ChatMessage.timestamp < older_than, ChatMessage.is_read == True)
+    low = case((ChatMessage.sender_id <= ChatMessage.receiver_id, ChatMessage.sender_id), else_=ChatMessage.receiver_id)
+    high = case((ChatMessage.sender_id <= ChatMessage.receiver_id, ChatMessage.receiver_id), else_=ChatMessage.sender_id)
+    pairs = db.session.execute(select(low, high).where(archivable).distinct()).all()
+
+    archived = segments = 0
+    for user_low_id, user_high_id in pairs:
+        while True:
+            messages = ChatMessage.query.filter(_between(user_low_id, user_high_id), archivable) \
+                .order_by(ChatMessage.id).limit(segment_size).all()
+            if not messages:
+                break
+            relative_path = os.path.join(
+                str(user_low_id), str(user_high_id), f"{messages[0].id}-{messages[-1].id}.jsonl.gz"
+            )
+            segment = ChatArchiveSegment(
+                user_low_id=user_low_id,
+                user_high_id=user_high_id,
+                first_message_id=messages[0].id,
+                last_message_id=messages[-1].id,
+                first_message_at=messages[0].timestamp,
+                last_message_at=messages[-1].timestamp,
+                message_count=len(messages),
+                path=relative_path
+            )
+            _write_segment(_segment_path(segment), messages)
+            db.session.add(segment)
+            db.session.execute(
+                delete(ChatMessage)
+                .where(ChatMessage.id.in_([message.id for message in messages]))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            db.session.expunge_all()
+            archived += len(messages)
+            segments += 1
+            if progress:
+                progress(archived, segments)
+            if len(messages) < segment_size:
+                break
+    return archived, segments
+
+def archive_cutoff():
+    return datetime.utcnow() - timedelta(days=current_app.config['CHAT_ARCHIVE_AFTER_DAYS'])
+
+def archived_messages(user_a, user_b, before=None, limit=50):
+    """Up to limit archived messages between two users with id < before, newest first."""
+    low, high = pair(user_a, user_b)
+    query = ChatArchiveSegment.query.filter_by(user_low_id=low, user_high_id=high)
+    if before is not None:
+        query = query.filter(ChatArchiveSegment.first_message_id < before)
+    deleted = _deleted_ids(low, high)
+    found = []
+    for segment in query.order_by(ChatArchiveSegment.last_message_id.desc()):
+        # A message that was unread when its neighbours were archived ends up in
+        # a later segment, so ranges can overlap; stop once no segment can
+        # hold anything newer than what is already on the page
+        if len(found) >= limit and segment.last_message_id < found[limit - 1].id:
+            break
+        found.extend(message for message in _read_segment(_segment_path(segment))
+                     if (before is None or message.id < before) and message.id not in deleted)
+        found.sort(key=lambda message: message.id, reverse=True)
+    return found[:limit]
+
+def newest_archived_id(user_a, user_b, before=None):
+    """Highest archived message id between two users below before, or None.
+
+    Deleted archived messages are not excluded, so the id is an upper bound.
+    """
+    low, high = pair(user_a, user_b)
+    query = db.session.query(func.max(ChatArchiveSegment.last_message_id)).filter(
+        ChatArchiveSegment.user_low_id == low, ChatArchiveSegment.user_high_id == high
+    )
+    if before is not None:
+        query = query.filter(ChatArchiveSegment.first_message_id < before)
+    return query.scalar()
+
+def latest_archived_message(user_a, user_b):
+    """The newest archived message between two users, or None."""
+    messages = archived_messages(user_a, user_b, limit=1)
+    return messages[0] if messages else None
+
+def find_archived_message(message_id):
+    """The archived message with message_id, or None if there is none or it was deleted."""
+    if db.session.get(ArchivedMessageDeletion, message_id) is not None:
+        return None
+    segments = ChatArchiveSegment.query.filter(
+        ChatArchiveSegment.first_message_id <= message_id, ChatArchiveSegment.last_message_id >= message_id
+    )
+    for segment in segments:
+        for message in _read_segment(_segment_path(segment)):
+            if message.id == message_id:
+                return message
+    return None
+
+def delete_archived_message(message):
+    """Record an archived message as deleted; the caller commits."""
+    low, high = pair(message.sender_id, message.receiver_id)
+    db.session.add(ArchivedMessageDeletion(message_id=message.id, user_low_id=low, user_high_id=high))
+
+def archived_pairs():
+    """{(user_low_id, user_high_id): newest archived message id} of every conversation with archived messages."""
+    rows = db.session.query(
+        ChatArchiveSegment.user_low_id, ChatArchiveSegment.user_high_id, func.max(ChatArchiveSegment.last_message_id)
+    ).group_by(ChatArchiveSegment.user_low_id, ChatArchiveSegment.user_high_id)
+    return {(low, high): last_id for low, high, last_id in rows}
@@ -0,0 +1,225 @@
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from models import db, User, Category, ChatMessage, Conversation, UserSearchToken, Review, ReviewTag, upgrade_schema
+from helpers import ALLOWED_EXTENSIONS
+from bulk_import import ImageSource, detect_format, import_listings
+from conversations import rebuild_conversations
+from user_search import rebuild_user_search
+from review_tags import rebuild_review_tags
+from chat_archive import archive_cutoff, archive_messages
+from inbox import purge_notifications
+from wishlist_alerts import process_alerts
+from loan_scheduler import LoanScheduler
+from datetime import datetime, timedelta
+import click
+import os
+import time
+
+DEFAULT_CATEGORIES = [
+    {"name": "Electronics", "description": "Electronic devices and gadgets"},
+    {"name": "Clothing", "description": "Apparel and fashion items"},
+    {"name": "Home & Garden", "description": "Items for home and garden"},
+    {"name": "Books", "description": "Books, textbooks, and literature"},
+    {"name": "Sports & Outdoors", "description": "Sports equipment and outdoor gear"},
+    {"name": "Toys & Games", "description": "Toys, games, and entertainment items"},
+    {"name": "Vehicles", "description": "Cars, bikes, and other vehicles"},
+    {"name": "Collectibles", "description": "Collectible items and memorabilia"}
+]
+
+def init_db():
+    """Create missing tables, columns, indexes and upload folders."""
+    db.create_all()  # Create database tables (if they don't exist)
+    upgrade_schema()  # Add new columns/indexes to tables created by older versions
+    # Conversations were introduced after chat; index existing messages once
+    if not Conversation.query.first() and ChatMessage.query.first():
+        rebuild_conversations()
+    if not UserSearchToken.query.first() and User.query.first():
+        rebuild_user_search()
+    if not ReviewTag.query.first() and Review.query.filter(Review.tags.isnot(None)).first():
+        rebuild_review_tags()
+    for folder_key in ('UPLOAD_FOLDER', 'LISTING_IMAGES_FOLDER', 'PROFILE_IMAGES_FOLDER', 'CHAT_ARCHIVE_FOLDER'):
+        os.makedirs(current_app.config[folder_key], exist_ok=True)
+
+def seed_db():
+    """Create the admin user and default categories if they don't exist."""
+    admin = User.query.filter_by(email="admin@example.com").first()
+    if not admin:
+        admin = User(
+            email="admin@example.com",
+            password=generate_password_hash("adminpassword123"),
+            role="admin",
+            first_name="Admin",
+            last_name="User"
+        )
+        db.session.add(admin)
+    
+    existing = {name for name, in db.session.query(Category.name)}
+    for category_data in DEFAULT_CATEGORIES:
+        if category_data["name"] not in existing:
+            category = Category(
+                name=category_data["name"],
+                description=category_data["description"]
+            )
+            db.session.add(category)
+    
+    db.session.commit()
+
+@click.command("init-db")
+@click.option("--seed/--no-seed", default=True, help="Also create the admin user and default categories.")
+@with_appcontext
+def init_db_command(seed):
+    """Create the database schema (run once per deploy, not per worker)."""
+    init_db()
+    click.echo("Database schema is up to date.")
+    if seed:
+        seed_db()
+        click.echo("Seed data created.")
+
+@click.command("seed")
+@with_appcontext
+def seed_command():
+    """Create the admin user and default categories."""
+    seed_db()
+    click.echo("Seed data created.")
+
+@click.command("rebuild-conversations")
+@with_appcontext
+def rebuild_conversations_command():
+    """Rebuild the conversation index from all chat messages."""
+    count = rebuild_conversations()
+    click.echo(f"Rebuilt {count:,} conversations.")
+
+@click.command("rebuild-user-search")
+@with_appcontext
+def rebuild_user_search_command():
+    """Rebuild the user search index from all users."""
+    count = rebuild_user_search()
+    click.echo(f"Indexed {count:,} users.")
+
+@click.command("rebuild-review-tags")
+@with_appcontext
+def rebuild_review_tags_command():
+    """Rebuild the review tag index and tag counts from all reviews."""
+    count = rebuild_review_tags()
+    click.echo(f"Indexed {count:,} reviews.")
+
+@click.command("archive-messages")
+@click.option("--older-than-days", type=int, default=None, help="Defaults to CHAT_ARCHIVE_AFTER_DAYS.")
+@click.option("--segment-size", type=int, default=None, help="Messages per segment file.")
+@with_appcontext
+def archive_messages_command(older_than_days, segment_size):
+    """Move old read chat messages into compressed archive segments."""
+    if older_than_days is None:
+        older_than = archive_cutoff()
+    else:
+        older_than = datetime.utcnow() - timedelta(days=older_than_days)
+    
+    def progress(archived, segments):
+        click.echo(f"\r{archived:,} messages in {segments:,} segments", nl=False)
+    
+    archived, segments = archive_messages(
+        older_than,
+        segment_size=segment_size or current_app.config['CHAT_ARCHIVE_SEGMENT_SIZE'],
+        progress=progress
+    )
+    click.echo(f"\nArchived {archived:,} messages sent before {older_than:%Y-%m-%d} into {segments:,} segments.")
+
+@click.command("purge-notifications")
+@click.option("--older-than-days", type=int, default=None, help="Defaults to NOTIFICATION_RETENTION_DAYS.")
+@click.option("--batch-size", type=int, default=None, help="Rows deleted per transaction.")
+@with_appcontext
+def purge_notifications_command(older_than_days, batch_size):
+    """Delete read notifications past the retention period."""
+    if older_than_days is None:
+        older_than_days = current_app.config['NOTIFICATION_RETENTION_DAYS']
+    older_than = datetime.utcnow() - timedelta(days=older_than_days)
+    
+    def progress(deleted):
+        click.echo(f"\r{deleted:,} deleted", nl=False)
+    
+    deleted = purge_notifications(
+        older_than,
+        batch_size=batch_size or current_app.config['NOTIFICATION_PURGE_BATCH'],
+        progress=progress
+    )
+    click.echo(f"\nDeleted {deleted:,} read notifications created before {older_than:%Y-%m-%d}.")
+
+@click.command("process-wishlist-alerts")
+@click.option("--loop", is_flag=True, help="Keep polling for new alerts instead of exiting when none are left.")
+@click.option("--interval", type=float, default=5, help="Seconds between polls with --loop.")
+@with_appcontext
+def process_wishlist_alerts_command(loop, interval):
+    """Send pending wishlist alerts (for deployments with WISHLIST_ALERTS_ASYNC=0)."""
+    while True:
+        processed = process_alerts()
+        if processed or not loop:
+            click.echo(f"Processed {processed:,} wishlist alerts.")
+        if not loop:
+            break
+        time.sleep(interval)
+
+@click.command("loan-scheduler")
+@click.option("--once", is_flag=True, help="Send the notices due now and exit, e.g. from cron.")
+@with_appcontext
+def loan_scheduler_command(once):
+    """Send loan due-date reminders and overdue notices."""
+    scheduler = LoanScheduler(timedelta(hours=current_app.config['LOAN_REMINDER_HOURS']),
+                              current_app.config['LOAN_SCHEDULER_POLL'])
+
+    def report(sent):
+        click.echo(", ".join(f"{count:,} {kind}" for kind, count in sorted(sent.items())) or "Nothing due.")
+
+    if once:
+        now = datetime.utcnow()
+        scheduler.start(now)
+        report(scheduler.run_due(now))
+        return
+    click.echo("Loan scheduler running; press Ctrl+C to stop.")
+    scheduler.run(progress=report)
+
+@click.command("import-listings")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user-email", required=True, help="Owner of the imported listings.")
+@click.option("--images", "images_path", type=click.Path(exists=True), help="Directory or zip archive with the images.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Defaults to the file extension.")
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction.")
+@click.option("--pause", type=float, default=0, help="Seconds to sleep between batches.")
+@with_appcontext
+def import_listings_command(path, user_email, images_path, fmt, batch_size, pause):
+    """Bulk import listings from a CSV or JSONL file."""
+    user = User.query.filter_by(email=user_email).first()
+    if not user:
+        raise click.ClickException(f"No user with email {user_email}")
+    
+    image_source = ImageSource(images_path, ALLOWED_EXTENSIONS) if images_path else None
+    started = datetime.now()
+    
+    def progress(result):
+        elapsed = (datetime.now() - started).total_seconds() or 1e-9
+        click.echo(f"\r{result.imported:,} imported, {result.failed:,} failed ({result.imported / elapsed:,.0f} rows/s)", nl=False)
+    
+    try:
+        with open(path, "rb") as stream:
+            result = import_listings(
+                stream,
+                fmt or detect_format(path),
+                user.id,
+                image_source=image_source,
+                batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+                pause=pause,
+                progress=progress
+            )
+    finally:
+        if image_source:
+            image_source.close()
+    
+    click.echo(f"\nImported {result.imported:,} listings with {result.images:,} images; {result.failed:,} rows failed.")
+    for line, message in result.errors:
+        click.echo(f"  line {line}: {message}", err=True)
+
+def register_commands(app):
+    for command in (init_db_command, seed_command, rebuild_conversations_command, rebuild_user_search_command,
+                    rebuild_review_tags_command, archive_messages_command, purge_notifications_command, process_wishlist_alerts_command,
+                    loan_scheduler_command, import_listings_command):
+        app.cli.add_command(command)
@@ -0,0 +1,229 @@
+import itertools
+import zlib
+
+# brotli and zstandard are optional; encodings whose module is missing are
+# simply never offered.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Server preference when the client accepts several encodings equally
+PREFERENCE = ("zstd", "br", "gzip")
+DEFAULT_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/msgpack",
+    "image/svg+xml",
+}
+
+# Known-length bodies up to this size are compressed in one go so the
+# response keeps a Content-Length; larger ones are streamed.
+BUFFER_LIMIT = 1024 * 1024
+
+def _gzip_compressor(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def _brotli_compressor(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.flush, compressor.finish
+
+def _zstd_compressor(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush)
+
+COMPRESSORS = {"gzip": _gzip_compressor}
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli_compressor
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _zstd_compressor
+
+def negotiate(accept_encoding, available=None):
+    """Pick the encoding to use for an Accept-Encoding header, or None for identity."""
+    available = [name for name in PREFERENCE if name in (available or COMPRESSORS)]
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    if "x-gzip" in weights and "gzip" not in weights:
+        weights["gzip"] = weights["x-gzip"]
+
+    best, best_q = None, 0.0
+    for name in available:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+def is_compressible(content_type):
+    mimetype = content_type.split(";", 1)[0].strip().lower()
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+class CompressionMiddleware:
+    """WSGI middleware that compresses responses with gzip, brotli or zstd.
+
+    Bodies smaller than min_size, non-text types such as images, and responses
+    that are already encoded pass through untouched. Streaming responses are
+    compressed chunk by chunk and flushed after every chunk so clients still
+    receive data as it is produced. levels maps a mimetype to per-encoding
+    levels, e.g. {"application/json": {"br": 5}}; anything unset falls back to
+    DEFAULT_LEVELS.
+    """
+
+    def __init__(self, app, min_size=500, levels=None):
+        self.app = app
+        self.min_size = min_size
+        self.levels = levels or {}
+
+    def level(self, content_type, encoding):
+        mimetype = content_type.split(";", 1)[0].strip().lower()
+        return self.levels.get(mimetype, {}).get(encoding, DEFAULT_LEVELS[encoding])
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None or environ.get("REQUEST_METHOD") == "HEAD":
+            return self.app(environ, start_response)
+
+        state = {}
+
+        def capture(status, headers, exc_info=None):
+            state["status"], state["headers"], state["exc_info"] = status, headers, exc_info
+            return state.setdefault("written", []).append
+
+        app_iter = self.app(environ, capture)
+        return self._respond(app_iter, encoding, state, start_response)
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(" ", 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        found = {name.lower(): value for name, value in headers}
+        if "content-encoding" in found or "no-transform" in found.get("cache-control", "").lower():
+            return False
+        if not is_compressible(found.get("content-type", "")):
+            return False
+        length = found.get("content-length")
+        return length is None or not length.isdigit() or int(length) >= self.min_size
+
+    def _respond(self, app_iter, encoding, state, start_response):
+        iterator = iter(app_iter)
+        try:
+            # The app may only call start_response once it yields its first chunk
+            first = []
+            if "status" not in state:
+                chunk = next(iterator, None)
+                if chunk is not None:
+                    first.append(chunk)
+            if "status" not in state:
+                raise RuntimeError("The application did not call start_response")
+        except BaseException:
+            _close(app_iter)
+            raise
+        status, headers = state["status"], state["headers"]
+        # Anything sent through the legacy write() callable goes first
+        prefix = state.get("written", []) + first
+
+        if not self._should_compress(status, headers):
+            start_response(status, headers, state.get("exc_info"))
+            return _chain(prefix, iterator, app_iter)
+
+        length = next((value for name, value in headers if name.lower() == "content-length"), None)
+        if length is not None and not length.isdigit():
+            # Malformed, as in _should_compress: treat the length as unknown
+            length = None
+        content_type = next((value for name, value in headers if name.lower() == "content-type"), "")
+        compress, flush, finish = COMPRESSORS[encoding](self.level(content_type, encoding))
+
+        if length is not None and int(length) <= BUFFER_LIMIT:
+            try:
+                body = b"".join(prefix) + b"".join(iterator)
+            finally:
+                _close(app_iter)
+            compressed = compress(body) + finish()
+            start_response(status, _encoded_headers(headers, encoding, len(compressed)), state.get("exc_info"))
+            return [compressed]
+
+        if length is None:
+            # Streaming: peek far enough to tell whether the body is worth compressing
+            size = sum(len(chunk) for chunk in prefix)
+            try:
+                while size < self.min_size:
+                    chunk = next(iterator, None)
+                    if chunk is None:
+                        start_response(status, headers, state.get("exc_info"))
+                        return _chain(prefix, iterator, app_iter)
+                    prefix.append(chunk)
+                    size += len(chunk)
+            except BaseException:
+                _close(app_iter)
+                raise
+
+        start_response(status, _encoded_headers(headers, encoding), state.get("exc_info"))
+        return _stream(prefix, iterator, app_iter, compress, flush, finish, flush_chunks=length is None)
+
+def _encoded_headers(headers, encoding, length=None):
+    result = []
+    vary = None
+    for name, value in headers:
+        lowered = name.lower()
+        if lowered == "content-length":
+            continue
+        if lowered == "vary":
+            vary = value
+            continue
+        if lowered == "etag" and not value.startswith("W/"):
+            # The compressed body is no longer byte-for-byte the original
+            value = "W/" + value
+        result.append((name, value))
+    result.append(("Content-Encoding", encoding))
+    if vary and "accept-encoding" not in vary.lower():
+        result.append(("Vary", vary + ", Accept-Encoding"))
+    else:
+        result.append(("Vary", vary or "Accept-Encoding"))
+    if length is not None:
+        result.append(("Content-Length", str(length)))
+    return result
+
+def _close(app_iter):
+    close = getattr(app_iter, "close", None)
+    if close is not None:
+        close()
+
+def _chain(prefix, iterator, app_iter):
+    try:
+        yield from prefix
+        yield from iterator
+    finally:
+        _close(app_iter)
+
+def _stream(prefix, iterator, app_iter, compress, flush, finish, flush_chunks):
+    try:
+        for chunk in itertools.chain(prefix, iterator):
+            data = compress(chunk)
+            if flush_chunks:
+                data += flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        _close(app_iter)
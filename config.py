@@ -0,0 +1,113 @@
+import os
+import tempfile
+from database import database_uri, engine_options
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Config:
+    # DATABASE_URL selects the backend (SQLite by default, or postgresql://...)
+    SQLALCHEMY_DATABASE_URI = database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SECRET_KEY = os.environ.get('SECRET_KEY', os.urandom(24))  # Generate secure random key
+
+    # Upload folders are created on first use (see helpers.upload_path)
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
+    LISTING_IMAGES_FOLDER = os.path.join(UPLOAD_FOLDER, 'listings')
+    PROFILE_IMAGES_FOLDER = os.path.join(UPLOAD_FOLDER, 'profiles')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+
+    # Checkout holds keep a listing for the buyer who opened /checkout
+    CHECKOUT_HOLDS_ENABLED = os.environ.get('CHECKOUT_HOLDS_ENABLED', '1') == '1'
+    CHECKOUT_HOLD_SECONDS = int(os.environ.get('CHECKOUT_HOLD_SECONDS', 10 * 60))
+    CHECKOUT_HOLD_REAP_SECONDS = int(os.environ.get('CHECKOUT_HOLD_REAP_SECONDS', 60))
+
+    # Rows inserted per transaction by the bulk listing import, and the size of
+    # uploads to /api/listings/import (overrides MAX_CONTENT_LENGTH there)
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+
+    # Batch donation intake (/api/donations/batch): items per request, request
+    # size (overrides MAX_CONTENT_LENGTH for that endpoint) and image writers
+    DONATION_BATCH_MAX_ITEMS = int(os.environ.get('DONATION_BATCH_MAX_ITEMS', 500))
+    DONATION_BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('DONATION_BATCH_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+    DONATION_IMAGE_WORKERS = int(os.environ.get('DONATION_IMAGE_WORKERS', 4))
+
+    # Rendered listing cards kept per worker ({% cache %} blocks); 0 disables
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+    # Compiled templates shared on disk between workers; defaults to a per-user temp dir
+    JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE', '1') == '1'
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+
+    # JSON provider for responses: "auto" (orjson if installed), "orjson" or "default"
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
+    # Response compression (gzip, plus brotli/zstd when installed). Levels are
+    # per mimetype and encoding; unlisted ones use compression.DEFAULT_LEVELS
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_LEVELS = {
+        'text/html': {'gzip': 6, 'br': 5, 'zstd': 6},
+        'application/json': {'gzip': 5, 'br': 4, 'zstd': 3},
+        'application/msgpack': {'gzip': 1, 'br': 1, 'zstd': 1},
+    }
+
+    # Token-bucket rate limits: name -> {"user"/"ip": (tokens per second, burst)}.
+    # RATE_LIMIT_STORAGE=shared keeps buckets in a memory-mapped file so all
+    # workers on a host enforce the same limits.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE', 'memory')
+    RATE_LIMIT_SHM_PATH = os.environ.get('RATE_LIMIT_SHM_PATH', os.path.join(tempfile.gettempdir(), 'exchangify-ratelimit'))
+    # Per-IP limits use the client address. Behind N reverse proxies set this
+    # to N so it is read from X-Forwarded-For; left at 0, every client behind
+    # a proxy shares the proxy's bucket.
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    RATE_LIMITS = {
+        'notifications_count': {'user': (0.5, 10), 'ip': (2.5, 50)},
+        'users_search': {'user': (2, 20), 'ip': (10, 100)},
+        'messages_send': {'user': (1, 20), 'ip': (5, 100)},
+        'cart_add': {'user': (1, 10), 'ip': (5, 50)},
+    }
+
+    # Default number of /api/users/search results (clients may ask for up to 50)
+    USER_SEARCH_LIMIT = int(os.environ.get('USER_SEARCH_LIMIT', 20))
+
+    # Chat archival: read messages older than CHAT_ARCHIVE_AFTER_DAYS are moved
+    # by `flask archive-messages` into compressed per-conversation segment files
+    CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', 180))
+    CHAT_ARCHIVE_FOLDER = os.environ.get('CHAT_ARCHIVE_FOLDER', os.path.join(BASE_DIR, 'instance', 'chat_archive'))
+    CHAT_ARCHIVE_SEGMENT_SIZE = int(os.environ.get('CHAT_ARCHIVE_SEGMENT_SIZE', 500))
+    # Messages per /api/messages/<user_id> page (clients may ask for up to 200)
+    CHAT_PAGE_SIZE = int(os.environ.get('CHAT_PAGE_SIZE', 50))
+
+    # `flask purge-notifications` deletes read notifications older than this,
+    # NOTIFICATION_PURGE_BATCH rows per transaction
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+    NOTIFICATION_PURGE_BATCH = int(os.environ.get('NOTIFICATION_PURGE_BATCH', 1000))
+
+    # Wishlist alerts (price drops, listings sold) are fanned out in batches of
+    # WISHLIST_ALERT_BATCH wishers by a background thread, or by
+    # `flask process-wishlist-alerts` when WISHLIST_ALERTS_ASYNC=0. Each user
+    # gets at most WISHLIST_ALERT_LIMIT = (alerts, per seconds).
+    WISHLIST_ALERTS_ASYNC = os.environ.get('WISHLIST_ALERTS_ASYNC', '1') == '1'
+    WISHLIST_ALERT_BATCH = int(os.environ.get('WISHLIST_ALERT_BATCH', 1000))
+    WISHLIST_ALERT_LIMIT = (int(os.environ.get('WISHLIST_ALERT_LIMIT', 10)), 24 * 60 * 60)
+
+    # `flask loan-scheduler` reminds borrowers LOAN_REMINDER_HOURS before a
+    # loan is due and sends overdue notices; it looks for changed trades every
+    # LOAN_SCHEDULER_POLL seconds
+    LOAN_REMINDER_HOURS = int(os.environ.get('LOAN_REMINDER_HOURS', 24))
+    LOAN_SCHEDULER_POLL = int(os.environ.get('LOAN_SCHEDULER_POLL', 30))
+
+    # Yearly interest used for installment payment schedules and risk scores
+    INSTALLMENT_ANNUAL_RATE = float(os.environ.get('INSTALLMENT_ANNUAL_RATE', 0.10))
+
+    # SQL profiling: per-request query counts, N+1 detection and a query budget
+    SQL_PROFILER_ENABLED = os.environ.get('SQL_PROFILER', os.environ.get('FLASK_DEBUG', '0')) == '1'
+    SQL_PROFILER_HEADERS = os.environ.get('SQL_PROFILER_HEADERS', '0') == '1'
+    SQL_QUERY_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET', 50))
+
+    # Prometheus metrics; set METRICS_DIR to a directory shared by all workers
+    # so /metrics aggregates across gunicorn processes
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
@@ -0,0 +1,185 @@
+from datetime import datetime
+from sqlalchemy import and_, case, delete, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, ChatMessage, Conversation, User
+from chat_archive import archived_pairs, latest_archived_message, newest_archived_id, pair
+
+PREVIEW_LENGTH = 140
+PAGE_SIZE = 20
+
+def _pair_filter(low, high):
+    return and_(Conversation.user_low_id == low, Conversation.user_high_id == high)
+
+def preview_text(message):
+    if message.message_type == "image":
+        return "[Image]"
+    return (message.message or "")[:PREVIEW_LENGTH]
+
+def record_message(message):
+    """Make message the latest of its conversation and count it as unread for the receiver.
+
+    message must be flushed (it needs an id and timestamp); the caller commits.
+    """
+    low, high = pair(message.sender_id, message.receiver_id)
+    unread = "unread_high" if message.receiver_id == high else "unread_low"
+    # Concurrent sends may land out of order; only ever move the pointer forward
+    newer = or_(Conversation.last_message_id.is_(None), Conversation.last_message_id < message.id)
+    latest = {
+        "last_message_id": message.id,
+        "last_message_at": message.timestamp,
+        "last_sender_id": message.sender_id,
+        "preview": preview_text(message),
+    }
+    values = {name: case((newer, value), else_=getattr(Conversation, name)) for name, value in latest.items()}
+    values[unread] = getattr(Conversation, unread) + 1
+    statement = (
+        update(Conversation)
+        .where(_pair_filter(low, high))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(statement).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(Conversation(user_low_id=low, user_high_id=high, **latest, **{unread: 1}))
+    except IntegrityError:
+        # Another request created the conversation first
+        db.session.execute(statement)
+
+def mark_read(user_id, partner_id):
+    """Clear user_id's unread count for the conversation with partner_id; the caller commits."""
+    low, high = pair(user_id, partner_id)
+    unread = "unread_low" if user_id == low else "unread_high"
+    db.session.execute(
+        update(Conversation)
+        .where(_pair_filter(low, high), getattr(Conversation, unread) != 0)
+        .values(**{unread: 0})
+        .execution_options(synchronize_session=False)
+    )
+
+def refresh_conversation(user_a, user_b):
+    """Recompute a conversation from its messages, e.g. after one was deleted; the caller commits."""
+    low, high = pair(user_a, user_b)
+    last = ChatMessage.query.filter(or_(
+        and_(ChatMessage.sender_id == low, ChatMessage.receiver_id == high),
+        and_(ChatMessage.sender_id == high, ChatMessage.receiver_id == low)
+    )).order_by(ChatMessage.id.desc()).first()
+    newest_archived = newest_archived_id(low, high)
+    if newest_archived is not None and (last is None or newest_archived > last.id):
+        # None when the archived messages were all deleted
+        last = latest_archived_message(low, high) or last
+    if last is None:
+        db.session.execute(delete(Conversation).where(_pair_filter(low, high)))
+        return
+
+    def unread_count(sender_id, receiver_id):
+        return ChatMessage.query.filter_by(sender_id=sender_id, receiver_id=receiver_id, is_read=False).count()
+
+    db.session.execute(
+        update(Conversation)
+        .where(_pair_filter(low, high))
+        .values(
+            last_message_id=last.id if isinstance(last, ChatMessage) else None,
+            last_message_at=last.timestamp,
+            last_sender_id=last.sender_id,
+            preview=preview_text(last),
+            unread_low=unread_count(high, low) if low != high else 0,
+            unread_high=unread_count(low, high)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def encode_cursor(conversation):
+    return f"{conversation.last_message_at.isoformat()}|{conversation.id}"
+
+def decode_cursor(cursor):
+    """Parse a cursor from encode_cursor; raises ValueError if it is malformed."""
+    timestamp, _, conversation_id = cursor.partition("|")
+    return datetime.fromisoformat(timestamp), int(conversation_id)
+
+def conversations_for(user_id, before=None, limit=PAGE_SIZE):
+    """A page of user_id's conversations, most recent first.
+
+    Returns ([(conversation, partner)], cursor for the next page or None).
+    before is a decoded cursor. Each side of the pair is read through its own
+    index and the two sorted runs are merged, so the cost depends on the page
+    size, not on how many conversations or messages the user has.
+    """
+    def side(column):
+        query = Conversation.query.filter(column == user_id)
+        if before:
+            before_at, before_id = before
+            query = query.filter(or_(
+                Conversation.last_message_at < before_at,
+                and_(Conversation.last_message_at == before_at, Conversation.id < before_id)
+            ))
+        return query.order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(limit + 1).all()
+
+    merged = {conversation.id: conversation
+              for conversation in side(Conversation.user_low_id) + side(Conversation.user_high_id)}
+    page = sorted(merged.values(), key=lambda c: (c.last_message_at, c.id), reverse=True)[:limit + 1]
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    partner_ids = {conversation.partner_id(user_id) for conversation in page}
+    partners = {user.id: user for user in User.query.filter(User.id.in_(partner_ids))} if partner_ids else {}
+    items = [(conversation, partners.get(conversation.partner_id(user_id))) for conversation in page]
+    return items, (encode_cursor(page[-1]) if has_more else None)
+
+def rebuild_conversations(batch_size=1000):
+    """Recreate every Conversation row from ChatMessage; returns how many were written."""
+    low = case((ChatMessage.sender_id <= ChatMessage.receiver_id, ChatMessage.sender_id), else_=ChatMessage.receiver_id)
+    high = case((ChatMessage.sender_id <= ChatMessage.receiver_id, ChatMessage.receiver_id), else_=ChatMessage.sender_id)
+    unread = and_(ChatMessage.is_read == False, ChatMessage.sender_id != ChatMessage.receiver_id)
+    pairs = db.session.query(
+        low, high, func.max(ChatMessage.id),
+        func.sum(case((and_(unread, ChatMessage.receiver_id == low), 1), else_=0)),
+        func.sum(case((and_(unread, ChatMessage.receiver_id == high), 1), else_=0))
+    ).group_by(low, high).all()
+
+    db.session.execute(delete(Conversation))
+    archived = archived_pairs()
+    written = 0
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        last_messages = {message.id: message for message in
+                         ChatMessage.query.filter(ChatMessage.id.in_([row[2] for row in batch]))}
+        rows = []
+        for user_low_id, user_high_id, last_id, unread_low, unread_high in batch:
+            last = last_messages[last_id]
+            # Messages read after older ones were archived can be older than the archive
+            if archived.pop((user_low_id, user_high_id), 0) > last_id:
+                last = latest_archived_message(user_low_id, user_high_id) or last
+            rows.append({
+                "user_low_id": user_low_id,
+                "user_high_id": user_high_id,
+                "last_message_id": last.id if isinstance(last, ChatMessage) else None,
+                "last_message_at": last.timestamp,
+                "last_sender_id": last.sender_id,
+                "preview": preview_text(last),
+                "unread_low": unread_low or 0,
+                "unread_high": unread_high or 0,
+            })
+        db.session.execute(insert(Conversation), rows)
+        written += len(rows)
+
+    # Conversations whose messages have all been archived
+    rows = []
+    for user_low_id, user_high_id in archived:
+        last = latest_archived_message(user_low_id, user_high_id)
+        if last is None:
+            continue
+        rows.append({
+            "user_low_id": user_low_id,
+            "user_high_id": user_high_id,
+            "last_message_id": None,
+            "last_message_at": last.timestamp,
+            "last_sender_id": last.sender_id,
+            "preview": preview_text(last),
+        })
+    if rows:
+        db.session.execute(insert(Conversation), rows)
+        written += len(rows)
+    db.session.commit()
+    return written
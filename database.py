@@ -0,0 +1,54 @@
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_DATABASE_URI = "sqlite:///exchangify.db"
+
+# SQLite profile: WAL lets readers proceed while a writer commits, and
+# busy_timeout makes writers queue for the lock instead of failing with
+# "database is locked". Values can be overridden from the environment.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),  # negative = KiB
+}
+
+def database_uri():
+    """Read the database URL from DATABASE_URL, defaulting to the local SQLite file."""
+    uri = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URI)
+    # Some hosts still hand out the pre-SQLAlchemy-1.4 scheme
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+def engine_options(uri):
+    """Return SQLALCHEMY_ENGINE_OPTIONS tuned for the backend in uri."""
+    if uri.startswith("sqlite"):
+        # One connection per thread is enough; pragmas are applied in on_connect
+        return {}
+    if uri.startswith("postgresql"):
+        return {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+            "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+            "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+            "pool_pre_ping": True,
+        }
+    return {"pool_pre_ping": True}
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas=None):
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+@event.listens_for(Engine, "connect")
+def on_connect(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
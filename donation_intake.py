@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from datetime import datetime
+from sqlalchemy import insert, select
+from werkzeug.utils import secure_filename
+from models import db, Donation, User
+from bulk_import import CONDITIONS, MAX_REPORTED_ERRORS
+from helpers import allowed_file
+from inbox import notify, notify_many
+import os
+import uuid
+
+# Item names listed in the summary notification before "and N more"
+SUMMARY_NAMES = 3
+
+def validate_items(items, image_names, max_items):
+    """Turn raw batch items into Donation column values and image names.
+
+    items is the decoded JSON list; image_names the file names of the
+    uploaded images. Returns (values, errors), errors being
+    [(item index, message)] capped at MAX_REPORTED_ERRORS.
+    """
+    if not isinstance(items, list) or not items:
+        return [], [(None, "items must be a non-empty JSON list")]
+    if len(items) > max_items:
+        return [], [(None, f"At most {max_items} items per batch")]
+
+    values, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append((index, "Expected a JSON object"))
+            continue
+        item = {key: (value.strip() if isinstance(value, str) else value) for key, value in item.items()}
+        missing = [field for field in ("item_name", "description", "condition") if not item.get(field)]
+        if missing:
+            errors.append((index, "Missing required fields: " + ", ".join(missing)))
+            continue
+        if not isinstance(item["condition"], str) or item["condition"] not in CONDITIONS:
+            errors.append((index, f"Invalid condition: {item['condition']!r}"))
+            continue
+        image = item.get("image") or None
+        if image is not None and (not isinstance(image, str) or image not in image_names):
+            errors.append((index, f"No uploaded image named {image!r}"))
+            continue
+        if image is not None and not allowed_file(image):
+            errors.append((index, f"Unsupported image type: {image!r}"))
+            continue
+        values.append(({"item_name": str(item["item_name"])[:100], "description": str(item["description"]),
+                        "condition": item["condition"]}, image))
+    return values, errors[:MAX_REPORTED_ERRORS]
+
+def save_images(files, folder, workers):
+    """Write the uploaded files (name -> FileStorage) into folder with a pool of workers.
+
+    Returns {name: stored filename}. If any write fails, the files already
+    written are removed and the error is raised.
+    """
+    os.makedirs(folder, exist_ok=True)
+    targets = {name: f"{uuid.uuid4()}_{secure_filename(name)}" for name in files}
+
+    def save(name):
+        files[name].save(os.path.join(folder, targets[name]))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(save, name) for name in files]
+    failures = [error for error in (future.exception() for future in futures) if error]
+    if failures:
+        remove_images(targets.values(), folder)
+        raise failures[0]
+    return targets
+
+def remove_images(filenames, folder):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(folder, filename))
+        except FileNotFoundError:
+            pass
+
+def _summary(names):
+    listed = ", ".join(names[:SUMMARY_NAMES])
+    if len(names) > SUMMARY_NAMES:
+        listed += f" and {len(names) - SUMMARY_NAMES} more"
+    return listed
+
+def intake_donations(donor_id, values, files, recipient_id=None, is_admin_donation=False, workers=4):
+    """Store a batch of validated donations in one transaction; returns their ids, ascending.
+
+    values comes from validate_items and files maps image names to the
+    uploaded FileStorage objects. Images are written by the worker pool
+    before the transaction, so it only covers the inserts. The recipient,
+    or every admin for an organization donation, gets one notification for
+    the whole batch.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    used = {image for _, image in values if image}
+    stored = save_images({name: files[name] for name in used}, folder, workers)
+
+    now = datetime.utcnow()
+    rows = [dict(item, donor_id=donor_id, recipient_id=recipient_id, image_filename=stored.get(image),
+                 status="pending", is_admin_donation=is_admin_donation, created_at=now, updated_at=now)
+            for item, image in values]
+    try:
+        # Unordered RETURNING: asking for parameter order makes SQLite insert row by row
+        donation_ids = sorted(db.session.execute(insert(Donation).returning(Donation.id), rows).scalars())
+
+        names = [item["item_name"] for item, _ in values]
+        if recipient_id:
+            if len(names) == 1:
+                notify(recipient_id, "New Donation Offer", f"You have received a donation offer for: {names[0]}",
+                       "donation", donation_ids[0])
+            else:
+                notify(recipient_id, "New Donation Offers",
+                       f"You have received {len(names)} donation offers: {_summary(names)}", "donation",
+                       donation_ids[0])
+        elif is_admin_donation:
+            admin_ids = db.session.scalars(select(User.id).where(User.role == 'admin')).all()
+            if len(names) == 1:
+                notify_many(admin_ids, "New Donation to Organization", f"A new donation has been offered: {names[0]}",
+                            "donation", donation_ids[0])
+            else:
+                notify_many(admin_ids, "New Donations to Organization",
+                            f"{len(names)} donations have been offered: {_summary(names)}", "donation",
+                            donation_ids[0])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        remove_images(stored.values(), folder)
+        raise
+    return donation_ids
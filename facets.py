@@ -0,0 +1,58 @@
+from flask import url_for
+from sqlalchemy import case, func, select
+from models import db, Listing
+
+# Price facet buckets as [low, high) in the listing currency; None is open-ended
+PRICE_BUCKETS = ((0, 25), (25, 50), (50, 100), (100, 250), (250, 500), (500, None))
+
+def price_bucket_label(low, high):
+    return f"{low}-{high}" if high is not None else f"{low}+"
+
+def price_bucket_args(low, high):
+    """min_price/max_price arguments that select exactly one bucket."""
+    args = {"min_price": low}
+    if high is not None:
+        # max_price is inclusive and prices have cents
+        args["max_price"] = round(high - 0.01, 2)
+    return args
+
+def price_bucket_url(args, low, high):
+    """The /listings URL for args (the current filters) narrowed to one price bucket."""
+    # Drop both bounds first: the open-ended bucket sets no max_price to replace
+    args = {key: value for key, value in args.items() if key not in ("min_price", "max_price")}
+    return url_for("listings.listings", **args, **price_bucket_args(low, high))
+
+def _price_bucket():
+    return case(
+        *[(Listing.price < high, price_bucket_label(low, high)) for low, high in PRICE_BUCKETS if high is not None],
+        else_=price_bucket_label(*PRICE_BUCKETS[-1])
+    )
+
+# Facet name -> the expression its listings are grouped by
+FACETS = {
+    "category": lambda: Listing.category_id,
+    "type": lambda: Listing.listing_type,
+    "condition": lambda: Listing.condition,
+    "price": _price_bucket,
+}
+
+def facet_counts(criteria):
+    """Active listing counts per value of each facet, for the filters in criteria.
+
+    criteria maps a facet name (or any other key, e.g. "q") to the SQL
+    filter applied for it. Each facet is counted with every filter except
+    its own, so the sidebar shows how many listings picking another value
+    would give. One GROUP BY query per facet, served by the
+    (is_active, <facet column>) indexes when nothing else is filtered.
+    Returns {facet: {value: count}}.
+    """
+    counts = {}
+    for name, expression in FACETS.items():
+        column = expression()
+        statement = select(column, func.count()).where(
+            Listing.is_active == True, *[criterion for key, criterion in criteria.items() if key != name]
+        )
+        if name == "price":
+            statement = statement.where(Listing.price.isnot(None), Listing.price >= 0)
+        counts[name] = dict(db.session.execute(statement.group_by(column)).all())
+    return counts
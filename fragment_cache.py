@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from metrics import inc
+import os
+import threading
+
+class FragmentCache:
+    """Bounded LRU of rendered template fragments, shared by the threads of one worker."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class FragmentCacheExtension(Extension):
+    """``{% cache "name", key, ... %}...{% endcache %}`` renders the body once per key.
+
+    Keys should change whenever the cached markup would, e.g.
+    ``{% cache "listing-card", listing.id, listing.updated_at %}``, so stale
+    entries are never read and simply fall out of the LRU. Anything that
+    depends on the viewer must stay outside the block.
+    """
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = tuple(key)
+        value = cache.get(key)
+        if value is None:
+            inc("exchangify_fragment_cache_requests_total", (("result", "miss"),))
+            value = caller()
+            cache.set(key, value)
+        else:
+            inc("exchangify_fragment_cache_requests_total", (("result", "hit"),))
+        return value
+
+def init_fragment_cache(app):
+    """Enable the {% cache %} tag and, if configured, the Jinja bytecode cache."""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    size = app.config.get("FRAGMENT_CACHE_SIZE", 0)
+    app.jinja_env.fragment_cache = FragmentCache(size) if size > 0 else None
+
+    # Compiled templates are stored on disk so new workers load them instead
+    # of recompiling; entries are keyed by a checksum of the template source.
+    if app.config.get("JINJA_BYTECODE_CACHE"):
+        directory = app.config.get("JINJA_BYTECODE_CACHE_DIR")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
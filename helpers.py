@@ -0,0 +1,94 @@
+from flask import current_app, redirect, session, url_for, flash
+from models import db, User
+from datetime import datetime
+from functools import wraps
+from identity import current_identity
+from inbox import notify
+import math
+import os
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+# Function to check if the user is an admin
+def requires_admin(f):
+    @wraps(f)  # This preserves the original function name and metadata
+    def decorated_function(*args, **kwargs):
+        if "user_id" not in session:
+            flash("Please log in first.", "warning")
+            return redirect(url_for('auth.login'))
+        identity = current_identity()
+        if not identity or identity.role != 'admin':
+            flash("Access denied. Admins only.", "danger")
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Function to check if the user is logged in
+def requires_login(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if "user_id" not in session:
+            flash("Please log in first.", "warning")
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def upload_path(folder_key, filename):
+    # Upload folders are created on first use rather than at start-up
+    folder = current_app.config[folder_key]
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, filename)
+
+def update_user_status(user_id, is_online=True):
+    user = User.query.get(user_id)
+    if user:
+        user.is_online = is_online
+        user.last_seen = datetime.utcnow()
+        db.session.commit()
+
+def create_notification(user_id, title, message, notification_type, related_id=None, commit=True,
+                        group_key=None, grouped_message=None):
+    # group_key folds repeated events into one unread row, see inbox.notify
+    notification = notify(user_id, title, message, notification_type, related_id, group_key, grouped_message)
+    if commit:
+        db.session.commit()
+    return notification
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    # Haversine formula to calculate distance between two points
+    R = 6371  # Radius of the Earth in km
+    
+    # Convert latitude and longitude from degrees to radians
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+    
+    # Differences
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    
+    # Haversine formula
+    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    distance = R * c
+    
+    return distance  # Distance in kilometers
+
+def bounding_box(latitude, longitude, radius):
+    """(min_lat, max_lat, min_lon, max_lon) around every point within radius km of a point.
+
+    Returns None when the box would reach a pole or cross the antimeridian.
+    """
+    angle = radius / 6371
+    delta_lat = math.degrees(angle)
+    if abs(latitude) + delta_lat >= 90 or math.sin(angle) >= math.cos(math.radians(latitude)):
+        return None
+    delta_lon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    if longitude - delta_lon < -180 or longitude + delta_lon >= 180:
+        return None
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
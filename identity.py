@@ -0,0 +1,50 @@
+from flask import g, session
+from sqlalchemy import select
+from collections import namedtuple
+from models import db, User
+
+# What most requests need to know about the logged-in user. It is kept in the
+# signed session cookie and revalidated against User.session_version.
+Identity = namedtuple("Identity", ["id", "role", "name"])
+
+def login_user(user):
+    """Store user's identity in the session."""
+    session["user_id"] = user.id
+    session["user_name"] = f"{user.first_name} {user.last_name}"
+    session["user_role"] = user.role
+    session["user_version"] = user.session_version
+    g.current_user = user
+    g.identity = Identity(user.id, user.role, session["user_name"])
+
+def current_user():
+    """The logged-in User, loaded at most once per request; None if logged out."""
+    if "current_user" not in g:
+        user_id = session.get("user_id")
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.current_user
+
+def current_identity():
+    """Identity of the logged-in user, or None.
+
+    Costs one single-column query per request to compare the session's
+    version with the user's; the full row is only loaded when they differ.
+    """
+    if "identity" in g:
+        return g.identity
+    identity = None
+    user_id = session.get("user_id")
+    if user_id is not None:
+        if g.get("current_user") is not None:
+            version = g.current_user.session_version
+        else:
+            version = db.session.execute(select(User.session_version).where(User.id == user_id)).scalar()
+        if version is None:
+            # The account no longer exists
+            session.clear()
+        elif version == session.get("user_version") and "user_role" in session:
+            identity = Identity(user_id, session["user_role"], session.get("user_name"))
+        else:
+            login_user(current_user())
+            identity = g.identity
+    g.identity = identity
+    return identity
@@ -0,0 +1,183 @@
+from datetime import datetime
+from sqlalchemy import cast, delete, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Notification
+from metrics import inc
+
+PAGE_SIZE = 20
+NOTIFICATION_TYPES = ("trade", "chat", "donation", "installment", "review", "wishlist", "search")
+
+def notify(user_id, title, message, notification_type, related_id=None, group_key=None, grouped_message=None):
+    """Add a notification for user_id; the caller commits.
+
+    With a group_key, a new event is folded into the user's unread
+    notification with that key instead of adding a row: its count goes up,
+    it takes the new title, related_id and time, and its message becomes
+    grouped_message with {count} replaced by the new count (or message if
+    grouped_message is not given).
+    Returns the new Notification, or None when the event was coalesced.
+    """
+    if group_key is not None:
+        for _ in range(3):
+            existing = db.session.execute(
+                select(Notification.id, Notification.count)
+                .where(Notification.user_id == user_id, Notification.group_key == group_key, Notification.is_read == False)
+            ).first()
+            if existing is None:
+                try:
+                    with db.session.begin_nested():
+                        notification = Notification(user_id=user_id, title=title, message=message,
+                                                    notification_type=notification_type, related_id=related_id,
+                                                    group_key=group_key)
+                        db.session.add(notification)
+                    inc("exchangify_notifications_total", (("type", notification_type), ("result", "created")))
+                    return notification
+                except IntegrityError:
+                    # Another request created the group first
+                    continue
+            count = existing.count + 1
+            # Compare-and-set on the count so concurrent events are all counted
+            updated = db.session.execute(
+                update(Notification)
+                .where(Notification.id == existing.id, Notification.count == existing.count,
+                       Notification.is_read == False)
+                .values(count=count, title=title, related_id=related_id, created_at=datetime.utcnow(),
+                        message=grouped_message.replace("{count}", str(count)) if grouped_message else message)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if updated:
+                inc("exchangify_notifications_total", (("type", notification_type), ("result", "coalesced")))
+                return None
+        # Still contended after retries; a separate row is better than a lost event
+
+    notification = Notification(
+        user_id=user_id,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        related_id=related_id
+    )
+    db.session.add(notification)
+    inc("exchangify_notifications_total", (("type", notification_type), ("result", "created")))
+    return notification
+
+def notify_many(user_ids, title, message, notification_type, related_id=None, group_key=None, grouped_message=None):
+    """notify() for many users with the same message, in a few statements; the caller commits.
+
+    Users with an unread notification under group_key have it updated in one
+    UPDATE, everyone else gets a new row from one INSERT.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return
+    now = datetime.utcnow()
+    existing = set()
+    if group_key is not None:
+        existing = set(db.session.scalars(
+            select(Notification.user_id)
+            .where(Notification.user_id.in_(user_ids), Notification.group_key == group_key, Notification.is_read == False)
+        ))
+    if existing:
+        if grouped_message:
+            before, _, after = grouped_message.partition("{count}")
+            grouped = literal(before) + cast(Notification.count + 1, db.String) + literal(after)
+        else:
+            grouped = message
+        db.session.execute(
+            update(Notification)
+            .where(Notification.user_id.in_(existing), Notification.group_key == group_key, Notification.is_read == False)
+            .values(title=title, message=grouped, count=Notification.count + 1, related_id=related_id, created_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        inc("exchangify_notifications_total", (("type", notification_type), ("result", "coalesced")), len(existing))
+    rows = [{"user_id": user_id, "title": title, "message": message, "notification_type": notification_type,
+             "related_id": related_id, "is_read": False, "created_at": now, "group_key": group_key, "count": 1}
+            for user_id in user_ids if user_id not in existing]
+    if not rows:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Notification), rows)
+        inc("exchangify_notifications_total", (("type", notification_type), ("result", "created")), len(rows))
+    except IntegrityError:
+        # Another request started some of these groups meanwhile
+        for row in rows:
+            notify(row["user_id"], title, message, notification_type, related_id, group_key, grouped_message)
+
+def purge_notifications(older_than, batch_size=1000, progress=None):
+    """Delete read notifications created before older_than, batch_size rows per transaction.
+
+    Short transactions keep the write lock free for requests while a large
+    backlog is purged. Returns how many rows were deleted.
+    """
+    deleted = 0
+    while True:
+        ids = db.session.scalars(
+            select(Notification.id)
+            .where(Notification.is_read == True, Notification.created_at < older_than)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(
+            delete(Notification).where(Notification.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        deleted += len(ids)
+        if progress:
+            progress(deleted)
+        if len(ids) < batch_size:
+            break
+    return deleted
+
+def encode_cursor(notification):
+    return f"{notification.created_at.isoformat()}|{notification.id}"
+
+def decode_cursor(cursor):
+    """Parse a cursor from encode_cursor; raises ValueError if it is malformed."""
+    timestamp, _, notification_id = cursor.partition("|")
+    return datetime.fromisoformat(timestamp), int(notification_id)
+
+def inbox_page(user_id, types=None, before=None, limit=PAGE_SIZE):
+    """A page of user_id's notifications, newest first.
+
+    Returns (notifications, cursor for the next page or None). types limits
+    the page to those notification types; before is a decoded cursor. Each
+    type is read in order through (user_id, notification_type, created_at,
+    id) and the runs are merged, so a page costs the same however large the
+    inbox is. A coalesced notification moves to the top when it is updated,
+    so it can show up again on a later page.
+    """
+    def run(*criteria):
+        query = Notification.query.filter(Notification.user_id == user_id, *criteria)
+        if before:
+            before_at, before_id = before
+            query = query.filter(db.or_(
+                Notification.created_at < before_at,
+                db.and_(Notification.created_at == before_at, Notification.id < before_id)
+            ))
+        return query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+
+    if types:
+        rows = [notification for notification_type in set(types)
+                for notification in run(Notification.notification_type == notification_type)]
+        rows.sort(key=lambda n: (n.created_at, n.id), reverse=True)
+    else:
+        rows = run()
+    page = rows[:limit]
+    return page, (encode_cursor(page[-1]) if len(rows) > limit else None)
+
+def mark_notifications_read(user_id, types=None, ids=None):
+    """Mark user_id's unread notifications read in one UPDATE; the caller commits.
+
+    types and ids narrow it down to those notification types or ids.
+    Returns how many rows changed.
+    """
+    statement = update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+    if types:
+        statement = statement.where(Notification.notification_type.in_(types))
+    if ids is not None:
+        statement = statement.where(Notification.id.in_(ids))
+    return db.session.execute(
+        statement.values(is_read=True).execution_options(synchronize_session=False)
+    ).rowcount
@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Installment, InstallmentScore
+from metrics import inc
+
+# NumPy is optional: without it the same figures are computed row by row,
+# which is fine for a handful of applications but slow for a backlog.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Risk each employment status adds, from 0 to 1; other statuses get EMPLOYMENT_RISK_DEFAULT
+EMPLOYMENT_RISK = {"Full-time": 0.0, "Self-employed": 0.3, "Retired": 0.35, "Part-time": 0.45,
+                   "Student": 0.7, "Unemployed": 1.0}
+EMPLOYMENT_RISK_DEFAULT = 0.5
+# Debt-to-income ratio at which the DTI part of the score is maxed out
+DTI_CEILING = 0.5
+# Weights of the debt-to-income, employment and amount-to-yearly-income parts
+DTI_WEIGHT, EMPLOYMENT_WEIGHT, SIZE_WEIGHT = 0.6, 0.25, 0.15
+# Risk bands the admin list filters by, as [low, high) score ranges
+RISK_BANDS = {"low": (0, 35), "medium": (35, 65), "high": (65, None)}
+# Average month length, for the repayment period of approved installments
+DAYS_PER_MONTH = 30.4375
+CHUNK = 10000
+
+def monthly_payment(amount, months, annual_rate):
+    """Fixed monthly payment that repays amount over months at annual_rate."""
+    months = max(months or 1, 1)
+    rate = annual_rate / 12
+    if rate == 0:
+        return amount / months
+    return amount * rate / (1 - (1 + rate) ** -months)
+
+def risk_band(score):
+    for band, (low, high) in RISK_BANDS.items():
+        if score >= low and (high is None or score < high):
+            return band
+    return None
+
+def _score_rows(amount, months, income, employment, existing, annual_rate):
+    """Row by row version of _score_arrays, used without NumPy."""
+    results = []
+    for row in zip(amount, months, income, employment, existing):
+        row_amount, row_months, row_income, row_employment, row_existing = row
+        payment = monthly_payment(row_amount, row_months, annual_rate)
+        total_interest = payment * max(row_months or 1, 1) - row_amount
+        if row_income and row_income > 0:
+            dti = (payment + row_existing) / row_income
+            dti_part = min(dti / DTI_CEILING, 1.0)
+            size_part = min(row_amount / (12 * row_income), 1.0)
+        else:
+            dti, dti_part, size_part = None, 1.0, 1.0
+        employment_part = EMPLOYMENT_RISK.get(row_employment, EMPLOYMENT_RISK_DEFAULT)
+        score = 100 * (DTI_WEIGHT * dti_part + EMPLOYMENT_WEIGHT * employment_part + SIZE_WEIGHT * size_part)
+        results.append((round(payment, 2), round(total_interest, 2), None if dti is None else round(dti, 4),
+                        round(score, 1)))
+    return results
+
+def _score_arrays(amount, months, income, employment, existing, annual_rate):
+    """[(monthly payment, total interest, DTI, risk score)] of every row, computed at once."""
+    amount = np.asarray(amount, dtype=float)
+    months = np.maximum(np.asarray(months, dtype=float), 1)
+    income = np.asarray(income, dtype=float)
+    existing = np.asarray(existing, dtype=float)
+    rate = annual_rate / 12
+    if rate == 0:
+        payment = amount / months
+    else:
+        payment = amount * rate / (1 - (1 + rate) ** -months)
+    total_interest = payment * months - amount
+
+    has_income = income > 0
+    safe_income = np.where(has_income, income, 1.0)
+    dti = np.where(has_income, (payment + existing) / safe_income, np.nan)
+    dti_part = np.where(has_income, np.minimum(dti / DTI_CEILING, 1.0), 1.0)
+    size_part = np.where(has_income, np.minimum(amount / (12 * safe_income), 1.0), 1.0)
+    employment_part = np.fromiter((EMPLOYMENT_RISK.get(status, EMPLOYMENT_RISK_DEFAULT) for status in employment),
+                                  dtype=float, count=len(amount))
+    score = 100 * (DTI_WEIGHT * dti_part + EMPLOYMENT_WEIGHT * employment_part + SIZE_WEIGHT * size_part)
+    # Object array so a missing DTI comes back as None rather than NaN
+    dti = np.round(dti, 4).astype(object)
+    dti[~has_income] = None
+    return list(zip(np.round(payment, 2).tolist(), np.round(total_interest, 2).tolist(), dti.tolist(),
+                    np.round(score, 1).tolist()))
+
+def _existing_payments(user_ids, now, annual_rate):
+    """{user_id: monthly payments of the user's approved installments still being repaid}."""
+    totals = {}
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), CHUNK):
+        rows = db.session.execute(
+            select(Installment.user_id, Installment.amount, Installment.duration, Installment.updated_at)
+            .where(Installment.user_id.in_(user_ids[start:start + CHUNK]), Installment.status == "approved")
+        ).all()
+        for user_id, amount, months, approved_at in rows:
+            months = max(months or 1, 1)
+            # An approved installment counts as existing debt until its last payment
+            if approved_at and approved_at + timedelta(days=months * DAYS_PER_MONTH) <= now:
+                continue
+            totals[user_id] = totals.get(user_id, 0) + monthly_payment(amount or 0, months, annual_rate)
+    return totals
+
+def score_pending(now=None):
+    """Score the pending installments with no score as of their current updated_at; the caller commits.
+
+    The figures of every such installment are computed in one vectorized
+    batch and stored in InstallmentScore, so the admin list can sort and
+    filter by them in SQL. Returns the number of installments scored.
+    """
+    now = now or datetime.utcnow()
+    annual_rate = current_app.config.get("INSTALLMENT_ANNUAL_RATE", 0.10)
+    # Core table columns: at this many rows, ORM result handling costs more than the scoring
+    installment, score = Installment.__table__.c, InstallmentScore.__table__.c
+    rows = db.session.execute(
+        select(installment.id, installment.user_id, installment.amount, installment.duration, installment.income,
+               installment.employment_status, installment.updated_at, score.installment_id)
+        .outerjoin(InstallmentScore.__table__, score.installment_id == installment.id)
+        .where(installment.status == "pending",
+               score.installment_id.is_(None) | (score.installment_updated_at != installment.updated_at))
+    ).all()
+    if not rows:
+        return 0
+
+    ids, user_ids, amounts, durations, incomes, employment, updated, scored = zip(*rows)
+    existing = _existing_payments(set(user_ids), now, annual_rate)
+    compute = _score_arrays if np is not None else _score_rows
+    results = compute([amount or 0 for amount in amounts], [duration or 1 for duration in durations],
+                      [income or 0 for income in incomes], employment,
+                      [existing.get(user_id, 0) for user_id in user_ids], annual_rate)
+
+    stale = [installment_id for installment_id, scored_id in zip(ids, scored) if scored_id is not None]
+    for start in range(0, len(stale), CHUNK):
+        db.session.execute(
+            delete(InstallmentScore).where(InstallmentScore.installment_id.in_(stale[start:start + CHUNK]))
+            .execution_options(synchronize_session=False)
+        )
+    rows = [
+        {"installment_id": installment_id, "installment_updated_at": updated_at or now, "monthly_payment": payment,
+         "total_interest": total_interest, "debt_to_income": dti, "risk_score": risk}
+        for installment_id, updated_at, (payment, total_interest, dti, risk) in zip(ids, updated, results)
+    ]
+    while rows:
+        try:
+            # A Core insert: the ORM one splits rows into a statement per set of None columns
+            with db.session.begin_nested():
+                db.session.execute(insert(InstallmentScore.__table__), rows)
+            break
+        except IntegrityError:
+            # Another request (e.g. a second admin loading the list) scored
+            # some of them first; keep its scores and insert the rest
+            pending = [row["installment_id"] for row in rows]
+            scored_now = set()
+            for start in range(0, len(pending), CHUNK):
+                scored_now.update(db.session.scalars(
+                    select(InstallmentScore.installment_id)
+                    .where(InstallmentScore.installment_id.in_(pending[start:start + CHUNK]))
+                ))
+            rows = [row for row in rows if row["installment_id"] not in scored_now]
+    inc("exchangify_installment_scores_total", (), len(ids))
+    return len(ids)
+
+def invalidate_user_scores(user_id):
+    """Drop the scores of user_id's installments; the caller commits.
+
+    Needed when one of the user's installments is approved or rejected,
+    since that changes the existing debt the others are scored against.
+    """
+    db.session.execute(
+        delete(InstallmentScore)
+        .where(InstallmentScore.installment_id.in_(select(Installment.id).where(Installment.user_id == user_id)))
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, tuple_, update
+from models import db, Listing, Trade
+from inbox import notify_many
+from metrics import inc
+import heapq
+import time
+
+# Trade.loan_notice_stage: the next notice a loan is waiting for
+REMINDER, OVERDUE, DONE = 0, 1, 2
+# Loans lent out and not yet marked returned; pending and rejected ones get no notices
+ACTIVE_STATUSES = ("accepted", "completed")
+# How far ahead due dates are held in memory
+HORIZON = timedelta(hours=6)
+LOAD_CHUNK = 10000
+BATCH_SIZE = 500
+# Loans found overdue by more than this (e.g. after the scheduler was down
+# for a long time or first deployed) are closed without a notice
+STALE_AFTER = timedelta(days=7)
+# Changed trades are read back this far so a transaction that committed
+# late is not missed; loans found twice are only notified once
+POLL_OVERLAP = timedelta(seconds=60)
+
+class LoanScheduler:
+    """Sends loan reminders and overdue notices from a heap of upcoming due dates.
+
+    The heap only holds loans whose next notice is due before loaded_until,
+    read through ix_trade_loan_due and extended by HORIZON as time passes,
+    so memory follows the number of loans due soon rather than all loans.
+    Trades created or changed since the last poll are read through
+    ix_trade_updated_at and pushed as well. Every notice is re-checked
+    against the trade and recorded with a compare-and-set on
+    loan_notice_stage, so stale heap entries and concurrent schedulers do
+    no harm.
+    """
+
+    def __init__(self, reminder_before, poll_interval):
+        self.reminder_before = reminder_before
+        self.poll_interval = poll_interval
+        self.heap = []
+        self.loaded_until = None
+        self.changes_since = None
+        self.next_poll = None
+
+    def _fire_at(self, due, stage):
+        return due - self.reminder_before if stage == REMINDER else due
+
+    def _load(self, until):
+        """Push the loans whose next notice falls between loaded_until and until."""
+        since = self.loaded_until
+        # A reminder fires reminder_before ahead of the due date
+        criteria = [Trade.loan_return_date.isnot(None), Trade.loan_notice_stage < DONE,
+                    Trade.loan_return_date < until + self.reminder_before]
+        if since is not None:
+            criteria.append(Trade.loan_return_date >= since)
+        after = None
+        while True:
+            statement = select(Trade.loan_return_date, Trade.id, Trade.loan_notice_stage).where(*criteria)
+            if after is not None:
+                statement = statement.where(tuple_(Trade.loan_return_date, Trade.id) > after)
+            rows = db.session.execute(
+                statement.order_by(Trade.loan_return_date, Trade.id).limit(LOAD_CHUNK)
+            ).all()
+            for due, trade_id, stage in rows:
+                fire_at = self._fire_at(due, stage)
+                if fire_at < until and (since is None or fire_at >= since):
+                    heapq.heappush(self.heap, (fire_at, trade_id))
+            if len(rows) < LOAD_CHUNK:
+                break
+            after = (rows[-1].loan_return_date, rows[-1].id)
+        db.session.commit()
+        self.loaded_until = until
+
+    def _poll_changes(self, now):
+        """Push loans created or changed since the last poll."""
+        rows = db.session.execute(
+            select(Trade.id, Trade.loan_return_date, Trade.loan_notice_stage)
+            .where(Trade.updated_at >= self.changes_since - POLL_OVERLAP,
+                   Trade.loan_return_date.isnot(None), Trade.loan_notice_stage < DONE)
+        ).all()
+        db.session.commit()
+        for trade_id, due, stage in rows:
+            fire_at = self._fire_at(due, stage)
+            if fire_at < self.loaded_until:
+                heapq.heappush(self.heap, (fire_at, trade_id))
+        self.changes_since = now
+        self.next_poll = now + timedelta(seconds=self.poll_interval)
+
+    def start(self, now):
+        self.heap = []
+        self.loaded_until = None
+        # Changes made while loading are picked up by the first poll
+        self.changes_since = now
+        self.next_poll = now + timedelta(seconds=self.poll_interval)
+        # Close long overdue loans in one statement instead of loading them
+        closed = db.session.execute(
+            update(Trade)
+            .where(Trade.loan_return_date.isnot(None), Trade.loan_notice_stage < DONE,
+                   Trade.loan_return_date < now - STALE_AFTER)
+            .values(loan_notice_stage=DONE, updated_at=Trade.updated_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        inc("exchangify_loan_notices_total", (("kind", "closed"),), closed)
+        self._load(now + HORIZON)
+
+    def _advance(self, trades, old_stage, new_stage):
+        """Compare-and-set loan_notice_stage; returns the trades this call moved."""
+        if not trades:
+            return []
+        moved = set(db.session.scalars(
+            update(Trade)
+            .where(Trade.id.in_([trade.id for trade in trades]), Trade.loan_notice_stage == old_stage)
+            # Keep updated_at, which is when the trade itself last changed
+            .values(loan_notice_stage=new_stage, updated_at=Trade.updated_at)
+            .returning(Trade.id)
+            .execution_options(synchronize_session=False)
+        ))
+        return [trade for trade in trades if trade.id in moved]
+
+    def _process(self, trade_ids, now):
+        """Send the notices due for trade_ids in one transaction; returns {kind: count}."""
+        rows = db.session.execute(
+            select(Trade.id, Trade.status, Trade.loan_return_date, Trade.loan_returned_at, Trade.loan_notice_stage,
+                   Trade.initiator_id, Trade.receiver_id, Listing.title)
+            .join(Listing, Trade.listing_id == Listing.id)
+            .where(Trade.id.in_(trade_ids))
+        ).all()
+        # (old stage, new stage, kind) -> trades
+        moves = {}
+        for row in rows:
+            due, stage = row.loan_return_date, row.loan_notice_stage
+            if due is None or stage >= DONE:
+                continue
+            active = row.status in ACTIVE_STATUSES and row.loan_returned_at is None
+            if now >= due:
+                if active and now - due <= STALE_AFTER:
+                    moves.setdefault((stage, DONE, "overdue"), []).append(row)
+                else:
+                    moves.setdefault((stage, DONE, "closed"), []).append(row)
+            elif stage == REMINDER and now >= due - self.reminder_before:
+                kind = "reminder" if active else "skipped"
+                if active or row.status == "pending":
+                    # A pending loan may still be accepted before it is due
+                    moves.setdefault((REMINDER, OVERDUE, kind), []).append(row)
+                else:
+                    moves.setdefault((REMINDER, DONE, "closed"), []).append(row)
+            else:
+                # The due date moved; wait for the new one
+                fire_at = self._fire_at(due, stage)
+                if fire_at < self.loaded_until:
+                    heapq.heappush(self.heap, (fire_at, row.id))
+
+        sent = {}
+        for (old_stage, new_stage, kind), trades in moves.items():
+            for trade in self._advance(trades, old_stage, new_stage):
+                due_on = trade.loan_return_date.strftime('%b %d, %Y')
+                if kind == "reminder":
+                    notify_many([trade.initiator_id], "Loan Due Soon",
+                                f"{trade.title} is due back on {due_on}.", "trade", trade.id)
+                elif kind == "overdue":
+                    # Same wording for both parties, so one insert covers them
+                    notify_many([trade.initiator_id, trade.receiver_id], "Loan Overdue",
+                                f"{trade.title} was due back on {due_on} and has not been marked returned.",
+                                "trade", trade.id)
+                if new_stage == OVERDUE and trade.loan_return_date < self.loaded_until:
+                    heapq.heappush(self.heap, (trade.loan_return_date, trade.id))
+                sent[kind] = sent.get(kind, 0) + 1
+        db.session.commit()
+        for kind, count in sent.items():
+            inc("exchangify_loan_notices_total", (("kind", kind),), count)
+        return sent
+
+    def run_due(self, now):
+        """Process every heap entry due by now, BATCH_SIZE trades per transaction; returns {kind: count}."""
+        totals = {}
+        while self.heap and self.heap[0][0] <= now:
+            batch = set()
+            while self.heap and self.heap[0][0] <= now and len(batch) < BATCH_SIZE:
+                batch.add(heapq.heappop(self.heap)[1])
+            for kind, count in self._process(list(batch), now).items():
+                totals[kind] = totals.get(kind, 0) + count
+        return totals
+
+    def tick(self, now):
+        """Poll for changes and extend the window when due, then send what is due."""
+        if now >= self.next_poll:
+            self._poll_changes(now)
+        if self.loaded_until - now < HORIZON / 2:
+            self._load(now + HORIZON)
+        return self.run_due(now)
+
+    def seconds_until_next(self, now):
+        wake = min(self.next_poll, self.loaded_until - HORIZON / 2)
+        if self.heap:
+            wake = min(wake, self.heap[0][0])
+        return max((wake - now).total_seconds(), 0)
+
+    def run(self, progress=None):
+        """Run until interrupted; progress, if given, is called with each non-empty tick's counts."""
+        self.start(datetime.utcnow())
+        while True:
+            sent = self.tick(datetime.utcnow())
+            if sent and progress:
+                progress(sent)
+            time.sleep(min(self.seconds_until_next(datetime.utcnow()), self.poll_interval))
@@ -0,0 +1,302 @@
+from flask import Response, abort, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import json
+import os
+import threading
+import time
+import weakref
+
+# Request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    "exchangify_http_requests_total": ("counter", "HTTP requests by endpoint, method and status."),
+    "exchangify_http_request_duration_seconds": ("histogram", "HTTP request latency by endpoint."),
+    "exchangify_upload_bytes_total": ("counter", "Bytes received in multipart uploads by endpoint."),
+    "exchangify_db_lock_errors_total": ("counter", "Statements that failed because the database was locked."),
+    "exchangify_db_write_seconds": ("histogram", "Time spent in SQLite write statements, including waits for the write lock."),
+    "exchangify_rate_limited_total": ("counter", "Requests rejected with 429 by limit and scope."),
+    "exchangify_fragment_cache_requests_total": ("counter", "Template fragment cache lookups by result."),
+    "exchangify_notifications_total": ("counter", "Notification events by type and whether they were coalesced."),
+    "exchangify_wishlist_alerts_total": ("counter", "Wishlist alerts by kind, sent or dropped by the per-user limit."),
+    "exchangify_loan_notices_total": ("counter", "Loan reminders and overdue notices sent, and loans closed without one."),
+    "exchangify_saved_search_candidates_total": ("counter", "Saved searches checked against new listings, by whether they matched."),
+    "exchangify_installment_scores_total": ("counter", "Pending installment applications scored."),
+}
+
+# Recording goes to a per-thread shard so the hot path takes no locks;
+# shards are only summed when /metrics is scraped. A thread's shard is queued
+# in _dead when the thread exits and folded into _retired on the next scrape
+# or new thread, so thread-per-request servers do not pile up shards.
+_local = threading.local()
+_shards = {}  # id -> shard of a live thread
+_dead = []
+_retired = {"counters": {}, "histograms": {}}
+_shards_lock = threading.Lock()
+_gauges = {}  # name -> (help, callback returning [(labels dict, value)])
+_flusher_pid = None
+
+class _ShardOwner:
+    """Held only by the thread-local, so it is freed when its thread exits."""
+    __slots__ = ("shard", "__weakref__")
+
+def _merge(total, shard):
+    counters, histograms = total["counters"], total["histograms"]
+    for key, value in _items(shard["counters"]):
+        counters[key] = counters.get(key, 0) + value
+    for key, entry in _items(shard["histograms"]):
+        current = histograms.get(key)
+        histograms[key] = list(entry) if current is None else [a + b for a, b in zip(current, entry)]
+
+def _retire_dead():
+    # Caller holds _shards_lock. The finalizers only append, so they never wait on it
+    while _dead:
+        shard = _dead.pop()
+        if _shards.pop(id(shard), None) is not None:
+            _merge(_retired, shard)
+
+def _shard():
+    owner = getattr(_local, "owner", None)
+    if owner is None:
+        owner = _local.owner = _ShardOwner()
+        owner.shard = {"counters": {}, "histograms": {}}
+        with _shards_lock:
+            _retire_dead()
+            _shards[id(owner.shard)] = owner.shard
+        weakref.finalize(owner, _dead.append, owner.shard)
+    return owner.shard
+
+def inc(name, labels=(), amount=1):
+    """Add amount to the counter name; labels is a tuple of (key, value) pairs."""
+    counters = _shard()["counters"]
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + amount
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    histograms = _shard()["histograms"]
+    key = (name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        entry = histograms[key] = [0] * len(buckets) + [0.0, 0]
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            entry[i] += 1
+            break
+    entry[-2] += value
+    entry[-1] += 1
+
+def register_gauge(name, help_text, callback):
+    """Expose callback() -> [(labels dict, value), ...] as gauge name on every scrape."""
+    _gauges[name] = (help_text, callback)
+
+def _items(mapping):
+    # Other threads may insert while we read; retry instead of locking them out
+    while True:
+        try:
+            return list(mapping.items())
+        except RuntimeError:
+            continue
+
+def snapshot():
+    """Sum this process's shards into plain JSON-friendly structures."""
+    total = {"counters": {}, "histograms": {}}
+    with _shards_lock:
+        _retire_dead()
+        shards = list(_shards.values())
+        _merge(total, _retired)
+    for shard in shards:
+        _merge(total, shard)
+    counters, histograms = total["counters"], total["histograms"]
+    gauges = []
+    for name, (_, callback) in list(_gauges.items()):
+        try:
+            for labels, value in callback():
+                gauges.append([name, sorted(labels.items()), value])
+        except Exception:
+            current_app.logger.exception("Metrics gauge %s failed", name)
+    return {
+        "pid": os.getpid(),
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, list(labels), entry] for (name, labels), entry in histograms.items()],
+        "gauges": gauges,
+    }
+
+def _write_snapshot(directory, data):
+    path = os.path.join(directory, f"{data['pid']}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def collect(directory=None):
+    """Merge this process's snapshot with those other workers wrote to directory."""
+    own = snapshot()
+    snapshots = [own]
+    if directory:
+        _write_snapshot(directory, own)
+        for filename in os.listdir(directory):
+            if not filename.endswith(".json") or filename == f"{own['pid']}.json":
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    counters, histograms, gauges = {}, {}, {}
+    for data in snapshots:
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, entry in data["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.get(key)
+            histograms[key] = list(entry) if total is None else [a + b for a, b in zip(total, entry)]
+        # Counters of exited workers still count; their gauges do not
+        if data is own or _pid_alive(data["pid"]):
+            for name, labels, value in data["gauges"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def render(counters, histograms, gauges):
+    """Render merged metrics in the Prometheus text exposition format."""
+    lines = []
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault(name, []).append((labels, value))
+    for (name, labels), entry in histograms.items():
+        families.setdefault(name, []).append((labels, entry))
+    for (name, labels), value in gauges.items():
+        families.setdefault(name, []).append((labels, value))
+
+    for name in sorted(families):
+        if name in _HELP:
+            kind, help_text = _HELP[name]
+        else:
+            kind, help_text = "gauge", _gauges.get(name, ("",))[0]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(families[name]):
+            if kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def _start_flusher(app):
+    # Workers flush periodically so a scrape served by any one of them sees
+    # recent numbers from all the others. Forked workers start their own.
+    global _flusher_pid
+    directory = app.config.get("METRICS_DIR")
+    if not directory or _flusher_pid == os.getpid():
+        return
+    with _shards_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    interval = app.config.get("METRICS_FLUSH_SECONDS", 5)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    _write_snapshot(directory, snapshot())
+            except Exception:
+                app.logger.exception("Failed to write metrics snapshot")
+
+    threading.Thread(target=run, name="metrics-flusher", daemon=True).start()
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    if request.content_length and request.mimetype == "multipart/form-data":
+        inc("exchangify_upload_bytes_total", (("endpoint", request.endpoint or "unmatched"),), request.content_length)
+
+def _after_request(response):
+    start = g.pop("metrics_start", None)
+    if start is None or request.endpoint in ("static", "metrics"):
+        return response
+    endpoint = request.endpoint or "unmatched"
+    inc("exchangify_http_requests_total",
+        (("endpoint", endpoint), ("method", request.method), ("status", str(response.status_code))))
+    observe("exchangify_http_request_duration_seconds", (("endpoint", endpoint),), time.perf_counter() - start)
+    return response
+
+def _handle_db_error(context):
+    if "database is locked" in str(context.original_exception):
+        inc("exchangify_db_lock_errors_total")
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A write statement waits in SQLite's busy handler (busy_timeout) for the
+    # write lock, so its duration is where lock waits show up
+    if conn.dialect.name == "sqlite" and statement.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS):
+        conn.info["metrics_write_start"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("metrics_write_start", None)
+    if start is not None:
+        observe("exchangify_db_write_seconds", (), time.perf_counter() - start)
+
+def _pool_stats(db):
+    def callback():
+        pool = db.engine.pool
+        stats = []
+        for stat in ("size", "checkedout", "overflow", "checkedin"):
+            method = getattr(pool, stat, None)
+            if method is not None:
+                stats.append(({"state": stat}, method()))
+        return stats
+    return callback
+
+def init_metrics(app, db):
+    """Record request metrics for app and serve them at /metrics."""
+    directory = app.config.get("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    event.listen(Engine, "handle_error", _handle_db_error)
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    register_gauge("exchangify_db_pool_connections", "Database connection pool usage by state.", _pool_stats(db))
+
+    @app.before_request
+    def start_flusher():
+        _start_flusher(app)
+
+    @app.route("/metrics")
+    def metrics():
+        token = app.config.get("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+        body = render(*collect(app.config.get("METRICS_DIR")))
+        return Response(body, mimetype="text/plain; version=0.0.4")
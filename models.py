@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy import inspect, text
 import json
 
 db = SQLAlchemy()
@@ -25,6 +26,8 @@ class User(db.Model):
     is_online = db.Column(db.Boolean, default=False)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped when role, name or password change so cached session identities are refreshed
+    session_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     reviews = db.relationship('Review', backref='user', lazy=True, cascade="all, delete-orphan")
@@ -36,7 +39,7 @@ class User(db.Model):
     donations_made = db.relationship('Donation', foreign_keys='Donation.donor_id', backref='donor', lazy=True)
     donations_received = db.relationship('Donation', foreign_keys='Donation.recipient_id', backref='recipient', lazy=True)
     # Relationships for listings
-    listings = db.relationship('Listing', backref='owner', lazy=True, cascade="all, delete-orphan")
+    listings = db.relationship('Listing', foreign_keys='Listing.user_id', backref='owner', lazy=True, cascade="all, delete-orphan")
     # Relationships for cart
     cart_items = db.relationship('CartItem', backref='user', lazy=True, cascade="all, delete-orphan")
     # Relationships for wishlist
@@ -62,6 +65,27 @@ class Review(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+class Tag(db.Model):
+    """A normalized review tag and how many reviews carry it (see review_tags.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # The tag cloud: most used tags first
+        db.Index('ix_tag_review_count', 'review_count'),
+    )
+
+class ReviewTag(db.Model):
+    """Links a review to each tag parsed from its tags text."""
+    review_id = db.Column(db.Integer, db.ForeignKey('review.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        # Reviews with a given tag
+        db.Index('ix_review_tag_tag', 'tag_id', 'review_id'),
+    )
+
 class Installment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -76,6 +100,31 @@ class Installment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    score = db.relationship('InstallmentScore', uselist=False, viewonly=True)
+
+    __table_args__ = (
+        # The admin list by status, and the pending applications to score
+        db.Index('ix_installment_status_created', 'status', 'created_at'),
+        db.Index('ix_installment_user_status', 'user_id', 'status'),
+    )
+
+class InstallmentScore(db.Model):
+    """Affordability figures of a pending installment (see installment_scoring.py).
+
+    Computed for the installment as of installment_updated_at; a row whose
+    installment has changed since is stale and recomputed.
+    """
+    installment_id = db.Column(db.Integer, db.ForeignKey('installment.id', ondelete='CASCADE'), primary_key=True)
+    installment_updated_at = db.Column(db.DateTime, nullable=False)
+    monthly_payment = db.Column(db.Float, nullable=False)
+    total_interest = db.Column(db.Float, nullable=False)
+    debt_to_income = db.Column(db.Float, nullable=True)  # None without an income
+    risk_score = db.Column(db.Float, nullable=False)  # 0 (safest) to 100
+
+    __table_args__ = (
+        db.Index('ix_installment_score_risk', 'risk_score'),
+    )
+
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -86,6 +135,87 @@ class ChatMessage(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Messages between two users, in order
+        db.Index('ix_chat_message_pair', 'sender_id', 'receiver_id', 'id'),
+        # Finding messages old enough to archive
+        db.Index('ix_chat_message_timestamp', 'timestamp'),
+    )
+
+class UserSearchToken(db.Model):
+    """Normalized name and email words of each user, for prefix search (see user_search.py)."""
+    token = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_user_search_token_user', 'user_id', 'token'),
+    )
+
+class Conversation(db.Model):
+    """One row per pair of users who have exchanged messages (see conversations.py).
+
+    The pair is stored with user_low_id < user_high_id; unread_low counts
+    messages user_low has not read yet, unread_high those of user_high.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_low_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('chat_message.id', ondelete='SET NULL'), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    preview = db.Column(db.String(140))
+    unread_low = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    unread_high = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        db.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair'),
+        # A user's conversations, most recent first, from either side of the pair
+        db.Index('ix_conversation_low_recent', 'user_low_id', 'last_message_at', 'id'),
+        db.Index('ix_conversation_high_recent', 'user_high_id', 'last_message_at', 'id'),
+    )
+
+    def partner_id(self, user_id):
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+
+    def unread_for(self, user_id):
+        return self.unread_low if user_id == self.user_low_id else self.unread_high
+
+class ChatArchiveSegment(db.Model):
+    """A compressed file of archived messages between two users (see chat_archive.py).
+
+    path is relative to CHAT_ARCHIVE_FOLDER.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_low_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    first_message_at = db.Column(db.DateTime, nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # A conversation's segments, newest first
+        db.Index('ix_chat_archive_segment_pair', 'user_low_id', 'user_high_id', 'last_message_id'),
+    )
+
+class ArchivedMessageDeletion(db.Model):
+    """A tombstone for an archived message its sender deleted.
+
+    Segment files are never rewritten, so reads of a conversation's
+    segments skip the message ids recorded here.
+    """
+    message_id = db.Column(db.Integer, primary_key=True)
+    user_low_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_archived_message_deletion_pair', 'user_low_id', 'user_high_id'),
+    )
+
 class Donation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     donor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -126,6 +256,11 @@ class Listing(db.Model):
     location = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Optimistic locking: bumped on every sale-relevant change (see reservations.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Short checkout hold; a hold past reserved_until is treated as free
+    reserved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    reserved_until = db.Column(db.DateTime, nullable=True)
     
     # Foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -133,10 +268,23 @@ class Listing(db.Model):
     
     # Relationships
     images = db.relationship('ListingImage', backref='listing', lazy=True, cascade="all, delete-orphan")
+    primary_image = db.relationship(
+        'ListingImage',
+        primaryjoin="and_(ListingImage.listing_id == Listing.id, ListingImage.is_primary == True)",
+        uselist=False, viewonly=True
+    )
     cart_items = db.relationship('CartItem', backref='listing', lazy=True, cascade="all, delete-orphan")
     wishlist_items = db.relationship('WishlistItem', backref='listing', lazy=True, cascade="all, delete-orphan")
     trades = db.relationship('Trade', foreign_keys='Trade.listing_id', backref='listing', lazy=True)
 
+    __table_args__ = (
+        # Facet counts of the /listings sidebar (see facets.py), one per facet
+        db.Index('ix_listing_active_category', 'is_active', 'category_id'),
+        db.Index('ix_listing_active_type', 'is_active', 'listing_type'),
+        db.Index('ix_listing_active_condition', 'is_active', 'condition'),
+        db.Index('ix_listing_active_price', 'is_active', 'price'),
+    )
+
 class ListingImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -144,6 +292,11 @@ class ListingImage(db.Model):
     listing_id = db.Column(db.Integer, db.ForeignKey('listing.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # A listing's images, and its primary image
+        db.Index('ix_listing_image_listing', 'listing_id', 'is_primary'),
+    )
+
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -151,12 +304,95 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, default=1)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_cart_item_user_listing', 'user_id', 'listing_id'),
+        # Carts to invalidate when a listing changes
+        db.Index('ix_cart_item_listing', 'listing_id'),
+    )
+
+class CartSummary(db.Model):
+    """Cached totals of a user's cart (see cart_service.py); deleted whenever they may be stale."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+    unavailable_count = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class WishlistItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     listing_id = db.Column(db.Integer, db.ForeignKey('listing.id'), nullable=False)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_wishlist_item_user_listing', 'user_id', 'listing_id'),
+        # Everyone who wishlisted a listing, in batches (see wishlist_alerts.py)
+        db.Index('ix_wishlist_item_listing', 'listing_id', 'id'),
+    )
+
+class WishlistAlert(db.Model):
+    """A listing change to fan out to everyone who wishlisted it (see wishlist_alerts.py).
+
+    last_wishlist_item_id is how far the fan-out got, so an interrupted one
+    resumes where it stopped; claimed_until is the lease of the worker on it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    listing_id = db.Column(db.Integer, db.ForeignKey('listing.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # price_drop, unavailable
+    old_price = db.Column(db.Float)
+    new_price = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_until = db.Column(db.DateTime, nullable=True)
+    last_wishlist_item_id = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    done_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_wishlist_alert_pending', 'done_at', 'id'),
+    )
+
+class WishlistAlertQuota(db.Model):
+    """Wishlist alerts sent to a user since window_start, for WISHLIST_ALERT_LIMIT.
+
+    Kept apart from Notification because alerts about the same listing are
+    coalesced into one notification row.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    window_start = db.Column(db.DateTime, nullable=False)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+
+class SavedSearch(db.Model):
+    """A user's /listings filters, matched against new listings (see saved_searches.py).
+
+    latitude/longitude is where the user was when they saved it; radius is
+    only set when that was known, as /listings ignores it otherwise.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), nullable=True)
+    listing_type = db.Column(db.String(20), nullable=True)
+    condition = db.Column(db.String(50), nullable=True)
+    min_price = db.Column(db.Float, nullable=True)
+    max_price = db.Column(db.Float, nullable=True)
+    keywords = db.Column(db.String(100), nullable=True)  # The q= of /listings
+    radius = db.Column(db.Integer, nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_saved_search_user', 'user_id', 'id'),
+    )
+
+class SavedSearchTerm(db.Model):
+    """Inverted index from a listing term (category:3, text:bik, cell:95:361...) to the saved searches it may match."""
+    term = db.Column(db.String(64), primary_key=True)
+    saved_search_id = db.Column(db.Integer, db.ForeignKey('saved_search.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_saved_search_term_search', 'saved_search_id'),
+    )
+
 class Trade(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     initiator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -167,12 +403,24 @@ class Trade(db.Model):
     status = db.Column(db.String(20), default="pending")  # pending, accepted, rejected, completed
     message = db.Column(db.Text)
     loan_return_date = db.Column(db.DateTime, nullable=True)  # For loans
+    # Next loan notice still to send: 0 reminder, 1 overdue, 2 none (see loan_scheduler.py)
+    loan_notice_stage = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    loan_returned_at = db.Column(db.DateTime, nullable=True)  # Set by the lender; ends the loan's notices
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship for offered listing
     offered_listing = db.relationship('Listing', foreign_keys=[offered_listing_id], backref='offered_trades')
 
+    __table_args__ = (
+        # Loans still waiting for a notice, by due date; loans that are done drop out
+        db.Index('ix_trade_loan_due', 'loan_return_date', 'id',
+                 sqlite_where=db.and_(loan_return_date.isnot(None), loan_notice_stage < 2),
+                 postgresql_where=db.and_(loan_return_date.isnot(None), loan_notice_stage < 2)),
+        # Trades changed since the loan scheduler last looked
+        db.Index('ix_trade_updated_at', 'updated_at'),
+    )
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -181,7 +429,24 @@ class Notification(db.Model):
     notification_type = db.Column(db.String(50), nullable=False)  # chat, trade, listing, system
     related_id = db.Column(db.Integer)  # ID of related entity (listing, trade, etc.)
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Time of the latest coalesced event
+    # Unread notifications with the same group_key are folded into one row (see inbox.py)
+    group_key = db.Column(db.String(100), nullable=True)
+    count = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        # At most one unread row per group, which is also how it is found
+        db.Index('uq_notification_unread_group', 'user_id', 'group_key', unique=True,
+                 sqlite_where=db.and_(is_read == False, group_key.isnot(None)),
+                 postgresql_where=db.and_(is_read == False, group_key.isnot(None))),
+        # Retention: read notifications by age
+        db.Index('ix_notification_read_created', 'is_read', 'created_at'),
+        # Inbox pages, newest first, overall and per type
+        db.Index('ix_notification_user_recent', 'user_id', 'created_at', 'id'),
+        db.Index('ix_notification_user_type_recent', 'user_id', 'notification_type', 'created_at', 'id'),
+        # Unread badge counts
+        db.Index('ix_notification_user_unread', 'user_id', 'is_read'),
+    )
 
 class UserReview(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -194,3 +459,23 @@ class UserReview(db.Model):
     
     # Relationship with trade
     trade = db.relationship('Trade')
+
+def upgrade_schema():
+    """Add columns and indexes that db.create_all() cannot add to existing tables."""
+    engine = db.engine
+    preparer = engine.dialect.identifier_preparer
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col["name"] for col in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
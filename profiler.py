@@ -0,0 +1,153 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import re
+import threading
+import time
+
+# A statement issued this many times in one request is reported as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = 5
+SLOWEST_KEPT = 5
+MAX_REPEATED_KEPT = 20
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+
+def normalize_statement(statement):
+    """Collapse whitespace and expanded IN lists so repeated statements compare equal."""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+class RequestProfile:
+    __slots__ = ("query_count", "db_time", "statements")
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.statements = {}  # normalized statement -> [count, total seconds, max seconds]
+
+    def record(self, statement, duration):
+        self.query_count += 1
+        self.db_time += duration
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, duration, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]:
+                entry[2] = duration
+
+    def repeated(self):
+        return {statement: entry[0] for statement, entry in self.statements.items()
+                if entry[0] >= N_PLUS_ONE_THRESHOLD}
+
+    def slowest(self, limit=SLOWEST_KEPT):
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][2], reverse=True)
+        return [(statement, entry[2]) for statement, entry in ranked[:limit]]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault("profiler_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    starts = conn.info.get("profiler_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    profile = g.get("sql_profile")
+    if profile is None:
+        profile = g.sql_profile = RequestProfile()
+    profile.record(normalize_statement(statement), duration)
+
+def init_profiler(app):
+    """Attach the SQL profiler to app if SQL_PROFILER_ENABLED is set.
+
+    When disabled no engine listeners or request hooks are installed, so the
+    cost is nil.
+    """
+    if not app.config.get("SQL_PROFILER_ENABLED"):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.after_request(_after_request)
+
+def _after_request(response):
+    if request.endpoint == "static":
+        return response
+    profile = g.pop("sql_profile", None)
+    if profile is None:
+        profile = RequestProfile()
+    # One key for every unrouted path, so 404 floods cannot grow the stats
+    endpoint = request.endpoint or "unmatched"
+    repeated = profile.repeated()
+
+    _record_endpoint(endpoint, profile, repeated)
+
+    if current_app.debug or current_app.config.get("SQL_PROFILER_HEADERS"):
+        response.headers["X-DB-Query-Count"] = str(profile.query_count)
+        response.headers["X-DB-Time-Ms"] = f"{profile.db_time * 1000:.2f}"
+        response.headers["X-DB-Repeated-Statements"] = str(len(repeated))
+
+    budget = current_app.config.get("SQL_QUERY_BUDGET")
+    if budget and profile.query_count > budget:
+        current_app.logger.warning(
+            "%s %s issued %d queries (budget %d, %.1f ms in DB)%s",
+            request.method, request.path, profile.query_count, budget, profile.db_time * 1000,
+            "; repeated: " + "; ".join(f"{count}x {statement[:120]}" for statement, count in repeated.items()) if repeated else ""
+        )
+    return response
+
+def _record_endpoint(endpoint, profile, repeated):
+    with _stats_lock:
+        stats = _endpoint_stats.get(endpoint)
+        if stats is None:
+            stats = _endpoint_stats[endpoint] = {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_time": 0.0,
+                "n_plus_one_requests": 0,
+                "repeated": {},  # statement -> highest repeat count seen in one request
+                "slowest": [],   # [(seconds, statement)], longest first
+            }
+        stats["requests"] += 1
+        stats["queries"] += profile.query_count
+        stats["max_queries"] = max(stats["max_queries"], profile.query_count)
+        stats["db_time"] += profile.db_time
+        if repeated:
+            stats["n_plus_one_requests"] += 1
+            for statement, count in repeated.items():
+                if statement in stats["repeated"] or len(stats["repeated"]) < MAX_REPEATED_KEPT:
+                    stats["repeated"][statement] = max(count, stats["repeated"].get(statement, 0))
+        slowest = stats["slowest"] + [(duration, statement) for statement, duration in profile.slowest()]
+        unique = {}
+        for duration, statement in sorted(slowest, reverse=True):
+            unique.setdefault(statement, duration)
+        stats["slowest"] = [(duration, statement) for statement, duration in list(unique.items())[:SLOWEST_KEPT]]
+
+def endpoint_report():
+    """Per-endpoint aggregates for this worker process, busiest endpoints first."""
+    with _stats_lock:
+        rows = []
+        for endpoint, stats in _endpoint_stats.items():
+            requests = stats["requests"] or 1
+            rows.append({
+                "endpoint": endpoint,
+                "requests": stats["requests"],
+                "avg_queries": stats["queries"] / requests,
+                "max_queries": stats["max_queries"],
+                "avg_db_ms": stats["db_time"] * 1000 / requests,
+                "n_plus_one_requests": stats["n_plus_one_requests"],
+                "repeated": sorted(stats["repeated"].items(), key=lambda item: item[1], reverse=True),
+                "slowest": [(duration * 1000, statement) for duration, statement in stats["slowest"]],
+            })
+    return sorted(rows, key=lambda row: row["avg_queries"] * row["requests"], reverse=True)
+
+def reset_report():
+    with _stats_lock:
+        _endpoint_stats.clear()
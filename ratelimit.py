@@ -0,0 +1,181 @@
+from flask import current_app, jsonify, request, session
+from collections import OrderedDict
+from functools import wraps
+from metrics import inc
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+def _take(tokens, updated, now, rate, burst):
+    """Refill a bucket to now and try to spend one token.
+
+    Returns (allowed, tokens left, seconds until a token is available).
+    """
+    if updated is None or now < updated:
+        tokens = burst
+    else:
+        tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+class MemoryStore:
+    """Token buckets for one worker process.
+
+    At most max_keys buckets are kept, least recently used first out, like
+    the slots of SharedMemoryStore; an evicted key starts again with a full
+    bucket.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated), least recently used first
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, None))
+            allowed, tokens, retry_after = _take(tokens, updated, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, retry_after
+
+    def refund(self, key, burst):
+        """Give back a token taken from key's bucket."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + 1), updated)
+
+class SharedMemoryStore:
+    """Token buckets in a memory-mapped file shared by all workers on the host.
+
+    The file is a fixed-size hash table of (key hash, tokens, updated) slots
+    grouped in sets of WAYS; a key lives in one set, and when a set is full
+    the least recently used slot is reused. Each set is guarded by an fcntl
+    byte-range lock, so workers only contend when they touch the same set.
+    """
+    SLOT = struct.Struct("=Qdd")
+    WAYS = 4
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.groups = max(1, slots // self.WAYS)
+        self.size = self.groups * self.WAYS * self.SLOT.size
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # Opened lazily so every forked worker gets its own descriptor
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, self.size)
+        self._pid = os.getpid()
+
+    def _slot(self, key):
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        return key_hash, (key_hash % self.groups) * self.WAYS * self.SLOT.size
+
+    def _find(self, key_hash, start):
+        """(offset, tokens, updated, found) for key_hash in the set at start.
+
+        When the key has no slot, offset is that of the slot to reuse. The
+        caller holds the set's lock.
+        """
+        oldest = None
+        for way in range(self.WAYS):
+            slot_offset = start + way * self.SLOT.size
+            slot_hash, slot_tokens, slot_updated = self.SLOT.unpack_from(self._map, slot_offset)
+            if slot_hash == key_hash:
+                return slot_offset, slot_tokens, slot_updated, True
+            if oldest is None or slot_hash == 0 or slot_updated < oldest[1]:
+                oldest = (slot_offset, 0.0 if slot_hash == 0 else slot_updated)
+        return oldest[0], None, None, False
+
+    def _locked(self, start, fn):
+        length = self.WAYS * self.SLOT.size
+        # fcntl locks are per process, so threads of one worker also need a lock
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                return fn()
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def take(self, key, rate, burst, now):
+        key_hash, start = self._slot(key)
+
+        def take_token():
+            offset, tokens, updated, found = self._find(key_hash, start)
+            allowed, tokens, retry_after = _take(tokens if found else burst, updated, now, rate, burst)
+            self.SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+            return allowed, retry_after
+        return self._locked(start, take_token)
+
+    def refund(self, key, burst):
+        """Give back a token taken from key's bucket."""
+        key_hash, start = self._slot(key)
+
+        def give_back():
+            offset, tokens, updated, found = self._find(key_hash, start)
+            if found:
+                self.SLOT.pack_into(self._map, offset, key_hash, min(burst, tokens + 1), updated)
+        self._locked(start, give_back)
+
+_store = None
+
+def init_rate_limiter(app):
+    """Create the bucket store selected by RATE_LIMIT_STORAGE ("memory" or "shared")."""
+    global _store
+    if app.config.get("RATE_LIMIT_STORAGE") == "shared":
+        _store = SharedMemoryStore(app.config["RATE_LIMIT_SHM_PATH"], app.config.get("RATE_LIMIT_SHM_SLOTS", 65536))
+    else:
+        _store = MemoryStore()
+
+def _too_many_requests(retry_after):
+    response = jsonify({"error": "Too many requests, please slow down."})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def rate_limit(name):
+    """Throttle a view with the per-user and per-IP buckets configured in RATE_LIMITS[name].
+
+    Each entry maps "user" and/or "ip" to (tokens per second, burst size).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limits = current_app.config.get("RATE_LIMITS", {}).get(name)
+            if _store is None or not limits or not current_app.config.get("RATE_LIMIT_ENABLED"):
+                return f(*args, **kwargs)
+            now = time.time()
+            buckets = []
+            if "user_id" in session and "user" in limits:
+                buckets.append((f"{name}:user:{session['user_id']}", limits["user"]))
+            if "ip" in limits:
+                buckets.append((f"{name}:ip:{request.remote_addr}", limits["ip"]))
+            taken = []
+            for key, (rate, burst) in buckets:
+                allowed, retry_after = _store.take(key, rate, burst, now)
+                if not allowed:
+                    # A rejected request costs nothing, so refund the buckets already charged
+                    for taken_key, taken_burst in taken:
+                        _store.refund(taken_key, taken_burst)
+                    inc("exchangify_rate_limited_total", (("limit", name), ("scope", key.split(":")[1])))
+                    return _too_many_requests(retry_after)
+                taken.append((key, burst))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
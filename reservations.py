@@ -0,0 +1,143 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from sqlalchemy import update, select, or_, and_
+from models import db, Listing
+from cart_service import invalidate_listing_carts
+from wishlist_alerts import enqueue_alert
+import threading
+
+# Default length of a checkout hold, in seconds
+DEFAULT_HOLD_SECONDS = 10 * 60
+
+_reaper = None
+_reaper_lock = threading.Lock()
+
+def _hold_is_free(user_id, now):
+    # A listing can be claimed by user_id if nobody holds it, user_id holds it,
+    # or the previous hold has run out.
+    return or_(
+        Listing.reserved_by_id.is_(None),
+        Listing.reserved_by_id == user_id,
+        Listing.reserved_until < now
+    )
+
+def reserve_listings(listing_ids, user_id):
+    """Take (or extend) a checkout hold on the given listings for user_id.
+
+    Returns the set of listing ids now held by user_id. Listings held by
+    another buyer, or no longer active, are left untouched.
+    """
+    if not listing_ids or not current_app.config.get('CHECKOUT_HOLDS_ENABLED', True):
+        return set()
+
+    now = datetime.utcnow()
+    hold_seconds = current_app.config.get('CHECKOUT_HOLD_SECONDS', DEFAULT_HOLD_SECONDS)
+
+    db.session.execute(
+        update(Listing)
+        .where(
+            Listing.id.in_(listing_ids),
+            Listing.is_active == True,
+            _hold_is_free(user_id, now)
+        )
+        .values(reserved_by_id=user_id, reserved_until=now + timedelta(seconds=hold_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    _start_reaper(current_app._get_current_object())
+
+    return set(db.session.execute(
+        select(Listing.id).where(Listing.id.in_(listing_ids), Listing.reserved_by_id == user_id)
+    ).scalars())
+
+def release_listings(user_id, listing_ids=None):
+    """Drop the holds user_id has on listing_ids (all of them if None).
+
+    The caller owns the transaction and must commit.
+    """
+    conditions = [Listing.reserved_by_id == user_id]
+    if listing_ids is not None:
+        conditions.append(Listing.id.in_(listing_ids))
+    db.session.execute(
+        update(Listing)
+        .where(*conditions)
+        .values(reserved_by_id=None, reserved_until=None)
+        .execution_options(synchronize_session=False)
+    )
+
+def claim_listing(listing_id, expected_version, user_id=None):
+    """Compare-and-set a listing from active to sold.
+
+    Issues UPDATE ... WHERE id=? AND version=? AND is_active=1 so that of any
+    number of concurrent callers exactly one sees a matched row. When user_id
+    is given, listings held by a different buyer cannot be claimed. The caller
+    owns the transaction and must commit or roll back.
+    """
+    conditions = [
+        Listing.id == listing_id,
+        Listing.version == expected_version,
+        Listing.is_active == True
+    ]
+    if user_id is not None:
+        conditions.append(_hold_is_free(user_id, datetime.utcnow()))
+
+    result = db.session.execute(
+        update(Listing)
+        .where(and_(*conditions))
+        .values(
+            is_active=False,
+            version=Listing.version + 1,
+            reserved_by_id=None,
+            reserved_until=None,
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    # Carts holding the listing now have an unavailable item
+    invalidate_listing_carts([listing_id])
+    enqueue_alert(listing_id, "unavailable")
+    return True
+
+def expire_holds():
+    """Clear holds whose time has run out. Returns the number of rows freed."""
+    result = db.session.execute(
+        update(Listing)
+        .where(Listing.reserved_until < datetime.utcnow())
+        .values(reserved_by_id=None, reserved_until=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def _start_reaper(app):
+    # Expired holds are already ignored by every claim, so the reaper only
+    # tidies rows up; one daemon timer per process is plenty.
+    global _reaper
+    with _reaper_lock:
+        if _reaper is not None:
+            return
+        interval = app.config.get('CHECKOUT_HOLD_REAP_SECONDS', 60)
+
+        def run():
+            global _reaper
+            with _reaper_lock:
+                _reaper = None
+            try:
+                with app.app_context():
+                    expire_holds()
+                    # Keep the timer going only while holds exist
+                    pending = db.session.execute(
+                        select(Listing.id).where(Listing.reserved_until.isnot(None)).limit(1)
+                    ).first()
+            except Exception:
+                app.logger.exception("Failed to expire checkout holds")
+                return
+            if pending:
+                _start_reaper(app)
+
+        _reaper = threading.Timer(interval, run)
+        _reaper.daemon = True
+        _reaper.start()
@@ -0,0 +1,119 @@
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Review, ReviewTag, Tag
+import re
+
+MAX_TAG_LENGTH = 50
+_SEPARATORS = re.compile(r"[,;#]+")
+
+def normalize_tag(name):
+    """Lowercase name and collapse its whitespace, e.g. " Customer  Service" -> "customer service"."""
+    return " ".join((name or "").lower().split())[:MAX_TAG_LENGTH].strip()
+
+def parse_tags(text):
+    """The distinct normalized tags in a comma, semicolon or # separated tags string, in order."""
+    tags = []
+    for part in _SEPARATORS.split(text or ""):
+        tag = normalize_tag(part)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+def _tag_ids(names):
+    """{name: id} of the tags called names, creating the missing ones."""
+    ids = {}
+    missing = list(names)
+    while True:
+        ids.update(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing))).all())
+        missing = [name for name in names if name not in ids]
+        if not missing:
+            return ids
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Tag), [{"name": name, "review_count": 0} for name in missing])
+        except IntegrityError:
+            # Another request created some of them first, which rolled back
+            # the whole insert; look those up and insert the rest again
+            pass
+
+def tag_review(review_id, tags_text):
+    """Link a new review to the tags in tags_text and count it for each; the caller commits."""
+    names = parse_tags(tags_text)
+    if not names:
+        return []
+    tag_ids = list(_tag_ids(names).values())
+    db.session.execute(insert(ReviewTag), [{"review_id": review_id, "tag_id": tag_id} for tag_id in tag_ids])
+    db.session.execute(
+        update(Tag).where(Tag.id.in_(tag_ids)).values(review_count=Tag.review_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return names
+
+def untag_reviews(review_ids):
+    """Unlink reviews about to be deleted and uncount them; the caller commits.
+
+    review_ids is a list of ids or a select of them. Tags left with no
+    reviews are kept with a zero count and left out of the tag cloud.
+    """
+    counts = db.session.execute(
+        select(ReviewTag.tag_id, func.count())
+        .where(ReviewTag.review_id.in_(review_ids))
+        .group_by(ReviewTag.tag_id)
+    ).all()
+    # One UPDATE per distinct count, usually just "minus one"
+    by_count = {}
+    for tag_id, count in counts:
+        by_count.setdefault(count, []).append(tag_id)
+    for count, tag_ids in by_count.items():
+        db.session.execute(
+            update(Tag).where(Tag.id.in_(tag_ids)).values(review_count=Tag.review_count - count)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(
+        delete(ReviewTag).where(ReviewTag.review_id.in_(review_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+def reviews_tagged(name):
+    """A select of the ids of reviews tagged name, for Review.id.in_()."""
+    return (select(ReviewTag.review_id)
+            .join(Tag, Tag.id == ReviewTag.tag_id)
+            .where(Tag.name == normalize_tag(name)))
+
+def tag_cloud(limit=30):
+    """[(name, review count)] of the most used tags, alphabetically."""
+    rows = db.session.execute(
+        select(Tag.name, Tag.review_count)
+        .where(Tag.review_count > 0)
+        .order_by(Tag.review_count.desc(), Tag.name)
+        .limit(limit)
+    ).all()
+    return sorted(rows)
+
+def rebuild_review_tags(batch_size=10000):
+    """Re-parse the tags of every review and recount them; returns how many reviews were indexed."""
+    db.session.execute(delete(ReviewTag))
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(Review.id, Review.tags)
+            .where(Review.id > last_id)
+            .order_by(Review.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        parsed = [(row.id, parse_tags(row.tags)) for row in batch]
+        tag_ids = _tag_ids(sorted({name for _, names in parsed for name in names}))
+        rows = [{"review_id": review_id, "tag_id": tag_ids[name]} for review_id, names in parsed for name in names]
+        if rows:
+            db.session.execute(insert(ReviewTag), rows)
+        indexed += len(batch)
+        last_id = batch[-1].id
+    db.session.execute(
+        update(Tag).values(review_count=select(func.count()).where(ReviewTag.tag_id == Tag.id).scalar_subquery())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return indexed
@@ -0,0 +1,195 @@
+from sqlalchemy import delete, insert, select
+from models import db, Listing, SavedSearch, SavedSearchTerm, User
+from helpers import bounding_box, calculate_distance
+from inbox import notify_many
+from metrics import inc
+import math
+
+MAX_PER_USER = 20
+# Size of the grid cells radius searches are indexed under
+CELL_DEGREES = 0.25
+# Radius searches covering more cells than this are indexed by another filter
+MAX_CELLS = 400
+# Recent listings used to estimate which filter of a search is the most selective
+SAMPLE_SIZE = 1000
+# Terms looked up per query when percolating a listing
+LOOKUP_CHUNK = 500
+
+def _trigrams(text):
+    text = (text or "").lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _cell(latitude, longitude):
+    return f"cell:{math.floor(latitude / CELL_DEGREES)}:{math.floor(longitude / CELL_DEGREES)}"
+
+def _cells_around(latitude, longitude, radius):
+    """Terms of the grid cells covering radius km around a point, or None if there are too many."""
+    box = bounding_box(latitude, longitude, radius)
+    if box is None:
+        return None
+    min_lat, max_lat, min_lon, max_lon = box
+    rows = range(math.floor(min_lat / CELL_DEGREES), math.floor(max_lat / CELL_DEGREES) + 1)
+    columns = range(math.floor(min_lon / CELL_DEGREES), math.floor(max_lon / CELL_DEGREES) + 1)
+    if len(rows) * len(columns) > MAX_CELLS:
+        return None
+    return {f"cell:{row}:{column}" for row in rows for column in columns}
+
+def _filter_terms(listing):
+    terms = {"all", f"category:{listing.category_id}", f"type:{listing.listing_type}",
+             f"condition:{listing.condition}"}
+    if listing.latitude and listing.longitude:
+        terms.add(_cell(listing.latitude, listing.longitude))
+    return terms
+
+def listing_terms(listing):
+    """Every term a saved search matching listing can be indexed under."""
+    terms = _filter_terms(listing)
+    terms.update(f"text:{trigram}" for trigram in _trigrams(listing.title) | _trigrams(listing.description))
+    return terms
+
+def _anchor_options(search):
+    """Term sets search could be indexed under; any listing it matches has a term of each set."""
+    options = [{f"text:{trigram}"} for trigram in sorted(_trigrams(search.keywords))]
+    if search.radius:
+        cells = _cells_around(search.latitude, search.longitude, search.radius)
+        if cells:
+            options.append(cells)
+    if search.category_id:
+        options.append({f"category:{search.category_id}"})
+    if search.condition:
+        options.append({f"condition:{search.condition}"})
+    if search.listing_type:
+        options.append({f"type:{search.listing_type}"})
+    return options
+
+def _anchor_terms(search):
+    """The terms to index search under: the option fewest recent listings have, or "all"."""
+    options = _anchor_options(search)
+    if not options:
+        return {"all"}
+    if len(options) == 1:
+        return options[0]
+    keyword_trigrams = _trigrams(search.keywords)
+    sample = []
+    for row in db.session.execute(
+        select(Listing.category_id, Listing.listing_type, Listing.condition, Listing.latitude,
+               Listing.longitude, Listing.title, Listing.description)
+        .where(Listing.is_active == True)
+        .order_by(Listing.id.desc())
+        .limit(SAMPLE_SIZE)
+    ):
+        # Only the trigrams of the keywords matter here, so skip splitting the text
+        text = f"{row.title or ''}\n{row.description or ''}".lower()
+        sample.append(_filter_terms(row) | {f"text:{trigram}" for trigram in keyword_trigrams if trigram in text})
+    # min() keeps the first of equally selective options, so keywords win ties
+    return min(options, key=lambda terms: sum(1 for listing in sample if not terms.isdisjoint(listing)))
+
+def matches(search, listing):
+    """Whether /listings with search's filters would show listing."""
+    if search.category_id and listing.category_id != search.category_id:
+        return False
+    if search.listing_type and listing.listing_type != search.listing_type:
+        return False
+    if search.condition and listing.condition != search.condition:
+        return False
+    if search.min_price is not None and (listing.price is None or listing.price < search.min_price):
+        return False
+    if search.max_price is not None and (listing.price is None or listing.price > search.max_price):
+        return False
+    if search.keywords:
+        keywords = search.keywords.lower()
+        if keywords not in (listing.title or "").lower() and keywords not in (listing.description or "").lower():
+            return False
+    if search.radius:
+        if not (listing.latitude and listing.longitude):
+            return False
+        if calculate_distance(search.latitude, search.longitude, listing.latitude, listing.longitude) > search.radius:
+            return False
+    return True
+
+def search_args(search):
+    """The /listings query arguments that re-run search."""
+    args = {"category": search.category_id, "type": search.listing_type, "condition": search.condition,
+            "min_price": search.min_price, "max_price": search.max_price, "q": search.keywords,
+            "radius": search.radius}
+    return {key: value for key, value in args.items() if value is not None}
+
+def save_search(user_id, name, category_id=None, listing_type=None, condition=None, min_price=None,
+                max_price=None, keywords=None, radius=None):
+    """Store a saved search and index it; the caller commits.
+
+    Raises ValueError when user_id already has MAX_PER_USER saved searches.
+    """
+    if SavedSearch.query.filter_by(user_id=user_id).count() >= MAX_PER_USER:
+        raise ValueError(f"You can save at most {MAX_PER_USER} searches")
+    latitude = longitude = None
+    if radius:
+        user = db.session.get(User, user_id)
+        if user and user.latitude and user.longitude:
+            latitude, longitude = user.latitude, user.longitude
+        else:
+            # /listings ignores the radius of users without a location
+            radius = None
+    search = SavedSearch(user_id=user_id, name=name, category_id=category_id or None,
+                         listing_type=listing_type or None, condition=condition or None, min_price=min_price,
+                         max_price=max_price, keywords=keywords or None, radius=radius or None,
+                         latitude=latitude, longitude=longitude)
+    db.session.add(search)
+    db.session.flush()
+    db.session.execute(insert(SavedSearchTerm),
+                       [{"term": term, "saved_search_id": search.id} for term in _anchor_terms(search)])
+    return search
+
+def _delete_searches(*conditions):
+    # Terms first; foreign keys are not enforced on SQLite, so nothing cascades
+    db.session.execute(
+        delete(SavedSearchTerm)
+        .where(SavedSearchTerm.saved_search_id.in_(select(SavedSearch.id).where(*conditions)))
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(
+        delete(SavedSearch).where(*conditions).execution_options(synchronize_session=False)
+    ).rowcount
+
+def delete_saved_search(user_id, search_id):
+    """Delete one of user_id's saved searches; the caller commits. Returns whether it existed."""
+    return _delete_searches(SavedSearch.id == search_id, SavedSearch.user_id == user_id) > 0
+
+def delete_user_saved_searches(user_id):
+    """Delete all of user_id's saved searches, e.g. with their account; the caller commits."""
+    return _delete_searches(SavedSearch.user_id == user_id)
+
+def percolate(listing):
+    """The saved searches of other users that listing matches.
+
+    Only searches indexed under one of the listing's terms are loaded and
+    checked, so the cost follows the number of candidate searches rather
+    than the number of saved searches.
+    """
+    terms = sorted(listing_terms(listing))
+    candidate_ids = set()
+    for start in range(0, len(terms), LOOKUP_CHUNK):
+        candidate_ids.update(db.session.scalars(
+            select(SavedSearchTerm.saved_search_id).where(SavedSearchTerm.term.in_(terms[start:start + LOOKUP_CHUNK]))
+        ))
+    if not candidate_ids:
+        return []
+    candidates = SavedSearch.query.filter(SavedSearch.id.in_(candidate_ids),
+                                          SavedSearch.user_id != listing.user_id).all()
+    matched = [search for search in candidates if matches(search, listing)]
+    inc("exchangify_saved_search_candidates_total", (("result", "matched"),), len(matched))
+    inc("exchangify_saved_search_candidates_total", (("result", "rejected"),), len(candidates) - len(matched))
+    return matched
+
+def notify_saved_searches(listing):
+    """Tell the owners of the saved searches a new listing matches; the caller commits.
+
+    Each owner gets one notification however many of their searches match,
+    and unread ones are folded into a count. Returns the number of matching
+    searches.
+    """
+    matched = percolate(listing)
+    notify_many([search.user_id for search in matched], "New match for your saved searches",
+                f"{listing.title} matches one of your saved searches.", "search", listing.id,
+                group_key="saved_search", grouped_message="{count} new listings match your saved searches.")
+    return len(matched)
@@ -0,0 +1,99 @@
+from flask import current_app, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+# Both are optional: without orjson the stock provider is used, without
+# msgpack every client gets JSON.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = "application/msgpack"
+
+class FieldError(ValueError):
+    pass
+
+if orjson is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """JSON provider backed by orjson, writing response bodies as bytes directly.
+
+        Datetimes still go through DefaultJSONProvider.default, and keys are
+        sorted when sort_keys is set, so responses look the same as with the
+        stock provider.
+        """
+        @property
+        def option(self):
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            return option | orjson.OPT_SORT_KEYS if self.sort_keys else option
+
+        def dumps(self, obj, **kwargs):
+            if kwargs:
+                return super().dumps(obj, **kwargs)
+            return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+        def loads(self, s, **kwargs):
+            if kwargs:
+                return super().loads(s, **kwargs)
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(
+                orjson.dumps(obj, default=self.default, option=self.option), mimetype=self.mimetype
+            )
+else:
+    OrjsonProvider = None
+
+JSON_PROVIDERS = {
+    "default": DefaultJSONProvider,
+    "orjson": OrjsonProvider,
+}
+
+def init_serialization(app):
+    """Install the JSON provider named by JSON_PROVIDER ("auto" picks orjson if installed)."""
+    name = app.config.get("JSON_PROVIDER", "auto")
+    if name == "auto":
+        name = "orjson" if OrjsonProvider is not None else "default"
+    provider_class = JSON_PROVIDERS.get(name)
+    if provider_class is None:
+        raise RuntimeError(f"JSON provider {name!r} is not available")
+    app.json = provider_class(app)
+
+def requested_fields(available):
+    """Parse ?fields=a,b into a list of names from available; None means all fields.
+
+    Raises FieldError naming any field that is not available.
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise FieldError("Unknown fields: " + ", ".join(unknown))
+    return fields
+
+def serialize(obj, serializers, fields=None):
+    """Build a dict for obj calling only the serializers for the requested fields."""
+    if fields is None:
+        return {name: serializer(obj) for name, serializer in serializers.items()}
+    return {name: serializers[name](obj) for name in fields}
+
+def api_response(data, status=200):
+    """Respond with MessagePack if the client asks for it and it is available, else JSON."""
+    if msgpack is not None and request.accept_mimetypes.best_match(
+            ("application/json", MSGPACK_MIMETYPE)) == MSGPACK_MIMETYPE:
+        # The JSON provider's default, so dates are HTTP dates as in the JSON responses
+        response = current_app.response_class(
+            msgpack.packb(data, default=current_app.json.default), mimetype=MSGPACK_MIMETYPE
+        )
+    else:
+        response = jsonify(data)
+    response.status_code = status
+    response.vary.add("Accept")
+    return response
@@ -0,0 +1,142 @@
+from sqlalchemy import and_, delete, event, exists, insert, inspect, select
+from sqlalchemy.orm import aliased
+from models import db, Conversation, User, UserSearchToken
+import re
+import unicodedata
+
+MIN_QUERY_LENGTH = 2
+MAX_TOKEN_LENGTH = 32
+# Rows read from the token index before ranking
+CANDIDATES = 200
+# Most recent conversation partners considered for the ranking boost
+MAX_PARTNERS = 1000
+
+_WORD = re.compile(r"[^\W_]+")
+
+def normalize(text):
+    """Split text into lowercase words with accents removed."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    return [word[:MAX_TOKEN_LENGTH] for word in _WORD.findall(text)]
+
+def tokens_for(first_name, last_name, email):
+    local_part = (email or "").split("@", 1)[0]
+    tokens = set(normalize(first_name)) | set(normalize(last_name)) | set(normalize(local_part))
+    if local_part:
+        tokens.add(local_part.casefold()[:MAX_TOKEN_LENGTH])
+    return tokens
+
+def _token_rows(connection, user_id, first_name, last_name, email):
+    rows = [{"token": token, "user_id": user_id} for token in tokens_for(first_name, last_name, email)]
+    if rows:
+        connection.execute(insert(UserSearchToken), rows)
+
+# The index follows every ORM change to a user, whichever view made it
+@event.listens_for(User, "after_insert")
+def _index_new_user(mapper, connection, user):
+    _token_rows(connection, user.id, user.first_name, user.last_name, user.email)
+
+@event.listens_for(User, "after_update")
+def _reindex_user(mapper, connection, user):
+    state = inspect(user)
+    if any(state.attrs[name].history.has_changes() for name in ("first_name", "last_name", "email")):
+        connection.execute(delete(UserSearchToken).where(UserSearchToken.user_id == user.id))
+        _token_rows(connection, user.id, user.first_name, user.last_name, user.email)
+
+@event.listens_for(User, "after_delete")
+def _unindex_user(mapper, connection, user):
+    connection.execute(delete(UserSearchToken).where(UserSearchToken.user_id == user.id))
+
+def _prefix(word, token=UserSearchToken.token):
+    # Index range scan instead of LIKE, which cannot use the index case-insensitively
+    return and_(token >= word, token < word + "\uffff")
+
+def _also_matching(words):
+    """Conditions that the candidate also has a word starting with each of words."""
+    conditions = []
+    for word in words:
+        other = aliased(UserSearchToken)
+        conditions.append(exists().where(other.user_id == UserSearchToken.user_id, _prefix(word, other.token)))
+    return conditions
+
+def _partner_ids(user_id):
+    """Conversation partners of user_id, most recent first."""
+    def side(column, partner_column):
+        return db.session.execute(
+            select(partner_column, Conversation.last_message_at)
+            .where(column == user_id)
+            .order_by(Conversation.last_message_at.desc())
+            .limit(MAX_PARTNERS)
+        ).all()
+    rows = side(Conversation.user_low_id, Conversation.user_high_id) + \
+        side(Conversation.user_high_id, Conversation.user_low_id)
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return [partner_id for partner_id, _ in rows[:MAX_PARTNERS]]
+
+def find_users(query, user_id, limit=20):
+    """Users whose name or email words start with every word of query, best matches first.
+
+    Conversation partners of user_id rank first, then users with an exact word
+    match, then shorter matching words. Queries shorter than MIN_QUERY_LENGTH
+    return nothing.
+    """
+    words = sorted(set(normalize(query)), key=len, reverse=True)
+    if not words or len("".join(words)) < MIN_QUERY_LENGTH:
+        return []
+    first, rest = words[0], words[1:]
+    # Every other query word must also prefix one of the candidate's words.
+    # Checked in SQL before the CANDIDATES limit, so a common first word
+    # cannot crowd out the users who match all of them.
+    also = _also_matching(rest)
+
+    # Best matching token per candidate, from the partners and from the index
+    matches = {}
+    partner_ids = _partner_ids(user_id)
+    partner_rank = {partner_id: rank for rank, partner_id in enumerate(partner_ids)}
+    if partner_ids:
+        for candidate, token in db.session.execute(
+                select(UserSearchToken.user_id, UserSearchToken.token)
+                .where(UserSearchToken.user_id.in_(partner_ids), _prefix(first), *also)):
+            matches[candidate] = min(token, matches.get(candidate, token), key=len)
+    for candidate, token in db.session.execute(
+            select(UserSearchToken.user_id, UserSearchToken.token)
+            .where(_prefix(first), *also)
+            .order_by(UserSearchToken.token)
+            .limit(CANDIDATES)):
+        matches[candidate] = min(token, matches.get(candidate, token), key=len)
+    matches.pop(user_id, None)
+
+    ranked = sorted(matches, key=lambda candidate: (
+        partner_rank.get(candidate, len(partner_rank)),
+        matches[candidate] != first,
+        len(matches[candidate]),
+        matches[candidate],
+        candidate
+    ))[:limit]
+    users = {user.id: user for user in User.query.filter(User.id.in_(ranked))} if ranked else {}
+    return [(users[candidate], candidate in partner_rank) for candidate in ranked if candidate in users]
+
+def rebuild_user_search(batch_size=10000):
+    """Recreate the search tokens of every user; returns how many users were indexed."""
+    db.session.execute(delete(UserSearchToken))
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(User.id, User.first_name, User.last_name, User.email)
+            .where(User.id > last_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        rows = [{"token": token, "user_id": row.id}
+                for row in batch for token in tokens_for(row.first_name, row.last_name, row.email)]
+        if rows:
+            db.session.execute(insert(UserSearchToken), rows)
+        indexed += len(batch)
+        last_id = batch[-1].id
+    db.session.commit()
+    return indexed
@@ -0,0 +1,7 @@
+from views import admin, auth, cart, chat, donations, installments, listings, notifications, reviews, trades, users
+
+BLUEPRINTS = (auth, admin, installments, chat, donations, listings, cart, trades, reviews, notifications, users)
+
+def register_blueprints(app):
+    for module in BLUEPRINTS:
+        app.register_blueprint(module.bp)
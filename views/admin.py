@@ -0,0 +1,174 @@
+from flask import Blueprint, current_app, render_template, request, redirect, session, url_for, flash
+from sqlalchemy import select
+from models import db, User, Review, Installment, Donation, Listing, Trade
+from helpers import requires_admin
+from saved_searches import delete_user_saved_searches
+from review_tags import normalize_tag, parse_tags, reviews_tagged, tag_cloud, untag_reviews
+from profiler import endpoint_report, reset_report
+
+bp = Blueprint('admin', __name__)
+
+@bp.route("/reviews")
+@requires_admin
+def reviews():
+    # Get search query if any
+    search_query = request.args.get('search', '')
+    tag_filter = normalize_tag(request.args.get('tag', ''))
+    
+    query = Review.query
+    # Exact tag match through ix_review_tag_tag
+    if tag_filter:
+        query = query.filter(Review.id.in_(reviews_tagged(tag_filter)))
+    
+    # Fetch reviews based on search query; tags must match exactly
+    if search_query:
+        query = query.filter(
+            (Review.title.contains(search_query)) | 
+            (Review.content.contains(search_query)) |
+            (Review.id.in_(reviews_tagged(search_query)))
+        )
+    
+    reviews = query.all()
+        
+    return render_template(
+        "reviews_for_admin.html",
+        reviews=reviews,
+        search_query=search_query,
+        tag_filter=tag_filter,
+        tag_cloud=tag_cloud(),
+        parse_tags=parse_tags
+    )
+
+@bp.route("/users")
+@requires_admin
+def users():
+    # Get search query if any
+    search_query = request.args.get('search', '')
+    
+    # Fetch users based on search query
+    if search_query and search_query.isdigit():
+        users = User.query.filter_by(id=int(search_query)).all()
+    else:
+        users = User.query.all()
+        
+    return render_template("users_for_admin.html", users=users, search_query=search_query)
+
+@bp.route("/delete_user/<int:user_id>", methods=["POST"])
+@requires_admin
+def delete_user(user_id):
+    # Prevent deleting the admin user
+    if user_id == session.get("user_id"):
+        flash("You cannot delete your own account.", "danger")
+        return redirect(url_for('admin.users'))
+    
+    user = User.query.get_or_404(user_id)
+    
+    # Delete all reviews by this user
+    untag_reviews(select(Review.id).where(Review.user_id == user_id))
+    Review.query.filter_by(user_id=user_id).delete()
+    
+    # Their saved searches would otherwise keep matching new listings
+    delete_user_saved_searches(user_id)
+    
+    # Delete the user
+    db.session.delete(user)
+    db.session.commit()
+    
+    flash("User and all their reviews deleted successfully!", "success")
+    return redirect(url_for('admin.users'))
+
+# Add a new route to delete reviews
+@bp.route("/delete_review/<int:review_id>", methods=["POST"])
+@requires_admin
+def delete_review(review_id):
+    review = Review.query.get_or_404(review_id)
+    untag_reviews([review.id])
+    db.session.delete(review)
+    db.session.commit()
+    flash("Review deleted successfully!", "success")
+    return redirect(url_for('admin.reviews'))
+
+@bp.route("/admin_dashboard")
+@requires_admin
+def admin_dashboard():
+    # Get user count for the dashboard
+    user_count = User.query.filter_by(role='user').count()
+    # Get recent reviews for the dashboard
+    reviews = Review.query.order_by(Review.date.desc()).limit(5).all()
+    # Get pending installment applications
+    pending_installments = Installment.query.filter_by(status="pending").count()
+    # Get pending donation applications
+    pending_donations = Donation.query.filter_by(status="pending").count()
+    # Get pending trade requests
+    pending_trades = Trade.query.filter_by(status="pending").count()
+    # Get total listings
+    total_listings = Listing.query.count()
+    
+    # Get purchase trades count
+    purchase_trades_count = Trade.query.filter_by(trade_type="purchase").count()
+    
+    # Get recent purchase trades
+    recent_purchase_trades = Trade.query.filter_by(trade_type="purchase").order_by(Trade.created_at.desc()).limit(5).all()
+    
+    return render_template(
+        "admin_dashboard.html", 
+        user_count=user_count, 
+        reviews=reviews,
+        pending_installments=pending_installments,
+        pending_donations=pending_donations,
+        pending_trades=pending_trades,
+        total_listings=total_listings,
+        purchase_trades_count=purchase_trades_count,
+        recent_purchase_trades=recent_purchase_trades
+    )
+
+@bp.route("/admin/trades")
+@requires_admin
+def admin_trades():
+    # Get filter parameters
+    trade_type = request.args.get('type')
+    status = request.args.get('status')
+    search_query = request.args.get('q', '')
+    
+    # Base query
+    query = Trade.query
+    
+    # Apply filters
+    if trade_type:
+        query = query.filter_by(trade_type=trade_type)
+    
+    if status:
+        query = query.filter_by(status=status)
+    
+    if search_query:
+        query = query.join(User, User.id == Trade.initiator_id).filter(
+            (User.first_name.contains(search_query)) |
+            (User.last_name.contains(search_query)) |
+            (User.email.contains(search_query))
+        )
+    
+    # Order by most recent first
+    trades = query.order_by(Trade.created_at.desc()).all()
+    
+    return render_template(
+        "admin_trades.html", 
+        trades=trades, 
+        trade_type=trade_type,
+        status=status,
+        search_query=search_query
+    )
+
+@bp.route("/admin/sql_profile", methods=["GET", "POST"])
+@requires_admin
+def admin_sql_profile():
+    if request.method == "POST":
+        reset_report()
+        flash("SQL profile reset.", "success")
+        return redirect(url_for('admin.admin_sql_profile'))
+    
+    return render_template(
+        "sql_profile_for_admin.html",
+        enabled=current_app.config['SQL_PROFILER_ENABLED'],
+        query_budget=current_app.config['SQL_QUERY_BUDGET'],
+        report=endpoint_report()
+    )
@@ -0,0 +1,131 @@
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+from models import db, User
+from identity import login_user
+from helpers import allowed_file, update_user_status, upload_path
+from datetime import datetime
+
+bp = Blueprint('auth', __name__)
+
+@bp.route("/", methods=["GET", "POST"])
+def login():
+    if request.method == "POST":
+        email = request.form.get("email").strip()
+        password = request.form.get("password")
+        role = request.form.get("role")
+        
+        if not email or not password or not role:
+            flash("All fields are required", "danger")
+            return redirect(url_for('auth.login'))
+        
+        # Check if user exists with the given email
+        user = User.query.filter_by(email=email).first()
+        
+        if not user:
+            flash("Invalid email or password", "danger")
+            return redirect(url_for('auth.login'))
+        
+        # Verify password
+        if not check_password_hash(user.password, password):
+            flash("Invalid email or password", "danger")
+            return redirect(url_for('auth.login'))
+        
+        # Check if role matches
+        if user.role != role:
+            flash(f"This account is not registered as a {role}", "danger")
+            return redirect(url_for('auth.login'))
+        
+        # Set user session
+        login_user(user)
+        
+        # Update user's online status
+        update_user_status(user.id, True)
+        
+        # Redirect based on role
+        if role == "admin":
+            return redirect(url_for('admin.admin_dashboard'))
+        else:
+            return redirect(url_for('users.user_dashboard'))
+            
+    return render_template("login.html")
+
+@bp.route("/signup", methods=["GET", "POST"])
+def signup():
+    if request.method == "POST":
+        # Get form data
+        email = request.form.get("email").strip()
+        password = request.form.get("password")
+        first_name = request.form.get("first_name")
+        last_name = request.form.get("last_name")
+        mobile = request.form.get("mobile")
+        gender = request.form.get("gender")
+        address = request.form.get("address")
+        city = request.form.get("city")
+        state = request.form.get("state")
+        zip_code = request.form.get("zip_code")
+        country = request.form.get("country", "United States")
+        latitude = request.form.get("latitude")
+        longitude = request.form.get("longitude")
+        
+        # Check if the email already exists
+        if User.query.filter_by(email=email).first():
+            flash("Email already in use. Please try another one.", "danger")
+            return redirect(url_for('auth.signup'))
+        
+        # Handle profile image upload
+        profile_image = None
+        if 'profile_image' in request.files:
+            file = request.files['profile_image']
+            if file and file.filename != '' and allowed_file(file.filename):
+                filename = secure_filename(file.filename)
+                # Add timestamp to filename to make it unique
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                profile_image = f"{timestamp}_{filename}"
+                file.save(upload_path('PROFILE_IMAGES_FOLDER', profile_image))
+        
+        # Create new user
+        hashed_password = generate_password_hash(password)
+        user = User(
+            email=email, 
+            password=hashed_password, 
+            role="user",
+            first_name=first_name,
+            last_name=last_name,
+            mobile=mobile,
+            gender=gender,
+            address=address,
+            city=city,
+            state=state,
+            zip_code=zip_code,
+            country=country,
+            latitude=latitude,
+            longitude=longitude,
+            profile_image=profile_image
+        )
+        
+        # Save to database
+        db.session.add(user)
+        db.session.commit()
+
+        # Log the user in after sign-up (automatically set session)
+        login_user(user)  # Store the user's identity in the session
+        
+        # Update user's online status
+        update_user_status(user.id, True)
+
+        flash("Sign up successful! Welcome!", "success")
+        return redirect(url_for('users.user_dashboard'))  # Redirect to the user dashboard after sign-up
+    
+    # Add this return statement for GET requests
+    return render_template("signup.html")
+
+@bp.route("/logout")
+def logout():
+    # Update user's online status if logged in
+    if "user_id" in session:
+        update_user_status(session["user_id"], False)
+    
+    session.clear()  # Clear all session data
+    flash("You have successfully logged out.", "info")  # Notify user they logged out
+    return redirect(url_for('auth.login'))  # Redirect to login page after logging out
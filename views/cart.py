@@ -0,0 +1,274 @@
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash, jsonify
+from models import db, Listing, CartItem, WishlistItem, Trade
+from identity import current_user
+from helpers import requires_login, create_notification
+from ratelimit import rate_limit
+from reservations import reserve_listings, release_listings, claim_listing
+from cart_service import adjust_cart_summary, cart_items as load_cart_items, cart_summary, invalidate_cart, is_available, total_price as cart_total
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+bp = Blueprint('cart', __name__)
+
+# Cart and Wishlist Routes
+@bp.route("/cart")
+@requires_login
+def view_cart():
+    cart_items = load_cart_items(session['user_id'])
+    
+    # Items whose listing was sold, deactivated or changed to another type stay
+    # in the cart but are flagged and left out of the total
+    unavailable_ids = {item.listing_id for item in cart_items if not is_available(item.listing)}
+    total_price = cart_total(cart_items)
+    
+    return render_template("cart.html", cart_items=cart_items, total_price=total_price, unavailable_ids=unavailable_ids)
+
+@bp.route("/api/cart/add", methods=["POST"])
+@requires_login
+@rate_limit("cart_add")
+def add_to_cart():
+    data = request.json
+    listing_id = data.get("listing_id")
+    
+    if not listing_id:
+        return jsonify({"error": "Listing ID is required"}), 400
+    
+    # Check if listing exists and is active
+    listing = Listing.query.get_or_404(listing_id)
+    if not listing.is_active:
+        return jsonify({"error": "This listing is no longer available"}), 400
+    
+    # Check if listing is for sale
+    if listing.listing_type != "sale":
+        return jsonify({"error": "Only items for sale can be added to cart"}), 400
+    
+    # Check if item is already in cart
+    cart_item = CartItem.query.filter_by(
+        user_id=session['user_id'],
+        listing_id=listing_id
+    ).first()
+    
+    if cart_item:
+        return jsonify({"error": "This item is already in your cart"}), 400
+    
+    # Add item to cart with quantity 1
+    cart_item = CartItem(
+        user_id=session['user_id'],
+        listing_id=listing_id,
+        quantity=1  # Always set to 1
+    )
+    db.session.add(cart_item)
+    adjust_cart_summary(session['user_id'], listing, 1)
+    cart_count = cart_summary(session['user_id'], commit=False).item_count
+    db.session.commit()
+    
+    return jsonify({
+        "success": True,
+        "message": "Item added to cart",
+        "cart_count": cart_count
+    })
+
+@bp.route("/api/cart/remove/<int:cart_item_id>", methods=["DELETE"])
+@requires_login
+def remove_from_cart(cart_item_id):
+    cart_item = CartItem.query.get_or_404(cart_item_id)
+    
+    # Check if user owns this cart item
+    if cart_item.user_id != session['user_id']:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    release_listings(session['user_id'], [cart_item.listing_id])
+    adjust_cart_summary(session['user_id'], cart_item.listing, -1)
+    db.session.delete(cart_item)
+    db.session.flush()
+    cart_count = cart_summary(session['user_id'], commit=False).item_count
+    db.session.commit()
+    
+    return jsonify({
+        "success": True,
+        "message": "Item removed from cart",
+        "cart_count": cart_count
+    })
+
+@bp.route("/wishlist")
+@requires_login
+def view_wishlist():
+    wishlist_items = WishlistItem.query.filter_by(user_id=session['user_id']).options(joinedload(WishlistItem.listing)).all()
+    return render_template("wishlist.html", wishlist_items=wishlist_items)
+
+@bp.route("/api/wishlist/toggle", methods=["POST"])
+@requires_login
+def toggle_wishlist():
+    data = request.json
+    listing_id = data.get("listing_id")
+    
+    if not listing_id:
+        return jsonify({"error": "Listing ID is required"}), 400
+    
+    # Check if listing exists
+    listing = Listing.query.get_or_404(listing_id)
+    
+    # Check if item is already in wishlist
+    wishlist_item = WishlistItem.query.filter_by(
+        user_id=session['user_id'],
+        listing_id=listing_id
+    ).first()
+    
+    if wishlist_item:
+        # Remove from wishlist
+        db.session.delete(wishlist_item)
+        db.session.commit()
+        return jsonify({
+            "success": True,
+            "in_wishlist": False,
+            "message": "Item removed from wishlist"
+        })
+    else:
+        # Add to wishlist
+        wishlist_item = WishlistItem(
+            user_id=session['user_id'],
+            listing_id=listing_id
+        )
+        db.session.add(wishlist_item)
+        db.session.commit()
+        return jsonify({
+            "success": True,
+            "in_wishlist": True,
+            "message": "Item added to wishlist"
+        })
+
+@bp.route("/checkout")
+@requires_login
+def checkout():
+    # Get cart items
+    cart_items = load_cart_items(session['user_id'])
+    
+    # If cart is empty, redirect to cart page
+    if not cart_items:
+        flash("Your cart is empty", "warning")
+        return redirect(url_for('cart.view_cart'))
+    
+    # Get user info for pre-filling the form
+    user = current_user()
+    
+    # Hold the items for this buyer while they fill in the form
+    reserve_listings([item.listing_id for item in cart_items], session['user_id'])
+    
+    # Flag items that were sold or are held by another buyer
+    now = datetime.utcnow()
+    unavailable_ids = set()
+    for item in cart_items:
+        listing = item.listing
+        held_elsewhere = (
+            listing.reserved_by_id not in (None, session['user_id']) and
+            listing.reserved_until and listing.reserved_until > now
+        )
+        if not is_available(listing) or held_elsewhere:
+            unavailable_ids.add(listing.id)
+    
+    # Calculate total price (quantity is always 1)
+    total_price = cart_total(cart_items)
+    
+    return render_template(
+        "checkout.html", 
+        cart_items=cart_items, 
+        total_price=total_price,
+        unavailable_ids=unavailable_ids,
+        user=user
+    )
+
+@bp.route("/api/place_order", methods=["POST"])
+@requires_login
+def place_order():
+    user_id = session['user_id']
+    cart_items = load_cart_items(user_id)
+    if not cart_items:
+        return jsonify({"error": "Your cart is empty"}), 400
+    
+    # /checkout sends back the version of each listing it showed, so an edit
+    # made since (e.g. a new price) fails the claim instead of going through
+    # unseen. Clients that send no versions buy the listings as read here.
+    seen_versions = (request.get_json(silent=True) or {}).get("versions") or {}
+    
+    # Claim every listing with a compare-and-set on its version. If any item
+    # was sold, edited or is held by another buyer since it was read, the
+    # whole order is rolled back and nothing is bought.
+    unavailable = []
+    for item in cart_items:
+        listing = item.listing
+        try:
+            expected_version = int(seen_versions.get(str(listing.id), listing.version))
+        except (TypeError, ValueError):
+            expected_version = -1
+        if not claim_listing(listing.id, expected_version, user_id):
+            unavailable.append((item.id, listing.id, listing.title))
+    
+    if unavailable:
+        db.session.rollback()
+        still_active = set(db.session.scalars(
+            select(Listing.id).where(Listing.id.in_([listing_id for _, listing_id, _ in unavailable]),
+                                     Listing.is_active == True)
+        ))
+        # Sold or deactivated items are dropped so a retry can succeed; items
+        # that were edited or are held by another buyer stay in the cart
+        removed = [(item_id, title) for item_id, listing_id, title in unavailable if listing_id not in still_active]
+        kept = [title for _, listing_id, title in unavailable if listing_id in still_active]
+        if removed:
+            CartItem.query.filter(CartItem.id.in_([item_id for item_id, _ in removed])).delete(synchronize_session=False)
+            invalidate_cart(user_id)
+            db.session.commit()
+        messages = []
+        if removed:
+            messages.append("Some items are no longer available and were removed from your cart: " +
+                            ", ".join(title for _, title in removed) + ".")
+        if kept:
+            messages.append("Some items were changed by the seller or are reserved by another buyer; "
+                            "review your cart and try again: " + ", ".join(kept) + ".")
+        return jsonify({
+            "error": " ".join(messages),
+            "unavailable": [title for _, _, title in unavailable],
+            "removed": [title for _, title in removed]
+        }), 409
+    
+    for item in cart_items:
+        listing = item.listing
+        trade = Trade(
+            initiator_id=user_id,
+            receiver_id=listing.user_id,
+            listing_id=listing.id,
+            trade_type="purchase",
+            message="Order placed through checkout",
+            status="completed"  # Set to 'completed' directly
+        )
+        db.session.add(trade)
+        db.session.flush()  # Assign trade.id for the notifications
+        
+        # Notify the seller
+        create_notification(
+            listing.user_id,
+            "Purchase Completed",
+            f"A purchase has been completed for your listing: {listing.title}",
+            "trade",
+            trade.id,
+            commit=False
+        )
+        
+        # Notify the buyer
+        create_notification(
+            user_id,
+            "Order Placed",
+            f"You have successfully placed an order for {listing.title}.",
+            "trade",
+            trade.id,
+            commit=False
+        )
+    
+    # Clear the cart
+    for item in cart_items:
+        db.session.delete(item)
+    invalidate_cart(user_id)
+    
+    db.session.commit()
+    
+    return jsonify({"success": True, "message": "Order placed successfully"})
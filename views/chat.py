@@ -0,0 +1,210 @@
+from flask import Blueprint, abort, current_app, render_template, request, session, url_for, jsonify
+from werkzeug.utils import secure_filename
+from models import db, ChatMessage, Conversation
+from identity import current_identity
+from helpers import requires_login, allowed_file, update_user_status, create_notification
+from ratelimit import rate_limit
+from conversations import PAGE_SIZE, conversations_for, decode_cursor, mark_read, pair, record_message, refresh_conversation
+from chat_archive import archived_messages, delete_archived_message, find_archived_message, newest_archived_id
+from user_search import find_users
+from inbox import mark_notifications_read
+from serialization import FieldError, api_response, requested_fields, serialize
+import os
+import uuid
+
+bp = Blueprint('chat', __name__)
+
+# Fields of chat message responses; ?fields= picks a subset
+MESSAGE_FIELDS = {
+    "id": lambda msg: msg.id,
+    "senderId": lambda msg: msg.sender_id,
+    "text": lambda msg: msg.message,
+    "type": lambda msg: msg.message_type,
+    "mediaUrl": lambda msg: msg.media_url if msg.message_type == "image" else None,
+    "isRead": lambda msg: msg.is_read,
+    "timestamp": lambda msg: msg.timestamp.isoformat(),
+}
+
+# Chat functionality
+@bp.route("/chat")
+@requires_login
+def chat():
+    # Update user's online status
+    update_user_status(session['user_id'])
+    
+    # Mark notifications as read
+    mark_notifications_read(session['user_id'], types=['chat'])
+    db.session.commit()
+    
+    return render_template("chat.html")
+
+@bp.route("/api/conversations", methods=["GET"])
+@requires_login
+def get_conversations():
+    limit = min(request.args.get("limit", PAGE_SIZE, type=int), 100)
+    before = request.args.get("before")
+    try:
+        before = decode_cursor(before) if before else None
+    except ValueError:
+        return api_response({"error": "Invalid cursor"}, 400)
+    
+    items, next_cursor = conversations_for(session['user_id'], before=before, limit=max(limit, 1))
+    return api_response({
+        "conversations": [{
+            "userId": partner.id,
+            "name": f"{partner.first_name} {partner.last_name}",
+            "isOnline": partner.is_online,
+            "lastMessageAt": conversation.last_message_at.isoformat(),
+            "lastSenderId": conversation.last_sender_id,
+            "preview": conversation.preview,
+            "unread": conversation.unread_for(session['user_id'])
+        } for conversation, partner in items if partner is not None],
+        "next": next_cursor
+    })
+
+@bp.route("/api/users/search", methods=["GET"])
+@requires_login
+@rate_limit("users_search")
+def search_users():
+    query = request.args.get("q", "")
+    limit = min(max(request.args.get("limit", current_app.config['USER_SEARCH_LIMIT'], type=int), 1), 50)
+    results = find_users(query, session['user_id'], limit=limit)
+    
+    return jsonify([{
+        "id": user.id,
+        "name": f"{user.first_name} {user.last_name}",
+        "isOnline": user.is_online,
+        "lastSeen": user.last_seen.isoformat() if user.last_seen else None,
+        "isPartner": is_partner
+    } for user, is_partner in results])
+
+@bp.route("/api/messages/<int:user_id>", methods=["GET"])
+@requires_login
+def get_messages(user_id):
+    current_user_id = session['user_id']
+    try:
+        fields = requested_fields(MESSAGE_FIELDS)
+    except FieldError as e:
+        return api_response({"error": str(e)}, 400)
+    
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", current_app.config['CHAT_PAGE_SIZE'], type=int), 1), 200)
+    
+    # Mark messages as read. Unread messages are never archived, so they are
+    # all in the hot table; the conversation's counter says whether to look.
+    low, high = pair(current_user_id, user_id)
+    conversation = Conversation.query.filter_by(user_low_id=low, user_high_id=high).first()
+    if conversation and conversation.unread_for(current_user_id):
+        ChatMessage.query.filter_by(sender_id=user_id, receiver_id=current_user_id, is_read=False) \
+            .update({"is_read": True}, synchronize_session=False)
+        mark_read(current_user_id, user_id)
+        db.session.commit()
+    
+    # The newest `limit` messages before the cursor, from the hot table and,
+    # once that runs out, from the archive segments
+    query = ChatMessage.query.filter(
+        ((ChatMessage.sender_id == current_user_id) & (ChatMessage.receiver_id == user_id)) |
+        ((ChatMessage.sender_id == user_id) & (ChatMessage.receiver_id == current_user_id))
+    )
+    if before is not None:
+        query = query.filter(ChatMessage.id < before)
+    messages = query.order_by(ChatMessage.id.desc()).limit(limit).all()
+    newest_archived = newest_archived_id(current_user_id, user_id, before)
+    if newest_archived is not None and (len(messages) < limit or newest_archived > messages[-1].id):
+        messages = sorted(messages + archived_messages(current_user_id, user_id, before, limit),
+                          key=lambda msg: msg.id, reverse=True)[:limit]
+    messages.reverse()
+    
+    return api_response([serialize(msg, MESSAGE_FIELDS, fields) for msg in messages])
+
+@bp.route("/api/messages/send", methods=["POST"])
+@requires_login
+@rate_limit("messages_send")
+def send_message():
+    current_user_id = session['user_id']
+    
+    data = request.json
+    receiver_id = data.get("receiverId")
+    message_text = data.get("message")
+    message_type = data.get("type", "text")
+    media_url = data.get("mediaUrl")
+    
+    if not receiver_id or (not message_text and message_type == "text"):
+        return jsonify({"error": "Missing required fields"}), 400
+    
+    message = ChatMessage(
+        sender_id=current_user_id,
+        receiver_id=receiver_id,
+        message=message_text,
+        message_type=message_type,
+        media_url=media_url
+    )
+    
+    db.session.add(message)
+    db.session.flush()
+    record_message(message)
+    
+    # Notify the receiver; unread ones from the same sender are folded into one
+    sender_name = current_identity().name
+    create_notification(
+        receiver_id,
+        "New Message",
+        f"You have a new message from {sender_name}",
+        "chat",
+        message.id,
+        commit=False,
+        group_key=f"chat:{current_user_id}",
+        grouped_message=f"You have {{count}} new messages from {sender_name}"
+    )
+    db.session.commit()
+    
+    return api_response(serialize(message, MESSAGE_FIELDS))
+
+@bp.route("/api/messages/upload", methods=["POST"])
+@requires_login
+def upload_message_image():
+    if 'image' not in request.files:
+        return jsonify({"error": "No file part"}), 400
+    
+    file = request.files['image']
+    
+    if file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+    
+    if file and allowed_file(file.filename):
+        # Generate unique filename
+        filename = secure_filename(file.filename)
+        unique_filename = f"{uuid.uuid4()}_{filename}"
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'chat', unique_filename)
+        
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file.save(file_path)
+        
+        # Return the URL to the uploaded file
+        file_url = url_for('static', filename=f'uploads/chat/{unique_filename}')
+        return jsonify({"url": file_url})
+    
+    return jsonify({"error": "File type not allowed"}), 400
+
+@bp.route("/api/messages/delete/<int:message_id>", methods=["DELETE"])
+@requires_login
+def delete_message(message_id):
+    message = db.session.get(ChatMessage, message_id) or find_archived_message(message_id)
+    if message is None:
+        abort(404)
+    
+    # Only allow the sender to delete their own messages
+    if message.sender_id != session['user_id']:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    if isinstance(message, ChatMessage):
+        db.session.delete(message)
+    else:
+        # Archived: segment files are immutable, so leave a tombstone
+        delete_archived_message(message)
+    db.session.flush()
+    refresh_conversation(message.sender_id, message.receiver_id)
+    db.session.commit()
+    
+    return jsonify({"success": True})
@@ -0,0 +1,204 @@
+from flask import Blueprint, current_app, render_template, request, redirect, session, url_for, flash, jsonify
+from werkzeug.utils import secure_filename
+from models import db, User, Donation
+from identity import current_identity
+from helpers import requires_login, allowed_file, create_notification, upload_path
+from donation_intake import intake_donations, validate_items
+from datetime import datetime
+import json
+
+bp = Blueprint('donations', __name__)
+
+# Donation functionality
+@bp.route("/donations")
+@requires_login
+def donations():
+    # Get donations made by the user
+    donations_made = Donation.query.filter_by(donor_id=session['user_id']).all()
+    
+    # Get donations received by the user
+    donations_received = Donation.query.filter_by(recipient_id=session['user_id']).all()
+    
+    # Get admin donations if the current user is an admin
+    identity = current_identity()
+    admin_donations = []
+    if identity.role == 'admin':
+        admin_donations = Donation.query.filter_by(is_admin_donation=True).all()
+    
+    return render_template("donations.html", 
+                          donations_made=donations_made, 
+                          donations_received=donations_received,
+                          admin_donations=admin_donations,
+                          is_admin=(identity.role == 'admin'))
+
+@bp.route("/donations/new", methods=["GET", "POST"])
+@requires_login
+def new_donation():
+    if request.method == "POST":
+        recipient_type = request.form.get("recipient_type")
+        recipient_id = None
+        is_admin_donation = False
+        
+        if recipient_type == "user":
+            recipient_id = request.form.get("recipient_id")
+            if not recipient_id:
+                flash("Please select a recipient", "danger")
+                return redirect(url_for("donations.new_donation"))
+        elif recipient_type == "admin":
+            is_admin_donation = True
+        
+        item_name = request.form.get("item_name")
+        description = request.form.get("description")
+        condition = request.form.get("condition")
+        
+        # Handle image upload
+        image_filename = None
+        if 'item_image' in request.files:
+            file = request.files['item_image']
+            if file and file.filename != '' and allowed_file(file.filename):
+                filename = secure_filename(file.filename)
+                # Add timestamp to filename to make it unique
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                image_filename = f"{timestamp}_{filename}"
+                file.save(upload_path('UPLOAD_FOLDER', image_filename))
+        
+        # Create new donation
+        donation = Donation(
+            donor_id=session['user_id'],
+            recipient_id=recipient_id,
+            item_name=item_name,
+            description=description,
+            condition=condition,
+            image_filename=image_filename,
+            status="pending",
+            is_admin_donation=is_admin_donation
+        )
+        
+        db.session.add(donation)
+        db.session.commit()
+        
+        # Create notification for recipient
+        if recipient_id:
+            create_notification(
+                recipient_id,
+                "New Donation Offer",
+                f"You have received a donation offer for: {item_name}",
+                "donation",
+                donation.id
+            )
+        elif is_admin_donation:
+            # Notify all admins
+            admins = User.query.filter_by(role='admin').all()
+            for admin in admins:
+                create_notification(
+                    admin.id,
+                    "New Donation to Organization",
+                    f"A new donation has been offered: {item_name}",
+                    "donation",
+                    donation.id
+                )
+        
+        flash("Donation created successfully!", "success")
+        return redirect(url_for("donations.donations"))
+    
+    # Get all users except current user
+    users = User.query.filter(User.id != session['user_id']).all()
+    return render_template("new_donation.html", users=users)
+
+@bp.route("/api/donations/batch", methods=["POST"])
+@requires_login
+def donation_batch():
+    # Donation drives upload many images at once; raise the limit before the body is parsed
+    request.max_content_length = current_app.config['DONATION_BATCH_MAX_CONTENT_LENGTH']
+    
+    recipient_type = request.form.get("recipient_type", "admin")
+    recipient_id = None
+    if recipient_type == "user":
+        recipient_id = request.form.get("recipient_id", type=int)
+        if not recipient_id or recipient_id == session['user_id'] or not db.session.get(User, recipient_id):
+            return jsonify({"error": "A valid recipient_id is required"}), 400
+    elif recipient_type != "admin":
+        return jsonify({"error": "recipient_type must be admin or user"}), 400
+    
+    # items is a JSON list, sent as a form field or as a file part for large drives
+    if 'items' in request.files:
+        raw_items = request.files['items'].read()
+    else:
+        raw_items = request.form.get("items", "")
+    try:
+        items = json.loads(raw_items)
+    except ValueError:
+        return jsonify({"error": "items must be a JSON list"}), 400
+    
+    # Items refer to their image by its uploaded file name
+    files = {}
+    for file in request.files.getlist('images'):
+        if not file or file.filename == '':
+            continue
+        if file.filename in files:
+            return jsonify({"error": f"Duplicate image name: {file.filename}"}), 400
+        files[file.filename] = file
+    
+    values, errors = validate_items(items, set(files), current_app.config['DONATION_BATCH_MAX_ITEMS'])
+    if errors:
+        # Nothing is stored unless every item is valid
+        return jsonify({
+            "error": "Invalid items",
+            "errors": [{"item": index, "error": message} for index, message in errors]
+        }), 400
+    
+    donation_ids = intake_donations(
+        session['user_id'],
+        values,
+        files,
+        recipient_id=recipient_id,
+        is_admin_donation=recipient_type == "admin",
+        workers=current_app.config['DONATION_IMAGE_WORKERS']
+    )
+    return jsonify({"success": True, "donations": donation_ids, "images": sum(1 for _, image in values if image)})
+
+@bp.route("/donations/<int:donation_id>")
+@requires_login
+def view_donation(donation_id):
+    donation = Donation.query.get_or_404(donation_id)
+    identity = current_identity()
+    
+    # Check if user is either donor, recipient, or admin (for admin donations)
+    if (donation.donor_id != session['user_id'] and 
+        donation.recipient_id != session['user_id'] and 
+        not (identity.role == 'admin' and donation.is_admin_donation)):
+        flash("You don't have permission to view this donation", "danger")
+        return redirect(url_for("donations.donations"))
+    
+    return render_template("view_donation.html", donation=donation, is_admin=(identity.role == 'admin'))
+
+@bp.route("/donations/<int:donation_id>/update_status", methods=["POST"])
+@requires_login
+def update_donation_status(donation_id):
+    donation = Donation.query.get_or_404(donation_id)
+    identity = current_identity()
+    
+    # Check if user is recipient or admin (for admin donations)
+    if (donation.recipient_id != session['user_id'] and 
+        not (identity.role == 'admin' and donation.is_admin_donation)):
+        flash("You don't have permission to update this donation", "danger")
+        return redirect(url_for("donations.donations"))
+    
+    new_status = request.form.get("status")
+    if new_status in ["accepted", "declined", "completed"]:
+        donation.status = new_status
+        db.session.commit()
+        
+        # Create notification for donor
+        status_message = "accepted" if new_status == "accepted" else "declined" if new_status == "declined" else "marked as received"
+        create_notification(
+            donation.donor_id,
+            f"Donation {status_message.capitalize()}",
+            f"Your donation of {donation.item_name} has been {status_message}.",
+            "donation",
+            donation.id
+        )
+        
+        flash(f"Donation {new_status} successfully!", "success")
+    
+    return redirect(url_for("donations.view_donation", donation_id=donation_id))
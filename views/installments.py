@@ -0,0 +1,175 @@
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash
+from sqlalchemy.orm import contains_eager
+from models import db, User, Installment, InstallmentScore
+from helpers import requires_admin, requires_login, create_notification
+from installment_scoring import RISK_BANDS, invalidate_user_scores, risk_band, score_pending
+from datetime import datetime
+
+bp = Blueprint('installments', __name__)
+
+# Installment application routes
+@bp.route("/apply_installment", methods=["GET", "POST"])
+@requires_login
+def apply_installment():
+    if request.method == "POST":
+        # Get form data
+        amount = request.form.get("amount")
+        purpose = request.form.get("purpose")
+        duration = request.form.get("duration")
+        income = request.form.get("income")
+        employment_status = request.form.get("employment_status")
+        employer = request.form.get("employer")
+        
+        # Validate inputs
+        if not amount or not purpose or not duration or not income or not employment_status:
+            flash("All required fields must be filled!", "danger")
+            return redirect(url_for('installments.apply_installment'))
+        
+        try:
+            amount = float(amount)
+            duration = int(duration)
+            income = float(income)
+        except ValueError:
+            flash("Invalid amount, duration, or income value", "danger")
+            return redirect(url_for('installments.apply_installment'))
+        
+        # Create new installment application
+        new_installment = Installment(
+            user_id=session["user_id"],
+            amount=amount,
+            purpose=purpose,
+            duration=duration,
+            income=income,
+            employment_status=employment_status,
+            employer=employer,
+            status="pending"
+        )
+        
+        # Add to database
+        db.session.add(new_installment)
+        db.session.commit()
+        
+        # Create notification for admin
+        admin_users = User.query.filter_by(role='admin').all()
+        for admin in admin_users:
+            create_notification(
+                admin.id,
+                "New Installment Application",
+                f"A new installment application for ${amount} has been submitted.",
+                "installment",
+                new_installment.id
+            )
+        
+        flash("Installment application submitted successfully!", "success")
+        return redirect(url_for('users.user_dashboard'))
+    
+    return render_template("apply_installment.html")
+
+@bp.route("/installments")
+@requires_admin
+def installments():
+    # Get search query if any
+    search_query = request.args.get('search', '')
+    status_filter = request.args.get('status', '')
+    risk_filter = request.args.get('risk', '')
+    sort = request.args.get('sort', 'date')
+    
+    # Bring the cached scores of pending applications up to date
+    if score_pending():
+        db.session.commit()
+    
+    # Base query
+    query = (Installment.query.join(User).outerjoin(Installment.score)
+             .options(contains_eager(Installment.user), contains_eager(Installment.score)))
+    
+    # Apply filters
+    if search_query:
+        if search_query.isdigit():
+            query = query.filter(
+                (Installment.id == int(search_query)) | 
+                (User.id == int(search_query))
+            )
+        else:
+            query = query.filter(
+                (User.first_name.contains(search_query)) | 
+                (User.last_name.contains(search_query)) |
+                (User.email.contains(search_query))
+            )
+    
+    if status_filter:
+        query = query.filter(Installment.status == status_filter)
+    
+    # Only pending applications are scored, so a risk band implies pending
+    if risk_filter in RISK_BANDS:
+        low, high = RISK_BANDS[risk_filter]
+        query = query.filter(Installment.status == 'pending', InstallmentScore.risk_score >= low)
+        if high is not None:
+            query = query.filter(InstallmentScore.risk_score < high)
+    
+    # Riskiest first when sorting by a score, unscored applications last
+    if sort == 'risk':
+        query = query.order_by(InstallmentScore.risk_score.is_(None), InstallmentScore.risk_score.desc())
+    elif sort == 'dti':
+        query = query.order_by(InstallmentScore.debt_to_income.is_(None), InstallmentScore.debt_to_income.desc())
+    elif sort == 'payment':
+        query = query.order_by(InstallmentScore.monthly_payment.is_(None), InstallmentScore.monthly_payment.desc())
+    else:
+        sort = 'date'
+    
+    # Most recent first, or among equal scores
+    installments = query.order_by(Installment.created_at.desc()).all()
+    
+    return render_template(
+        "installments_for_admin.html", 
+        installments=installments, 
+        search_query=search_query,
+        status_filter=status_filter,
+        risk_filter=risk_filter,
+        sort=sort,
+        risk_band=risk_band
+    )
+
+@bp.route("/installment/<int:installment_id>")
+@requires_admin
+def view_installment(installment_id):
+    installment = Installment.query.get_or_404(installment_id)
+    return render_template("view_installment.html", installment=installment)
+
+@bp.route("/update_installment_status/<int:installment_id>", methods=["POST"])
+@requires_admin
+def update_installment_status(installment_id):
+    installment = Installment.query.get_or_404(installment_id)
+    
+    status = request.form.get("status")
+    admin_notes = request.form.get("admin_notes")
+    
+    if status not in ["approved", "rejected"]:
+        flash("Invalid status", "danger")
+        return redirect(url_for('installments.installments'))
+    
+    installment.status = status
+    installment.admin_notes = admin_notes
+    installment.updated_at = datetime.utcnow()
+    # The user's other applications are scored against their approved debt
+    invalidate_user_scores(installment.user_id)
+    
+    db.session.commit()
+    
+    # Create notification for user
+    create_notification(
+        installment.user_id,
+        f"Installment Application {status.capitalize()}",
+        f"Your installment application for ${installment.amount} has been {status}.",
+        "installment",
+        installment.id
+    )
+    
+    flash(f"Installment application {status}", "success")
+    return redirect(url_for('installments.installments'))
+
+@bp.route("/my_installments")
+@requires_login
+def my_installments():
+    user_id = session["user_id"]
+    installments = Installment.query.filter_by(user_id=user_id).order_by(Installment.created_at.desc()).all()
+    return render_template("my_installments.html", installments=installments)
@@ -0,0 +1,494 @@
+from flask import Blueprint, current_app, render_template, request, redirect, session, url_for, flash, jsonify
+from werkzeug.utils import secure_filename
+from models import db, User, Category, Listing, ListingImage, SavedSearch, WishlistItem
+from identity import current_identity
+from helpers import requires_login, allowed_file, bounding_box, calculate_distance, ALLOWED_EXTENSIONS, upload_path
+from bulk_import import ImageSource, detect_format, import_listings
+from cart_service import cart_summary, invalidate_listing_carts
+from wishlist_alerts import enqueue_alert
+from facets import PRICE_BUCKETS, facet_counts, price_bucket_label, price_bucket_url
+from saved_searches import delete_saved_search, notify_saved_searches, save_search, search_args
+import os
+import uuid
+import zipfile
+from sqlalchemy import or_, func, update
+from sqlalchemy.orm import joinedload, selectinload
+from serialization import FieldError, api_response, requested_fields, serialize
+
+bp = Blueprint('listings', __name__)
+
+# Fields of /api/listings; clients can pick a subset with ?fields=id,title
+LISTING_FIELDS = {
+    "id": lambda listing: listing.id,
+    "title": lambda listing: listing.title,
+    "description": lambda listing: listing.description,
+    "price": lambda listing: listing.price,
+    "listing_type": lambda listing: listing.listing_type,
+    "owner_id": lambda listing: listing.user_id,
+    "image_url": lambda listing: url_for('static', filename='uploads/listings/' + listing.images[0].filename) if listing.images else None,
+}
+
+# Listing Management Routes
+@bp.route("/listings")
+def listings():
+    # Get filter parameters
+    category_id = request.args.get('category', type=int)
+    listing_type = request.args.get('type')
+    condition = request.args.get('condition')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    search_query = request.args.get('q', '')
+    radius = request.args.get('radius', type=int)  # None if not provided
+
+    # Filters by facet name, so the facet counts can leave each one out in turn
+    criteria = {}
+    if category_id:
+        criteria["category"] = Listing.category_id == category_id
+
+    if listing_type:
+        criteria["type"] = Listing.listing_type == listing_type
+
+    if condition:
+        criteria["condition"] = Listing.condition == condition
+
+    price_range = []
+    if min_price is not None:
+        price_range.append(Listing.price >= min_price)
+    if max_price is not None:
+        price_range.append(Listing.price <= max_price)
+    if price_range:
+        criteria["price"] = db.and_(*price_range)
+
+    # Case-insensitive search on title or description
+    if search_query:
+        search_term = search_query.lower()
+        criteria["q"] = or_(
+            func.lower(Listing.title).contains(search_term),
+            func.lower(Listing.description).contains(search_term)
+        )
+
+    # Distance is checked below; a bounding box keeps far away listings out of
+    # the query and the facet counts
+    user = None
+    if radius is not None and radius > 0 and 'user_id' in session:
+        user = User.query.get(session['user_id'])
+        box = bounding_box(user.latitude, user.longitude, radius) if user and user.latitude and user.longitude else None
+        if box:
+            min_lat, max_lat, min_lon, max_lon = box
+            criteria["radius"] = db.and_(Listing.latitude.between(min_lat, max_lat),
+                                         Listing.longitude.between(min_lon, max_lon))
+
+    query = Listing.query.filter(Listing.is_active == True, *criteria.values())
+
+    # Get all listings that match the filters; the owner is shown outside the
+    # cached card fragment, so load it in the same query
+    all_listings = query.options(joinedload(Listing.owner)).all()
+    facets = facet_counts(criteria)
+
+    # Apply distance filtering only if radius is explicitly provided and greater than 0
+    filtered_listings = all_listings
+    if user is not None:
+        if user.latitude and user.longitude:
+            filtered_listings = [
+                listing for listing in all_listings
+                if listing.latitude and listing.longitude and calculate_distance(
+                    user.latitude, user.longitude,
+                    listing.latitude, listing.longitude
+                ) <= radius
+            ]
+            # Add distance attribute to filtered listings
+            for listing in filtered_listings:
+                distance = calculate_distance(
+                    user.latitude, user.longitude,
+                    listing.latitude, listing.longitude
+                )
+                listing.distance = round(distance, 1)
+        # If user has no location, filtered_listings remains all_listings
+    # If radius is None (not provided) or 0, no distance filtering is applied
+
+    # Get all categories for the filter sidebar
+    categories = Category.query.all()
+
+    # Get counts for the navbar
+    cart_count = 0
+    wishlist_count = 0
+    saved_searches = []
+
+    if "user_id" in session:
+        cart_count = cart_summary(session["user_id"]).item_count
+        wishlist_count = WishlistItem.query.filter_by(user_id=session["user_id"]).count()
+        saved_searches = SavedSearch.query.filter_by(user_id=session["user_id"]).order_by(SavedSearch.id).all()
+
+    return render_template(
+        "listings.html",
+        listings=filtered_listings,
+        categories=categories,
+        selected_category=category_id,
+        selected_type=listing_type,
+        selected_condition=condition,
+        min_price=min_price,
+        max_price=max_price,
+        search_query=search_query,
+        radius=radius,
+        cart_count=cart_count,
+        wishlist_count=wishlist_count,
+        saved_searches=saved_searches,
+        search_args=search_args,
+        facets=facets,
+        price_buckets=PRICE_BUCKETS,
+        price_bucket_url=price_bucket_url,
+        price_bucket_label=price_bucket_label
+    )
+
+@bp.route("/saved_searches", methods=["POST"])
+@requires_login
+def create_saved_search():
+    filters = {
+        "category_id": request.form.get("category", type=int),
+        "listing_type": request.form.get("type"),
+        "condition": request.form.get("condition"),
+        "min_price": request.form.get("min_price", type=float),
+        "max_price": request.form.get("max_price", type=float),
+        "keywords": request.form.get("q", "")[:100],
+        "radius": request.form.get("radius", type=int),
+    }
+    name = request.form.get("name", "").strip()[:100] or filters["keywords"] or "My search"
+    try:
+        save_search(session['user_id'], name, **filters)
+    except ValueError as e:
+        flash(str(e), "danger")
+    else:
+        db.session.commit()
+        flash("Search saved. You will be notified about new listings that match it.", "success")
+    return redirect(request.referrer or url_for("listings.listings"))
+
+@bp.route("/saved_searches/<int:search_id>/delete", methods=["POST"])
+@requires_login
+def remove_saved_search(search_id):
+    if delete_saved_search(session['user_id'], search_id):
+        db.session.commit()
+        flash("Saved search deleted.", "success")
+    return redirect(request.referrer or url_for("listings.listings"))
+
+@bp.route("/listings/new", methods=["GET", "POST"])
+@requires_login
+def new_listing():
+    if request.method == "POST":
+        # Get form data
+        title = request.form.get("title")
+        description = request.form.get("description")
+        condition = request.form.get("condition")
+        category_id = request.form.get("category_id")
+        listing_type = request.form.get("listing_type")
+        price = request.form.get("price") if listing_type == "sale" else None
+        exchange_preferences = request.form.get("exchange_preferences") if listing_type == "exchange" else None
+        loan_duration = request.form.get("loan_duration") if listing_type == "loan" else None
+        location = request.form.get("location")
+        latitude = request.form.get("latitude")
+        longitude = request.form.get("longitude")
+        
+        # Validate required fields
+        if not title or not description or not condition or not category_id or not listing_type:
+            flash("Please fill in all required fields", "danger")
+            return redirect(url_for("listings.new_listing"))
+        
+        # Create new listing
+        listing = Listing(
+            title=title,
+            description=description,
+            condition=condition,
+            category_id=category_id,
+            listing_type=listing_type,
+            price=price,
+            exchange_preferences=exchange_preferences,
+            loan_duration=loan_duration,
+            location=location,
+            latitude=latitude,
+            longitude=longitude,
+            user_id=session['user_id']
+        )
+        
+        db.session.add(listing)
+        db.session.commit()
+        
+        # Handle image uploads
+        if 'images' in request.files:
+            images = request.files.getlist('images')
+            for i, image in enumerate(images):
+                if image and image.filename != '' and allowed_file(image.filename):
+                    filename = secure_filename(image.filename)
+                    # Add unique identifier to filename
+                    unique_filename = f"{uuid.uuid4()}_{filename}"
+                    file_path = upload_path('LISTING_IMAGES_FOLDER', unique_filename)
+                    image.save(file_path)
+                    
+                    # Create listing image record
+                    listing_image = ListingImage(
+                        filename=unique_filename,
+                        is_primary=(i == 0),  # First image is primary
+                        listing_id=listing.id
+                    )
+                    db.session.add(listing_image)
+        
+        db.session.commit()
+        
+        # Notify users whose saved searches match the new listing
+        if notify_saved_searches(listing):
+            db.session.commit()
+        
+        flash("Listing created successfully!", "success")
+        return redirect(url_for("listings.view_listing", listing_id=listing.id))
+    
+    # Get all categories for the form
+    categories = Category.query.all()
+    
+    return render_template("new_listing.html", categories=categories)
+
+@bp.route("/api/listings/import", methods=["POST"])
+@requires_login
+def import_listings_upload():
+    # Imports carry a whole catalogue and its images; raise the limit before the body is parsed
+    request.max_content_length = current_app.config['IMPORT_MAX_CONTENT_LENGTH']
+    
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({"error": "A CSV or JSONL file is required"}), 400
+    
+    upload = request.files['file']
+    image_source = None
+    if 'images' in request.files and request.files['images'].filename != '':
+        try:
+            image_source = ImageSource(request.files['images'].stream, ALLOWED_EXTENSIONS)
+        except zipfile.BadZipFile:
+            return jsonify({"error": "Images must be uploaded as a zip archive"}), 400
+    
+    try:
+        result = import_listings(
+            upload.stream,
+            detect_format(upload.filename),
+            session['user_id'],
+            image_source=image_source,
+            batch_size=current_app.config['IMPORT_BATCH_SIZE']
+        )
+    finally:
+        if image_source:
+            image_source.close()
+    
+    return jsonify(dict(result.to_dict(), success=True))
+
+@bp.route("/listings/<int:listing_id>")
+def view_listing(listing_id):
+    listing = Listing.query.get_or_404(listing_id)
+    
+    # Increment view count without touching updated_at, which keys the
+    # cached listing cards
+    db.session.execute(
+        update(Listing)
+        .where(Listing.id == listing.id)
+        .values(views=Listing.views + 1, updated_at=Listing.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    
+    # Check if the listing is in the user's wishlist
+    in_wishlist = False
+    if 'user_id' in session:
+        wishlist_item = WishlistItem.query.filter_by(
+            user_id=session['user_id'],
+            listing_id=listing.id
+        ).first()
+        in_wishlist = wishlist_item is not None
+    
+    # Get similar listings (same category)
+    similar_listings = Listing.query.filter(
+        Listing.category_id == listing.category_id,
+        Listing.id != listing.id,
+        Listing.is_active == True
+    ).limit(4).all()
+    
+    return render_template(
+        "view_listing.html",
+        listing=listing,
+        in_wishlist=in_wishlist,
+        similar_listings=similar_listings
+    )
+
+@bp.route("/listings/<int:listing_id>/edit", methods=["GET", "POST"])
+@requires_login
+def edit_listing(listing_id):
+    listing = Listing.query.get_or_404(listing_id)
+    
+    # Check if user is the owner
+    if listing.user_id != session['user_id']:
+        flash("You don't have permission to edit this listing", "danger")
+        return redirect(url_for("listings.view_listing", listing_id=listing.id))
+    
+    if request.method == "POST":
+        old_price = listing.price if listing.listing_type == "sale" else None
+        
+        # Update listing data
+        listing.title = request.form.get("title")
+        listing.description = request.form.get("description")
+        listing.condition = request.form.get("condition")
+        listing.category_id = request.form.get("category_id")
+        listing.listing_type = request.form.get("listing_type")
+        
+        if listing.listing_type == "sale":
+            listing.price = request.form.get("price")
+            listing.exchange_preferences = None
+            listing.loan_duration = None
+        elif listing.listing_type == "exchange":
+            listing.price = None
+            listing.exchange_preferences = request.form.get("exchange_preferences")
+            listing.loan_duration = None
+        elif listing.listing_type == "loan":
+            listing.price = None
+            listing.exchange_preferences = None
+            listing.loan_duration = request.form.get("loan_duration")
+        else:  # donation
+            listing.price = None
+            listing.exchange_preferences = None
+            listing.loan_duration = None
+        
+        listing.location = request.form.get("location")
+        listing.latitude = request.form.get("latitude")
+        listing.longitude = request.form.get("longitude")
+        # Orders placed from a /checkout page showing the old price/terms now
+        # fail their version check, and cached cart totals are recomputed
+        listing.version = Listing.version + 1
+        invalidate_listing_carts([listing.id])
+        
+        # Tell the people who wishlisted it about a price drop
+        try:
+            new_price = float(listing.price) if listing.listing_type == "sale" and listing.price else None
+        except ValueError:
+            new_price = None
+        if listing.is_active and old_price and new_price is not None and new_price < old_price:
+            enqueue_alert(listing.id, "price_drop", old_price, new_price)
+        
+        # Handle new image uploads
+        if 'new_images' in request.files:
+            new_images = request.files.getlist('new_images')
+            for image in new_images:
+                if image and image.filename != '' and allowed_file(image.filename):
+                    filename = secure_filename(image.filename)
+                    unique_filename = f"{uuid.uuid4()}_{filename}"
+                    file_path = upload_path('LISTING_IMAGES_FOLDER', unique_filename)
+                    image.save(file_path)
+                    
+                    # Create listing image record
+                    listing_image = ListingImage(
+                        filename=unique_filename,
+                        is_primary=False,  # New images are not primary by default
+                        listing_id=listing.id
+                    )
+                    db.session.add(listing_image)
+        
+        # Handle deleted images
+        deleted_images = request.form.getlist("delete_image")
+        for image_id in deleted_images:
+            image = ListingImage.query.get(image_id)
+            if image and image.listing_id == listing.id:
+                # Delete the file
+                try:
+                    os.remove(os.path.join(current_app.config['LISTING_IMAGES_FOLDER'], image.filename))
+                except:
+                    pass  # File might not exist
+                
+                # Delete the record
+                db.session.delete(image)
+        
+        # Handle primary image
+        primary_image_id = request.form.get("primary_image")
+        if primary_image_id:
+            # Reset all images to non-primary
+            for image in listing.images:
+                image.is_primary = (str(image.id) == primary_image_id)
+        
+        db.session.commit()
+        
+        flash("Listing updated successfully!", "success")
+        return redirect(url_for("listings.view_listing", listing_id=listing.id))
+    
+    # Get all categories for the form
+    categories = Category.query.all()
+    
+    return render_template("edit_listing.html", listing=listing, categories=categories)
+
+@bp.route("/listings/<int:listing_id>/delete", methods=["POST"])
+@requires_login
+def delete_listing(listing_id):
+    listing = Listing.query.get_or_404(listing_id)
+    
+    # Check if user is the owner
+    if listing.user_id != session['user_id'] and not current_identity().role == 'admin':
+        flash("You don't have permission to delete this listing", "danger")
+        return redirect(url_for("listings.view_listing", listing_id=listing.id))
+    
+    # Delete all images
+    for image in listing.images:
+        try:
+            os.remove(os.path.join(current_app.config['LISTING_IMAGES_FOLDER'], image.filename))
+        except:
+            pass  # File might not exist
+    
+    # Delete the listing (and the cart items holding it)
+    invalidate_listing_carts([listing.id])
+    db.session.delete(listing)
+    db.session.commit()
+    
+    flash("Listing deleted successfully!", "success")
+    return redirect(url_for("listings.my_listings"))
+
+@bp.route("/my_listings")
+@requires_login
+def my_listings():
+    listings = Listing.query.filter_by(user_id=session['user_id']).order_by(Listing.created_at.desc()).all()
+    return render_template("my_listings.html", listings=listings)
+
+@bp.route("/api/listings", methods=["GET"])
+def get_listings():
+    category_id = request.args.get('category', type=int)
+    listing_type = request.args.get('type')
+    condition = request.args.get('condition')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    search_query = request.args.get('q', '')
+    
+    criteria = {}
+    if category_id:
+        criteria["category"] = Listing.category_id == category_id
+    
+    if listing_type:
+        criteria["type"] = Listing.listing_type == listing_type
+    
+    if condition:
+        criteria["condition"] = Listing.condition == condition
+    
+    price_range = []
+    if min_price is not None:
+        price_range.append(Listing.price >= min_price)
+    if max_price is not None:
+        price_range.append(Listing.price <= max_price)
+    if price_range:
+        criteria["price"] = db.and_(*price_range)
+    
+    if search_query:
+        criteria["q"] = (Listing.title.contains(search_query)) | (Listing.description.contains(search_query))
+    
+    query = Listing.query.filter(Listing.is_active == True, *criteria.values())
+    
+    try:
+        fields = requested_fields(LISTING_FIELDS)
+    except FieldError as e:
+        return api_response({"error": str(e)}, 400)
+
+    # Only touch the images relationship when the client asked for it
+    if fields is None or "image_url" in fields:
+        query = query.options(selectinload(Listing.images))
+    listings = query.all()
+    results = [serialize(listing, LISTING_FIELDS, fields) for listing in listings]
+
+    # ?facets=1 wraps the results with the sidebar counts for the same filters
+    if request.args.get('facets') in ('1', 'true'):
+        return api_response({"listings": results, "facets": facet_counts(criteria)})
+    return api_response(results)
@@ -0,0 +1,118 @@
+from flask import Blueprint, abort, render_template, request, session, jsonify
+from models import db, Notification
+from helpers import requires_login
+from inbox import NOTIFICATION_TYPES, PAGE_SIZE, decode_cursor, inbox_page, mark_notifications_read
+from ratelimit import rate_limit
+from serialization import FieldError, api_response, requested_fields, serialize
+
+bp = Blueprint('notifications', __name__)
+
+# Fields of notification responses; ?fields= picks a subset
+NOTIFICATION_FIELDS = {
+    "id": lambda notification: notification.id,
+    "title": lambda notification: notification.title,
+    "message": lambda notification: notification.message,
+    "type": lambda notification: notification.notification_type,
+    "isRead": lambda notification: notification.is_read,
+    "count": lambda notification: notification.count,
+    "createdAt": lambda notification: notification.created_at.isoformat(),
+}
+
+def _requested_types():
+    """Notification types from ?type= (repeatable or comma-separated); raises ValueError on unknown ones."""
+    types = [t for value in request.args.getlist("type") for t in value.split(",") if t and t != "all"]
+    unknown = set(types) - set(NOTIFICATION_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown notification type: {', '.join(sorted(unknown))}")
+    return types
+
+# Notification Routes
+@bp.route("/notifications")
+@requires_login
+def notifications():
+    try:
+        types = _requested_types()
+        before = request.args.get("before")
+        before = decode_cursor(before) if before else None
+    except ValueError:
+        abort(400)
+    
+    user_notifications, next_cursor = inbox_page(session['user_id'], types=types, before=before)
+    
+    return render_template(
+        "notifications.html",
+        notifications=user_notifications,
+        next_cursor=next_cursor,
+        current_type=types[0] if len(types) == 1 else "all"
+    )
+
+@bp.route("/api/notifications")
+@requires_login
+def list_notifications():
+    limit = min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), 100)
+    try:
+        fields = requested_fields(NOTIFICATION_FIELDS)
+        types = _requested_types()
+    except (FieldError, ValueError) as e:
+        return api_response({"error": str(e)}, 400)
+    before = request.args.get("before")
+    try:
+        before = decode_cursor(before) if before else None
+    except ValueError:
+        return api_response({"error": "Invalid cursor"}, 400)
+    
+    page, next_cursor = inbox_page(session['user_id'], types=types, before=before, limit=limit)
+    return api_response({
+        "notifications": [serialize(notification, NOTIFICATION_FIELDS, fields) for notification in page],
+        "next": next_cursor
+    })
+
+@bp.route("/api/notifications/read", methods=["POST"])
+@requires_login
+def mark_notifications_read_bulk():
+    """Mark all unread notifications read, or only those of "types" and/or "ids" in the JSON body."""
+    data = request.get_json(silent=True) or {}
+    types = data.get("types") or ([data["type"]] if data.get("type") else None)
+    ids = data.get("ids")
+    if types is not None and (not isinstance(types, list) or set(types) - set(NOTIFICATION_TYPES)):
+        return jsonify({"error": "Unknown notification type"}), 400
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return jsonify({"error": "ids must be a list of notification ids"}), 400
+    
+    updated = mark_notifications_read(session['user_id'], types=types, ids=ids)
+    db.session.commit()
+    return jsonify({"success": True, "updated": updated})
+
+@bp.route("/api/notifications/read/<int:notification_id>", methods=["POST"])
+@requires_login
+def mark_notification_read(notification_id):
+    notification = Notification.query.get_or_404(notification_id)
+    if notification.user_id != session['user_id']:
+        return jsonify({"error": "Unauthorized"}), 403
+    notification.is_read = True
+    db.session.commit()
+    return jsonify({"success": True})
+
+@bp.route("/api/notifications/count")
+@requires_login
+@rate_limit("notifications_count")
+def notification_count():
+    count = Notification.query.filter_by(
+        user_id=session['user_id'],
+        is_read=False
+    ).count()
+    
+    return api_response({"count": count})
+
+@bp.route("/api/notifications/recent")
+@requires_login
+def recent_notifications():
+    try:
+        fields = requested_fields(NOTIFICATION_FIELDS)
+    except FieldError as e:
+        return api_response({"error": str(e)}, 400)
+    notifications = Notification.query.filter_by(
+        user_id=session['user_id']
+    ).order_by(Notification.created_at.desc()).limit(5).all()
+    
+    return api_response([serialize(notification, NOTIFICATION_FIELDS, fields) for notification in notifications])
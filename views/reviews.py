@@ -0,0 +1,146 @@
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash
+from models import db, User, Review, Trade, UserReview
+from helpers import requires_login, create_notification
+from review_tags import tag_review
+from datetime import datetime
+
+bp = Blueprint('reviews', __name__)
+
+# User Review Routes
+@bp.route("/reviews/user/<int:user_id>")
+def user_reviews(user_id):
+    user = User.query.get_or_404(user_id)
+    reviews = UserReview.query.filter_by(reviewed_id=user_id).all()
+    
+    # Calculate average rating
+    if reviews:
+        avg_rating = sum(review.rating for review in reviews) / len(reviews)
+    else:
+        avg_rating = 0
+    
+    return render_template(
+        "user_reviews.html",
+        user=user,
+        reviews=reviews,
+        avg_rating=avg_rating
+    )
+
+@bp.route("/reviews/new/<int:trade_id>", methods=["GET", "POST"])
+@requires_login
+def new_user_review(trade_id):
+    trade = Trade.query.get_or_404(trade_id)
+    
+    # Check if user is involved in this trade
+    if trade.initiator_id != session['user_id'] and trade.receiver_id != session['user_id']:
+        flash("You don't have permission to review this trade", "danger")
+        return redirect(url_for("trades.my_trades"))
+    
+    # Check if trade is completed
+    if trade.status != "completed":
+        flash("You can only review completed trades", "danger")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    # Determine who to review
+    if trade.initiator_id == session['user_id']:
+        reviewed_id = trade.receiver_id
+    else:
+        reviewed_id = trade.initiator_id
+    
+    # Check if user has already reviewed this trade
+    existing_review = UserReview.query.filter_by(
+        reviewer_id=session['user_id'],
+        trade_id=trade.id
+    ).first()
+    
+    if existing_review:
+        flash("You have already reviewed this trade", "danger")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    if request.method == "POST":
+        rating = request.form.get("rating")
+        comment = request.form.get("comment")
+        
+        # Validate rating
+        try:
+            rating = int(rating)
+            if rating < 1 or rating > 5:
+                raise ValueError
+        except:
+            flash("Rating must be between 1 and 5", "danger")
+            return redirect(url_for("reviews.new_user_review", trade_id=trade.id))
+        
+        # Create new review
+        review = UserReview(
+            reviewer_id=session['user_id'],
+            reviewed_id=reviewed_id,
+            trade_id=trade.id,
+            rating=rating,
+            comment=comment
+        )
+        
+        db.session.add(review)
+        db.session.commit()
+        
+        # Create notification for reviewed user
+        create_notification(
+            reviewed_id,
+            "New Review",
+            f"You have received a new review for a trade.",
+            "review",
+            review.id
+        )
+        
+        flash("Review submitted successfully!", "success")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    # Get user to review
+    reviewed_user = User.query.get(reviewed_id)
+    
+    return render_template(
+        "new_user_review.html",
+        trade=trade,
+        reviewed_user=reviewed_user
+    )
+
+@bp.route("/add_review", methods=["GET", "POST"])
+def add_review():
+    if "user_id" not in session:
+        flash("You need to log in to submit a review.", "warning")
+        return redirect(url_for('auth.login'))
+
+    if request.method == "POST":
+        title = request.form.get("title").strip()
+        content = request.form.get("content").strip()
+        tags = request.form.get("tags")
+        date = request.form.get("date")
+
+        # Validate inputs
+        if not title or not content or not tags or not date:
+            flash("All fields are required!", "danger")
+            return redirect(url_for('reviews.add_review'))
+
+        try:
+            date_obj = datetime.strptime(date, "%Y-%m-%d")  # Convert string to datetime object
+        except ValueError:
+            flash("Invalid date format", "danger")
+            return redirect(url_for('reviews.add_review'))
+
+        # Create new review
+        new_review = Review(
+            title=title,
+            content=content,
+            tags=tags,
+            date=date_obj,
+            user_id=session["user_id"]
+        )
+
+        # Add the review to the database
+        db.session.add(new_review)
+        db.session.flush()
+        tag_review(new_review.id, tags)
+        db.session.commit()
+
+        flash("Review added successfully!", "success")
+        return redirect(url_for('users.user_dashboard'))  # Redirect back to the dashboard after success
+
+    return render_template("add_review_for_user.html")  # Ensure you return the template if it's a GET request
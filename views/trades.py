@@ -0,0 +1,197 @@
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash
+from models import db, Listing, Trade
+from helpers import requires_login, create_notification
+from reservations import claim_listing
+from loan_scheduler import ACTIVE_STATUSES, DONE
+from datetime import datetime, timedelta
+
+bp = Blueprint('trades', __name__)
+
+# Trade Routes
+@bp.route("/trades")
+@requires_login
+def my_trades():
+    # Get trades where user is either initiator or receiver
+    user_id = session['user_id']
+    
+    initiated_trades = Trade.query.filter_by(initiator_id=user_id).all()
+    received_trades = Trade.query.filter_by(receiver_id=user_id).all()
+    
+    return render_template(
+        "my_trades.html",
+        initiated_trades=initiated_trades,
+        received_trades=received_trades
+    )
+
+@bp.route("/trades/new/<int:listing_id>", methods=["GET", "POST"])
+@requires_login
+def new_trade(listing_id):
+    listing = Listing.query.get_or_404(listing_id)
+    
+    # Check if listing is active
+    if not listing.is_active:
+        flash("This listing is no longer available", "danger")
+        return redirect(url_for("listings.listings"))
+    
+    # Check if user is not the owner
+    if listing.user_id == session['user_id']:
+        flash("You cannot trade with yourself", "danger")
+        return redirect(url_for("listings.view_listing", listing_id=listing.id))
+    
+    if request.method == "POST":
+        trade_type = request.form.get("trade_type")
+        message = request.form.get("message")
+        offered_listing_id = request.form.get("offered_listing_id") if trade_type == "exchange" else None
+        
+        # Validate trade type
+        if trade_type not in ["exchange", "loan", "donation"]:
+            flash("Invalid trade type", "danger")
+            return redirect(url_for("trades.new_trade", listing_id=listing.id))
+        
+        # For exchanges, validate offered listing
+        if trade_type == "exchange" and not offered_listing_id:
+            flash("Please select an item to offer for exchange", "danger")
+            return redirect(url_for("trades.new_trade", listing_id=listing.id))
+        
+        # Create new trade
+        trade = Trade(
+            initiator_id=session['user_id'],
+            receiver_id=listing.user_id,
+            listing_id=listing.id,
+            offered_listing_id=offered_listing_id,
+            trade_type=trade_type,
+            message=message,
+            status="pending"
+        )
+        
+        # For loans, set return date
+        if trade_type == "loan" and listing.loan_duration:
+            trade.loan_return_date = datetime.utcnow() + timedelta(days=int(listing.loan_duration))
+        
+        db.session.add(trade)
+        db.session.commit()
+        
+        # Create notification for receiver
+        create_notification(
+            listing.user_id,
+            "New Trade Request",
+            f"You have received a new {trade_type} request for your listing: {listing.title}",
+            "trade",
+            trade.id
+        )
+        
+        flash("Trade request sent successfully!", "success")
+        return redirect(url_for("trades.my_trades"))
+    
+    # Get user's listings for exchange
+    user_listings = Listing.query.filter_by(
+        user_id=session['user_id'],
+        is_active=True
+    ).all()
+    
+    return render_template(
+        "new_trade.html",
+        listing=listing,
+        user_listings=user_listings
+    )
+
+@bp.route("/trades/<int:trade_id>")
+@requires_login
+def view_trade(trade_id):
+    trade = Trade.query.get_or_404(trade_id)
+    
+    # Check if user is involved in this trade
+    if trade.initiator_id != session['user_id'] and trade.receiver_id != session['user_id']:
+        flash("You don't have permission to view this trade", "danger")
+        return redirect(url_for("trades.my_trades"))
+    
+    # Get current UTC time
+    now = datetime.utcnow()
+    
+    return render_template("view_trade.html", trade=trade, now=now)
+
+@bp.route("/trades/<int:trade_id>/update", methods=["POST"])
+@requires_login
+def update_trade_status(trade_id):
+    trade = Trade.query.get_or_404(trade_id)
+    if trade.receiver_id != session['user_id']:
+        flash("You don't have permission to update this trade", "danger")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    new_status = request.form.get("status")
+    if new_status not in ["accepted", "rejected", "completed"]:
+        flash("Invalid status", "danger")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    trade.status = new_status
+    
+    if new_status == "completed":
+        # Mark the listing(s) inactive for all trade types when completed.
+        # Compare-and-set so a concurrent checkout cannot sell the same item.
+        listings_to_close = [trade.listing]
+        if trade.trade_type == "exchange" and trade.offered_listing_id:
+            listings_to_close.append(trade.offered_listing)
+        for listing in listings_to_close:
+            if not claim_listing(listing.id, listing.version):
+                db.session.rollback()
+                flash("This item is no longer available; the trade cannot be completed.", "danger")
+                return redirect(url_for("trades.view_trade", trade_id=trade_id))
+        
+        # Notify both parties
+        create_notification(
+            trade.initiator_id,
+            "Trade Completed",
+            f"Your {trade.trade_type} for {trade.listing.title} has been completed.",
+            "trade",
+            trade.id
+        )
+        create_notification(
+            trade.receiver_id,
+            "Trade Completed",
+            f"The {trade.trade_type} for {trade.listing.title} has been completed.",
+            "trade",
+            trade.id
+        )
+    else:
+        # Notify initiator for 'accepted' or 'rejected'
+        status_message = "accepted" if new_status == "accepted" else "rejected"
+        create_notification(
+            trade.initiator_id,
+            f"Trade Request {status_message.capitalize()}",
+            f"Your {trade.trade_type} request for {trade.listing.title} has been {status_message}.",
+            "trade",
+            trade.id
+        )
+    
+    db.session.commit()
+    flash(f"Trade {new_status} successfully!", "success")
+    return redirect(url_for("trades.view_trade", trade_id=trade.id))
+
+@bp.route("/trades/<int:trade_id>/returned", methods=["POST"])
+@requires_login
+def mark_loan_returned(trade_id):
+    trade = Trade.query.get_or_404(trade_id)
+    if trade.receiver_id != session['user_id']:
+        flash("You don't have permission to update this trade", "danger")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    # The same loans the scheduler sends notices for
+    if trade.trade_type != "loan" or trade.status not in ACTIVE_STATUSES or trade.loan_returned_at:
+        flash("Only an accepted or completed loan that is still out can be marked as returned", "danger")
+        return redirect(url_for("trades.view_trade", trade_id=trade.id))
+    
+    trade.loan_returned_at = datetime.utcnow()
+    # No more reminders or overdue notices (see loan_scheduler.py)
+    trade.loan_notice_stage = DONE
+    create_notification(
+        trade.initiator_id,
+        "Loan Returned",
+        f"{trade.listing.title} has been marked as returned. Thank you!",
+        "trade",
+        trade.id,
+        commit=False
+    )
+    
+    db.session.commit()
+    flash("Loan marked as returned!", "success")
+    return redirect(url_for("trades.view_trade", trade_id=trade.id))
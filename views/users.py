@@ -0,0 +1,178 @@
+from flask import Blueprint, current_app, render_template, request, redirect, session, url_for, flash
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+from models import db, User, Installment, Donation, Category, Listing, WishlistItem, Trade, Notification, UserReview
+from identity import current_user, login_user
+from conversations import conversations_for
+from cart_service import cart_summary
+from helpers import requires_login, allowed_file, upload_path
+import os
+from datetime import datetime
+from sqlalchemy import func
+
+bp = Blueprint('users', __name__)
+
+@bp.route("/user_dashboard")
+@requires_login
+def user_dashboard():
+    user = current_user()  # Loaded once per request from the session's user ID
+    
+    # Get user's installment applications
+    installments = Installment.query.filter_by(user_id=user.id).order_by(Installment.created_at.desc()).limit(3).all()
+    
+    # Get user's donations
+    donations_made = Donation.query.filter_by(donor_id=user.id).order_by(Donation.created_at.desc()).limit(3).all()
+    donations_received = Donation.query.filter_by(recipient_id=user.id).order_by(Donation.created_at.desc()).limit(3).all()
+    
+    # Get user's most recent conversations
+    conversations, _ = conversations_for(user.id, limit=3)
+    recent_chats = [(partner, conversation.last_message_at)
+                    for conversation, partner in conversations if partner is not None and partner.id != user.id]
+    
+    # Get user's recent listings
+    recent_listings = Listing.query.filter_by(user_id=user.id).order_by(Listing.created_at.desc()).limit(3).all()
+    
+    # Get user's recent trades
+    recent_trades = Trade.query.filter(
+        ((Trade.initiator_id == user.id) | (Trade.receiver_id == user.id))
+    ).order_by(Trade.created_at.desc()).limit(3).all()
+    
+    # Get unread notification count
+    unread_notifications = Notification.query.filter_by(
+        user_id=user.id,
+        is_read=False
+    ).count()
+    
+    # Get wishlist count
+    wishlist_count = WishlistItem.query.filter_by(user_id=user.id).count()
+    
+    # Get cart count
+    cart_count = cart_summary(user.id).item_count
+    
+    return render_template(
+        "user_dashboard.html", 
+        user=user, 
+        installments=installments,
+        donations_made=donations_made,
+        donations_received=donations_received,
+        recent_chats=recent_chats,
+        recent_listings=recent_listings,
+        recent_trades=recent_trades,
+        unread_notifications=unread_notifications,
+        wishlist_count=wishlist_count,
+        cart_count=cart_count
+    )
+
+@bp.route("/profile/<int:user_id>")
+def user_profile(user_id):
+    user = User.query.get_or_404(user_id)
+    
+    # Get user's reviews
+    reviews = UserReview.query.filter_by(reviewed_id=user_id).all()
+    
+    # Calculate average rating
+    if reviews:
+        avg_rating = sum(review.rating for review in reviews) / len(reviews)
+    else:
+        avg_rating = 0
+    
+    # Get user's active listings
+    active_listings = Listing.query.filter_by(
+        user_id=user_id,
+        is_active=True
+    ).order_by(Listing.created_at.desc()).limit(4).all()
+    
+    return render_template(
+        "user_profile.html",
+        user=user,
+        reviews=reviews,
+        avg_rating=avg_rating,
+        active_listings=active_listings
+    )
+
+@bp.route("/edit_profile", methods=["GET", "POST"])
+@requires_login
+def edit_profile():
+    user = User.query.get_or_404(session['user_id'])
+
+    if request.method == "POST":
+        # Update basic info
+        user.first_name = request.form.get("first_name")
+        user.last_name = request.form.get("last_name")
+        user.email = request.form.get("email")
+        user.mobile = request.form.get("mobile")
+        user.gender = request.form.get("gender")
+        user.address = request.form.get("address")
+        user.city = request.form.get("city")
+        user.state = request.form.get("state")
+        user.zip_code = request.form.get("zip_code")
+        user.country = request.form.get("country")
+        user.latitude = request.form.get("latitude")
+        user.longitude = request.form.get("longitude")
+        
+        # Update password if provided
+        new_password = request.form.get("new_password")
+        if new_password:
+            current_password = request.form.get("current_password")
+            if not check_password_hash(user.password, current_password):
+                flash("Current password is incorrect", "danger")
+                return redirect(url_for('users.edit_profile'))
+            
+            user.password = generate_password_hash(new_password)
+        
+        # Handle profile image upload
+        if 'profile_image' in request.files:
+            file = request.files['profile_image']
+            if file and file.filename != '' and allowed_file(file.filename):
+                # Delete old profile image if exists
+                if user.profile_image:
+                    try:
+                        os.remove(os.path.join(current_app.config['PROFILE_IMAGES_FOLDER'], user.profile_image))
+                    except:
+                        pass  # File might not exist
+                
+                filename = secure_filename(file.filename)
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                profile_image = f"{timestamp}_{filename}"
+                file.save(upload_path('PROFILE_IMAGES_FOLDER', profile_image))
+                user.profile_image = profile_image
+
+        # Name or password may have changed; invalidate cached session identities
+        user.session_version = User.session_version + 1
+        db.session.commit()  # Save the updated profile to the database
+        login_user(user)
+        flash("Profile updated successfully", "success")
+        return redirect(url_for('users.user_profile', user_id=user.id))
+
+    return render_template("edit_profile.html", user=user)
+
+@bp.route("/home")
+def home():
+    # Get featured listings
+    featured_listings = Listing.query.filter_by(is_active=True).order_by(func.random()).limit(8).all()
+    
+    # Get categories
+    categories = Category.query.all()
+    
+    # Get recent trades
+    recent_trades = Trade.query.filter_by(status="completed").order_by(Trade.updated_at.desc()).limit(3).all()
+    
+    # Get counts for the navbar
+    cart_count = 0
+    wishlist_count = 0
+    notification_count = 0
+    
+    if "user_id" in session:
+        cart_count = cart_summary(session["user_id"]).item_count
+        wishlist_count = WishlistItem.query.filter_by(user_id=session["user_id"]).count()
+        notification_count = Notification.query.filter_by(user_id=session["user_id"], is_read=False).count()
+    
+    return render_template(
+        "home.html", 
+        featured_listings=featured_listings,
+        categories=categories,
+        recent_trades=recent_trades,
+        cart_count=cart_count,
+        wishlist_count=wishlist_count,
+        notification_count=notification_count
+    )
@@ -0,0 +1,181 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Listing, WishlistAlert, WishlistAlertQuota, WishlistItem
+from inbox import notify_many
+from metrics import inc
+import threading
+
+# kind -> (title, message); the message is formatted with the listing title and prices
+ALERT_MESSAGES = {
+    "price_drop": ("Price drop", "{title} dropped from ${old_price:.2f} to ${new_price:.2f}."),
+    "unavailable": ("No longer available", "{title} is no longer available."),
+}
+
+LEASE = timedelta(seconds=60)
+
+_worker = None
+_worker_lock = threading.Lock()
+_wake = False
+
+def enqueue_alert(listing_id, kind, old_price=None, new_price=None):
+    """Queue an alert for everyone who wishlisted listing_id, if anyone did; the caller commits.
+
+    Only the alert row is written here, so the request that changed the
+    listing costs the same however many people wishlisted it. The fan-out
+    runs in a background thread started once the transaction commits
+    (WISHLIST_ALERTS_ASYNC), or in `flask process-wishlist-alerts`.
+    """
+    wished = db.session.execute(select(WishlistItem.id).where(WishlistItem.listing_id == listing_id).limit(1)).first()
+    if wished is None:
+        return
+    db.session.add(WishlistAlert(listing_id=listing_id, kind=kind, old_price=old_price, new_price=new_price))
+    if current_app.config.get('WISHLIST_ALERTS_ASYNC'):
+        app = current_app._get_current_object()
+        event.listen(db.session(), "after_commit", lambda session: start_worker(app), once=True)
+
+def _claim_next():
+    """Lease the oldest pending alert; returns it or None when there is nothing to do."""
+    now = datetime.utcnow()
+    free = db.or_(WishlistAlert.claimed_until.is_(None), WishlistAlert.claimed_until < now)
+    while True:
+        alert_id = db.session.execute(
+            select(WishlistAlert.id).where(WishlistAlert.done_at.is_(None), free).order_by(WishlistAlert.id).limit(1)
+        ).scalar()
+        if alert_id is None:
+            return None
+        # Compare-and-set so each alert is worked on by one worker at a time
+        claimed = db.session.execute(
+            update(WishlistAlert)
+            .where(WishlistAlert.id == alert_id, WishlistAlert.done_at.is_(None), free)
+            .values(claimed_until=now + LEASE)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(WishlistAlert, alert_id)
+
+def _within_limit(user_ids, now):
+    """The user_ids that have been sent fewer than WISHLIST_ALERT_LIMIT alerts in their current window."""
+    limit, window = current_app.config['WISHLIST_ALERT_LIMIT']
+    counts = dict(db.session.execute(
+        select(WishlistAlertQuota.user_id, WishlistAlertQuota.sent)
+        .where(WishlistAlertQuota.user_id.in_(user_ids),
+               WishlistAlertQuota.window_start >= now - timedelta(seconds=window))
+    ).all())
+    return [user_id for user_id in user_ids if counts.get(user_id, 0) < limit]
+
+def _count_sent(user_ids, now):
+    """Count one more alert for each of user_ids, starting a new window where the last one ran out."""
+    _, window = current_app.config['WISHLIST_ALERT_LIMIT']
+    while True:
+        window_starts = dict(db.session.execute(
+            select(WishlistAlertQuota.user_id, WishlistAlertQuota.window_start)
+            .where(WishlistAlertQuota.user_id.in_(user_ids))
+        ).all())
+        new = [user_id for user_id in user_ids if user_id not in window_starts]
+        if not new:
+            break
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(WishlistAlertQuota),
+                                   [{"user_id": user_id, "window_start": now, "sent": 1} for user_id in new])
+            break
+        except IntegrityError:
+            # Another worker counted an alert for some of them first, which
+            # rolled back the whole insert; look again and insert the rest
+            continue
+    fresh = now - timedelta(seconds=window)
+    current = [user_id for user_id, start in window_starts.items() if start >= fresh]
+    expired = [user_id for user_id, start in window_starts.items() if start < fresh]
+    if current:
+        db.session.execute(
+            update(WishlistAlertQuota).where(WishlistAlertQuota.user_id.in_(current))
+            .values(sent=WishlistAlertQuota.sent + 1)
+            .execution_options(synchronize_session=False)
+        )
+    if expired:
+        db.session.execute(
+            update(WishlistAlertQuota).where(WishlistAlertQuota.user_id.in_(expired))
+            .values(window_start=now, sent=1)
+            .execution_options(synchronize_session=False)
+        )
+
+def _fan_out(alert, batch_size):
+    listing = db.session.get(Listing, alert.listing_id)
+    if listing is None or alert.kind not in ALERT_MESSAGES:
+        alert.done_at = datetime.utcnow()
+        db.session.commit()
+        return
+    title, template = ALERT_MESSAGES[alert.kind]
+    message = template.format(title=listing.title, old_price=alert.old_price or 0, new_price=alert.new_price or 0)
+    # Plain values, since every commit below expires the ORM objects
+    alert_id, kind, listing_id, owner_id = alert.id, alert.kind, listing.id, listing.user_id
+    last_item_id = alert.last_wishlist_item_id
+
+    while True:
+        now = datetime.utcnow()
+        wishers = db.session.execute(
+            select(WishlistItem.id, WishlistItem.user_id)
+            .where(WishlistItem.listing_id == listing_id, WishlistItem.id > last_item_id)
+            .order_by(WishlistItem.id)
+            .limit(batch_size)
+        ).all()
+        progress = {"claimed_until": now + LEASE}
+        if wishers:
+            last_item_id = progress["last_wishlist_item_id"] = wishers[-1][0]
+        else:
+            progress["done_at"] = now
+        user_ids = list(dict.fromkeys(user_id for _, user_id in wishers if user_id != owner_id))
+        allowed = _within_limit(user_ids, now) if user_ids else []
+        if allowed:
+            notify_many(allowed, title, message, "wishlist", listing_id, group_key=f"wishlist:{listing_id}")
+            _count_sent(allowed, now)
+        # Record progress and renew the lease in the same transaction as the notifications
+        db.session.execute(
+            update(WishlistAlert).where(WishlistAlert.id == alert_id).values(**progress)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if not wishers:
+            return
+        inc("exchangify_wishlist_alerts_total", (("kind", kind), ("result", "sent")), len(allowed))
+        inc("exchangify_wishlist_alerts_total", (("kind", kind), ("result", "rate_limited")), len(user_ids) - len(allowed))
+
+def process_alerts(batch_size=None):
+    """Fan out every pending alert; returns how many were processed."""
+    batch_size = batch_size or current_app.config['WISHLIST_ALERT_BATCH']
+    processed = 0
+    while True:
+        alert = _claim_next()
+        if alert is None:
+            return processed
+        _fan_out(alert, batch_size)
+        processed += 1
+
+def start_worker(app):
+    """Drain pending alerts in a background thread of this process."""
+    global _worker, _wake
+    with _worker_lock:
+        _wake = True
+        if _worker is not None:
+            # The running worker picks the new alert up before it exits
+            return
+
+        def run():
+            global _worker, _wake
+            while True:
+                with _worker_lock:
+                    if not _wake:
+                        _worker = None
+                        return
+                    _wake = False
+                try:
+                    with app.app_context():
+                        process_alerts()
+                except Exception:
+                    app.logger.exception("Failed to process wishlist alerts")
+
+        _worker = threading.Thread(target=run, name="wishlist-alerts", daemon=True)
+        _worker.start()
@@ -0,0 +1,4 @@
+# Entry point for WSGI servers, e.g. `gunicorn --preload wsgi:app`
+from app import create_app
+
+app = create_app()